@@ -1,18 +1,27 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, AsyncIterator, Optional
+import asyncio
+import os
 import logging
 from dotenv import load_dotenv, find_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.output_parsers import JsonOutputParser
 from openai import OpenAIError
 
 from app.schemas.diagram import AssistantRequest, AssistantResponse
 from .prompts import assistant_system_prompt
+from .context_compaction import ContextCompactor
+from app.tools.rate_limit import LLMLimiter, RateLimitedError, build_llm_limiter
+from app.tools.llm_calls import LLMCaller, LLMTimeoutError, LLM_TIMEOUT_SECONDS
 
 load_dotenv(find_dotenv())
 
 logger = logging.getLogger(__name__)
 
+# Configuration from environment variables
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL", "gpt-4o")
+
 
 class AssistantError(Exception):
     """Custom exception for assistant processing errors"""
@@ -25,33 +34,85 @@ class AssistantAgent:
     Chat agent responsible for helping users create diagrams.
     """
 
-    def __init__(self):
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
+    def __init__(
+        self,
+        compactor: Optional[ContextCompactor] = None,
+        limiter: Optional[LLMLimiter] = None,
+    ):
+        # Retries are handled by self.llm_calls so each attempt is rate limited
+        llm = ChatOpenAI(
+            model=ASSISTANT_MODEL,
+            temperature=0.3,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
         self.client = llm.with_structured_output(AssistantResponse)
 
-    async def invoke_assistant(self, messages: AssistantRequest) -> Dict[str, Any]:
-        chat_history = messages.context or []
+        # JSON mode streams raw text, which the parser turns into growing partial dicts
+        self.stream_parser = JsonOutputParser(pydantic_object=AssistantResponse)
+        self.stream_client = (
+            llm.bind(response_format={"type": "json_object"}) | self.stream_parser
+        )
+        self.compactor = compactor if compactor is not None else ContextCompactor()
+        self.limiter = (
+            limiter if limiter is not None else build_llm_limiter("assistant")
+        )
+        self.llm_calls = LLMCaller("assistant", self.limiter)
+        # Streams are never hedged: two requests would feed one reply
+        self.stream_llm_calls = LLMCaller(
+            "assistant_stream", self.limiter, hedging=False
+        )
+
+    def _format_messages(
+        self,
+        messages: AssistantRequest,
+        last_diagram: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        # Recent turns go verbatim; older ones are folded into a summary so the
+        # prompt stays within the token budget as the conversation grows
+        compacted = self.compactor.compact(
+            assistant_system_prompt,
+            messages.context or [],
+            messages.message,
+            last_diagram=last_diagram,
+        )
+        return compacted.messages
+
+    async def invoke_assistant(self, messages: AssistantRequest) -> AssistantResponse:
+        return await self.respond(messages)
 
-        # Format messages in the structure expected by the OpenAI API
-        formatted_messages = [{"role": "system", "content": assistant_system_prompt}]
+    async def respond(
+        self,
+        messages: AssistantRequest,
+        last_diagram: Optional[Dict[str, Any]] = None,
+    ) -> AssistantResponse:
+        """
+        Generate the structured assistant response.
 
-        # Add chat history
-        if chat_history:
-            for message in chat_history:
-                formatted_messages.append(message)
+        Args:
+            messages (AssistantRequest): User message and conversation context.
+            last_diagram (Optional[Dict[str, Any]]): The conversation's last
+                generated diagram structure, if known.
 
-        # Add the current user message
-        formatted_messages.append({"role": "user", "content": messages.message})
+        Returns:
+            AssistantResponse: The reply and the optional diagram description
+
+        Raises:
+            AssistantError: If the assistant response fails
+        """
+        formatted_messages = self._format_messages(messages, last_diagram)
 
         try:
             logger.info("Invoking assistant")
-            response = await self.client.ainvoke(formatted_messages)
-            response_dict = response.model_dump()
-            # turn to str
-            response_str = str(response_dict)
+            response = await self.llm_calls.call(
+                lambda: self.client.ainvoke(formatted_messages)
+            )
             logger.info("Assistant response generated successfully")
-            return response_str
+            return response
 
+        except (RateLimitedError, LLMTimeoutError):
+            # Callers answer these with 429 and 504 respectively
+            raise
         except OpenAIError as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise AssistantError(
@@ -62,3 +123,85 @@ class AssistantAgent:
             raise AssistantError(
                 f"Unexpected error during assistant processing: {str(e)}"
             ) from e
+
+    async def stream_assistant(
+        self,
+        messages: AssistantRequest,
+        last_diagram: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the assistant response as it is generated.
+
+        Args:
+            messages (AssistantRequest): User message and conversation context.
+            last_diagram (Optional[Dict[str, Any]]): The conversation's last
+                generated diagram structure, if known.
+
+        Yields:
+            Dict[str, Any]: `{"type": "token", "delta": ...}` events carrying the
+            next piece of the `message` field, followed by one
+            `{"type": "done", "message": ..., "invoke_diagram_generation": ...}`.
+
+        Raises:
+            AssistantError: If the assistant response fails
+        """
+        formatted_messages = self._format_messages(messages, last_diagram)
+        formatted_messages.insert(
+            1,
+            {"role": "system", "content": self.stream_parser.get_format_instructions()},
+        )
+
+        # The model is read into a queue by a background call so that a slow
+        # reader never holds a limiter slot, and the whole stream runs under
+        # the caller's deadline
+        queue: asyncio.Queue = asyncio.Queue()
+        streamed = False
+
+        async def read_stream() -> Any:
+            nonlocal streamed
+            if streamed:
+                # Part of the reply already went out; a retry would repeat it
+                raise AssistantError("Assistant stream interrupted")
+            partial = {}
+            async for partial in self.stream_client.astream(formatted_messages):
+                message = partial.get("message") if isinstance(partial, dict) else None
+                if isinstance(message, str):
+                    streamed = True
+                    queue.put_nowait(message)
+            return partial
+
+        try:
+            logger.info("Streaming assistant response")
+            reader = asyncio.ensure_future(self.stream_llm_calls.call(read_stream))
+            reader.add_done_callback(lambda _: queue.put_nowait(None))
+            try:
+                sent = ""
+                while (message := await queue.get()) is not None:
+                    if message.startswith(sent) and len(message) > len(sent):
+                        yield {"type": "token", "delta": message[len(sent) :]}
+                        sent = message
+                partial = await reader
+            finally:
+                # Stops the model request when the reader goes away mid-stream
+                reader.cancel()
+
+            response = AssistantResponse.model_validate(partial)
+            if response.message.startswith(sent) and len(response.message) > len(sent):
+                # Flush anything the final parse added beyond the streamed prefix
+                yield {"type": "token", "delta": response.message[len(sent) :]}
+            logger.info("Assistant response streamed successfully")
+            yield {"type": "done", **response.model_dump()}
+
+        except (RateLimitedError, LLMTimeoutError):
+            # Callers answer these with 429 and 504 respectively
+            raise
+        except OpenAIError as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            raise AssistantError(
+                f"Failed to generate assistant response due to API error: {str(e)}"
+            ) from e
+        except Exception as e:
+            logger.error(f"Unexpected error during assistant streaming: {str(e)}")
+            raise AssistantError(
+                f"Unexpected error during assistant processing: {str(e)}"
+            ) from e
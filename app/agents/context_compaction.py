@@ -0,0 +1,176 @@
+from typing import Dict, Any, List, Optional, NamedTuple
+import os
+import json
+import logging
+import threading
+
+from .tokens import count_message_tokens, message_content
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "on").lower() == "on"
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+
+# Longest excerpt of a single older message kept in the summary
+_SUMMARY_EXCERPT_CHARS = 200
+
+
+class CompactedContext(NamedTuple):
+    messages: List[Dict[str, Any]]
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def split_turns(history: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group chat history into turns, each starting at a user message."""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in history:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _excerpt(message: Dict[str, Any]) -> str:
+    text = " ".join(message_content(message).split())
+    if len(text) > _SUMMARY_EXCERPT_CHARS:
+        text = text[: _SUMMARY_EXCERPT_CHARS - 3].rstrip() + "..."
+    return f"- {message.get('role', 'user')}: {text}"
+
+
+class ContextCompactor:
+    """
+    Bound the prompt sent to the assistant as a conversation grows.
+
+    The last `keep_turns` turns are sent verbatim. Older turns are folded into a
+    summary message made of short excerpts, together with the most recently
+    generated diagram if one is known. If the prompt is still over
+    `token_budget`, more turns are folded and then the oldest summary lines are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        keep_turns: int = CONTEXT_KEEP_TURNS,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        enabled: bool = CONTEXT_COMPACTION,
+    ):
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.enabled = enabled
+        self.requests = 0
+        self.compacted = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def compact(
+        self,
+        system_prompt: str,
+        history: List[Dict[str, Any]],
+        message: str,
+        last_diagram: Optional[Dict[str, Any]] = None,
+    ) -> CompactedContext:
+        """
+        Build the chat messages for one assistant call.
+
+        Args:
+            system_prompt: The assistant's system prompt
+            history: Previous conversation messages
+            message: The current user message
+            last_diagram: The last diagram structure generated in this conversation
+
+        Returns:
+            CompactedContext: The messages to send and their token counts
+        """
+        system = {"role": "system", "content": system_prompt}
+        current = {"role": "user", "content": message}
+        full = [system, *history, current]
+        tokens_before = count_message_tokens(full)
+
+        turns = split_turns(history)
+        split = max(len(turns) - self.keep_turns, 0)
+        older, recent = turns[:split], turns[split:]
+
+        if not self.enabled or (not older and tokens_before <= self.token_budget):
+            return self._record(CompactedContext(full, tokens_before, tokens_before))
+
+        summary_lines = [_excerpt(m) for turn in older for m in turn]
+        messages = self._assemble(system, summary_lines, last_diagram, recent, current)
+
+        # Over budget: fold the oldest verbatim turns, then drop summary lines
+        while count_message_tokens(messages) > self.token_budget and recent:
+            summary_lines.extend(_excerpt(m) for m in recent.pop(0))
+            messages = self._assemble(
+                system, summary_lines, last_diagram, recent, current
+            )
+        while count_message_tokens(messages) > self.token_budget and summary_lines:
+            summary_lines.pop(0)
+            messages = self._assemble(
+                system, summary_lines, last_diagram, recent, current
+            )
+
+        tokens_after = count_message_tokens(messages)
+        if tokens_after >= tokens_before:
+            # Folding a short history can cost more than it saves
+            return self._record(CompactedContext(full, tokens_before, tokens_before))
+        return self._record(CompactedContext(messages, tokens_before, tokens_after))
+
+    @staticmethod
+    def _assemble(
+        system: Dict[str, Any],
+        summary_lines: List[str],
+        last_diagram: Optional[Dict[str, Any]],
+        recent: List[List[Dict[str, Any]]],
+        current: Dict[str, Any],
+    ) -> List[Dict[str, Any]]:
+        sections = []
+        if summary_lines:
+            sections.append(
+                "Summary of the earlier conversation:\n" + "\n".join(summary_lines)
+            )
+        if last_diagram is not None:
+            sections.append(
+                "Most recently generated diagram:\n"
+                + json.dumps(last_diagram, separators=(",", ":"))
+            )
+        messages = [system]
+        if sections:
+            messages.append({"role": "system", "content": "\n\n".join(sections)})
+        for turn in recent:
+            messages.extend(turn)
+        messages.append(current)
+        return messages
+
+    def _record(self, result: CompactedContext) -> CompactedContext:
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += result.tokens_before
+            self.tokens_after += result.tokens_after
+            if result.tokens_saved:
+                self.compacted += 1
+        if result.tokens_saved:
+            logger.info(
+                f"Compacted assistant context from {result.tokens_before} to "
+                f"{result.tokens_after} tokens ({result.tokens_saved} saved)"
+            )
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "keep_turns": self.keep_turns,
+                "token_budget": self.token_budget,
+                "requests": self.requests,
+                "compacted": self.compacted,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+            }
@@ -1,4 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import copy
+import json
 import logging
 from dotenv import load_dotenv, find_dotenv
 from langchain_openai import ChatOpenAI
@@ -6,8 +8,15 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from openai import OpenAIError
 
-from app.schemas.diagram import DiagramSchema
-from .prompts import diagram_generation_system_prompt
+from app.schemas.diagram import DiagramSchema, DiagramPatch
+from .prompts import diagram_generation_system_prompt, diagram_patch_system_prompt
+from .schema_cache import SchemaCache, build_schema_cache, normalize_description
+from .model_router import ModelRouter, FAST, DIAGRAM_FAST_MODEL, DIAGRAM_FULL_MODEL
+from .rule_parser import RuleBasedParser
+from app.tools.node_registry import NODE_CLASSES
+from app.tools.singleflight import SingleFlight
+from app.tools.rate_limit import LLMLimiter, RateLimitedError, build_llm_limiter
+from app.tools.llm_calls import LLMCaller, LLMTimeoutError, LLM_TIMEOUT_SECONDS
 
 load_dotenv(find_dotenv())
 
@@ -24,9 +33,38 @@ class DiagramGeneratingAgent:
     """
     Agent responsible for generating diagrams based on text input using an LLM.
     """
-    def __init__(self):
-        llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    def __init__(
+        self,
+        cache: Optional[SchemaCache] = None,
+        inflight: Optional[SingleFlight] = None,
+        limiter: Optional[LLMLimiter] = None,
+        model_router: Optional[ModelRouter] = None,
+        rule_parser: Optional[RuleBasedParser] = None,
+    ):
+        # Retries are handled by self.llm_calls so each attempt is rate limited
+        llm = ChatOpenAI(
+            model=DIAGRAM_FULL_MODEL,
+            temperature=0,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
+        fast_llm = ChatOpenAI(
+            model=DIAGRAM_FAST_MODEL,
+            temperature=0,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
         self.client = llm.with_structured_output(DiagramSchema)
+        self.fast_client = fast_llm.with_structured_output(DiagramSchema)
+        self.patch_client = llm.with_structured_output(DiagramPatch)
+        self.model_router = model_router if model_router is not None else ModelRouter()
+        self.rule_parser = rule_parser if rule_parser is not None else RuleBasedParser()
+        self.cache = cache if cache is not None else build_schema_cache()
+        self.inflight = inflight if inflight is not None else SingleFlight("diagram structure")
+        self.limiter = limiter if limiter is not None else build_llm_limiter("diagram")
+        self.llm_calls = LLMCaller("diagram", self.limiter)
+        # Kept apart so the fast model's latencies don't skew the hedge delay
+        self.fast_llm_calls = LLMCaller("diagram-fast", self.limiter)
 
     async def generate_diagram_structure(self, diagram_description: str) -> Dict[str, Any]:
         """
@@ -41,6 +79,25 @@ class DiagramGeneratingAgent:
         Raises:
             DiagramGenerationError: If diagram generation fails
         """
+        # Simple templated descriptions are parsed locally, without an LLM call
+        parsed = self.rule_parser.parse(diagram_description)
+        if parsed is not None:
+            logger.info("Diagram structure parsed locally")
+            return parsed
+
+        cached = await self.cache.lookup(diagram_description)
+        if cached is not None:
+            logger.info("Diagram structure served from cache")
+            return cached
+
+        # Identical descriptions already being generated share that LLM call
+        diagram_dict = await self.inflight.do(
+            normalize_description(diagram_description),
+            lambda: self._generate_diagram_structure(diagram_description),
+        )
+        return copy.deepcopy(diagram_dict)
+
+    async def _generate_diagram_structure(self, diagram_description: str) -> Dict[str, Any]:
         prompt = ChatPromptTemplate.from_messages(
             [
                 ("system", diagram_generation_system_prompt),
@@ -48,15 +105,28 @@ class DiagramGeneratingAgent:
             ]
         )
 
-        chain = {"input": RunnablePassthrough()} | prompt | self.client
+        chain_input = {"input": RunnablePassthrough()} | prompt
 
         try:
             logger.info("Attempting diagram generation")
-            response = await chain.ainvoke(diagram_description)
-            diagram_dict = response.model_dump()
+            diagram_dict = None
+            if self.model_router.route(diagram_description) == FAST:
+                diagram_dict = await self._generate_with_fast_model(
+                    chain_input | self.fast_client, diagram_description
+                )
+            if diagram_dict is None:
+                chain = chain_input | self.client
+                response = await self.llm_calls.call(
+                    lambda: chain.ainvoke(diagram_description)
+                )
+                diagram_dict = response.model_dump()
             logger.info("Diagram generation successful")
+            await self.cache.store(diagram_description, diagram_dict)
             return diagram_dict
 
+        except (RateLimitedError, LLMTimeoutError):
+            # Callers answer these with 429 and 504 respectively
+            raise
         except OpenAIError as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise DiagramGenerationError(
@@ -67,3 +137,120 @@ class DiagramGeneratingAgent:
             raise DiagramGenerationError(
                 f"Unexpected error during diagram generation: {str(e)}"
             ) from e
+
+    async def _generate_with_fast_model(
+        self, chain, diagram_description: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Generate the structure with the fast model.
+
+        Returns:
+            Optional[Dict[str, Any]]: The diagram data, or None if the fast
+            model's output was unusable and the full model should be used.
+        """
+        try:
+            response = await self.fast_llm_calls.call(
+                lambda: chain.ainvoke(diagram_description)
+            )
+            diagram_dict = response.model_dump()
+            self._validate_diagram_structure(diagram_dict)
+            return diagram_dict
+        except (RateLimitedError, LLMTimeoutError):
+            raise
+        except Exception as e:
+            logger.info(
+                f"Fast model output rejected ({str(e)}); "
+                f"escalating to {DIAGRAM_FULL_MODEL}"
+            )
+            self.model_router.record_escalation()
+            return None
+
+    def _validate_diagram_structure(self, structure: Dict[str, Any]) -> None:
+        """
+        Check that a diagram structure can be rendered.
+
+        Args:
+            structure (Dict[str, Any]): The diagram data to check.
+
+        Raises:
+            ValueError: If nodes are malformed or use unsupported types, or if
+                edges or clusters reference unknown nodes
+        """
+        nodes = structure.get("nodes")
+        if not isinstance(nodes, list) or not nodes:
+            raise ValueError("Diagram must have a non-empty list of nodes")
+
+        node_ids = set()
+        for node in nodes:
+            if not isinstance(node, dict) or not node.get("id") or not node.get("type"):
+                raise ValueError(f"Node must have an id and a type: {node}")
+            if node["type"] not in NODE_CLASSES:
+                raise ValueError(f"Unsupported node type: {node['type']}")
+            node_ids.add(node["id"])
+
+        for edge in structure.get("edges") or []:
+            if edge.get("source") not in node_ids or edge.get("target") not in node_ids:
+                raise ValueError(f"Edge references unknown node: {edge}")
+
+        for cluster in structure.get("clusters") or []:
+            unknown = set(cluster.get("nodes") or []) - node_ids
+            if unknown:
+                raise ValueError(
+                    f"Cluster {cluster.get('id')} references unknown nodes: {sorted(unknown)}"
+                )
+
+    async def generate_diagram_patch(
+        self, diagram: Dict[str, Any], instruction: str
+    ) -> Dict[str, Any]:
+        """
+        Generate a patch that applies an instruction to an existing diagram.
+
+        Only the change is generated, so output tokens scale with the size of
+        the edit rather than the size of the diagram.
+
+        Args:
+            diagram (Dict[str, Any]): The current diagram schema.
+            instruction (str): Natural language description of the change.
+
+        Returns:
+            Dict[str, Any]: Dictionary following the DiagramPatch model.
+
+        Raises:
+            DiagramGenerationError: If patch generation fails
+        """
+        if not instruction or not instruction.strip():
+            raise ValueError("Edit instruction cannot be empty")
+
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", diagram_patch_system_prompt),
+                ("human", "Current diagram:\n{diagram}\n\nInstruction: {instruction}"),
+            ]
+        )
+
+        chain = prompt | self.patch_client
+
+        try:
+            logger.info("Attempting diagram patch generation")
+            chain_input = {
+                "diagram": json.dumps(diagram, separators=(",", ":")),
+                "instruction": instruction,
+            }
+            response = await self.llm_calls.call(lambda: chain.ainvoke(chain_input))
+            patch = response.model_dump(exclude_defaults=True)
+            logger.info("Diagram patch generation successful")
+            return patch
+
+        except (RateLimitedError, LLMTimeoutError):
+            # Callers answer these with 429 and 504 respectively
+            raise
+        except OpenAIError as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            raise DiagramGenerationError(
+                f"Failed to generate diagram patch due to API error: {str(e)}"
+            ) from e
+        except Exception as e:
+            logger.error(f"Unexpected error during diagram patch generation: {str(e)}")
+            raise DiagramGenerationError(
+                f"Unexpected error during diagram patch generation: {str(e)}"
+            ) from e
@@ -0,0 +1,130 @@
+from typing import Dict, Any, NamedTuple
+import os
+import re
+import logging
+import threading
+
+from app.tools.node_registry import NODE_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+MODEL_TIERING = os.getenv("MODEL_TIERING", "on").lower() == "on"
+DIAGRAM_FAST_MODEL = os.getenv("DIAGRAM_FAST_MODEL", "gpt-4o-mini")
+DIAGRAM_FULL_MODEL = os.getenv("DIAGRAM_FULL_MODEL", "gpt-4o")
+MODEL_TIERING_MAX_SCORE = float(os.getenv("MODEL_TIERING_MAX_SCORE", "6"))
+
+FAST = "fast"
+FULL = "full"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Nouns that name a component without naming a supported node type
+_GENERIC_COMPONENTS = set(
+    "server servers instance instances database databases db queue queues cache "
+    "bucket buckets function functions service services worker workers api "
+    "gateway topic balancer firewall monitoring storage frontend backend "
+    "microservice microservices".split()
+)
+# Words that introduce groupings, which the large model handles more reliably
+_GROUPINGS = set(
+    "cluster clusters group groups subnet subnets region regions zone zones tier "
+    "tiers layer layers inside within".split()
+)
+# Descriptions longer than this always go to the full model
+_MAX_FAST_WORDS = 60
+_WORDS_PER_POINT = 15
+
+
+class Complexity(NamedTuple):
+    words: int
+    components: int
+    groupings: int
+    score: float
+
+
+def estimate_complexity(description: str) -> Complexity:
+    """
+    Estimate locally how hard a description is to turn into a diagram.
+
+    Args:
+        description: Natural language description of the diagram
+
+    Returns:
+        Complexity: Word, component and grouping counts and the combined score
+    """
+    tokens = _TOKEN_PATTERN.findall(description.lower())
+
+    components = 0
+    i = 0
+    while i < len(tokens):
+        # Node types written as two words, e.g. "api gateway", count once
+        if "".join(tokens[i : i + 2]) in NODE_CLASSES and i + 1 < len(tokens):
+            components += 1
+            i += 2
+            continue
+        if tokens[i] in NODE_CLASSES or tokens[i] in _GENERIC_COMPONENTS:
+            components += 1
+        i += 1
+    groupings = sum(1 for token in tokens if token in _GROUPINGS)
+
+    score = components + 2 * groupings + len(tokens) / _WORDS_PER_POINT
+    return Complexity(len(tokens), components, groupings, score)
+
+
+class ModelRouter:
+    """
+    Choose the fast or the full model for a diagram description.
+
+    Short descriptions naming a handful of components go to the fast model;
+    anything larger, or mentioning groupings, goes to the full model. Callers
+    report escalations when the fast model's output is rejected.
+    """
+
+    def __init__(
+        self,
+        max_score: float = MODEL_TIERING_MAX_SCORE,
+        enabled: bool = MODEL_TIERING,
+    ):
+        self.max_score = max_score
+        self.enabled = enabled
+        self.fast = 0
+        self.full = 0
+        self.escalations = 0
+        self._lock = threading.Lock()
+
+    def route(self, description: str) -> str:
+        """Return FAST or FULL for a description."""
+        tier = FULL
+        if self.enabled:
+            complexity = estimate_complexity(description)
+            if (
+                complexity.score <= self.max_score
+                and complexity.words <= _MAX_FAST_WORDS
+            ):
+                tier = FAST
+            logger.info(
+                f"Routing description to the {tier} model "
+                f"(complexity {complexity.score:.1f})"
+            )
+        with self._lock:
+            if tier == FAST:
+                self.fast += 1
+            else:
+                self.full += 1
+        return tier
+
+    def record_escalation(self) -> None:
+        with self._lock:
+            self.escalations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "fast_model": DIAGRAM_FAST_MODEL,
+                "full_model": DIAGRAM_FULL_MODEL,
+                "max_score": self.max_score,
+                "fast": self.fast,
+                "full": self.full,
+                "escalations": self.escalations,
+            }
@@ -0,0 +1,322 @@
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+import os
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+RULE_PARSER = os.getenv("RULE_PARSER", "on").lower() == "on"
+RULE_PARSER_MIN_CONFIDENCE = float(os.getenv("RULE_PARSER_MIN_CONFIDENCE", "0.8"))
+
+# Node type (as the LLM is prompted to write it), display label, and the phrases
+# that name it. Every type here must be a key of NODE_CLASSES when lowercased.
+_COMPONENTS = [
+    ("EC2", "EC2", ["ec2"]),
+    ("Lambda", "Lambda", ["lambda"]),
+    ("RDS", "RDS", ["rds"]),
+    ("ElastiCache", "ElastiCache", ["elasticache", "redis", "memcached"]),
+    ("Dynamodb", "DynamoDB", ["dynamodb", "dynamo"]),
+    ("S3", "S3", ["s3"]),
+    ("ELB", "ELB", ["elb", "load balancer", "classic load balancer"]),
+    ("ALB", "ALB", ["alb", "application load balancer"]),
+    ("VPC", "VPC", ["vpc"]),
+    ("Cloudwatch", "CloudWatch", ["cloudwatch"]),
+    ("WAF", "WAF", ["waf"]),
+    ("APIGateway", "API Gateway", ["apigateway", "api gateway"]),
+    ("SQS", "SQS", ["sqs"]),
+    ("SNS", "SNS", ["sns"]),
+    ("Fastapi", "FastAPI", ["fastapi"]),
+]
+
+# "X <connector> Y" draws an edge X -> Y; reversed connectors draw Y -> X
+_FORWARD = [
+    "->",
+    "=>",
+    "→",
+    "to",
+    "connects to",
+    "connected to",
+    "connect to",
+    "connecting to",
+    "talks to",
+    "sends to",
+    "calls",
+    "writes to",
+    "feeds",
+    "feeding",
+    "triggers",
+    "invokes",
+    "forwards to",
+    "routes to",
+    "then",
+    "in front of",
+]
+_REVERSED = ["behind", "fronted by", "called by", "triggered by"]
+# "in/inside/within [a|the|one|single|same] VPC" groups components into a VPC
+_GROUPING_PREPOSITIONS = {"in", "inside", "within"}
+_GROUPING_ARTICLES = {"a", "an", "the", "one", "single", "same"}
+# Counts, quantities, negations, exclusions, alternatives and intermediaries
+# change the diagram in ways the parser cannot express, so any of them leaves
+# the description to the LLM
+_HARD_FALLBACK = set(
+    "two three four five six seven eight nine ten eleven twelve twenty hundred "
+    "dozen dozens couple pair pairs several multiple many each every n "
+    "no not without never none nor except excluding isn aren don doesn "
+    "outside instead rather replace replaces replacing replaced or either "
+    "unless but via through thru from".split()
+)
+_QUANTITY_PATTERN = re.compile(r"\d+x?")
+# Words that carry no structure of their own
+_FILLER = set(
+    "a an the and with of for on all both everything instance instances function "
+    "functions bucket buckets database table cache queue topic service server "
+    "diagram create draw show make me please simple basic architecture that "
+    "which is are aws amazon plus also".split()
+)
+
+_TOKEN_PATTERN = re.compile(r"-+>|=>|→|[a-z0-9]+")
+_CLAUSE_SEPARATORS = re.compile(r"[.;\n]+")
+_MAX_PHRASE_TOKENS = 3
+
+
+def _phrase_table() -> Dict[Tuple[str, ...], Tuple[str, Any]]:
+    table: Dict[Tuple[str, ...], Tuple[str, Any]] = {}
+    for node_type, label, phrases in _COMPONENTS:
+        for phrase in phrases:
+            table[tuple(phrase.split())] = ("node", (node_type, label))
+    for phrase in _FORWARD:
+        table[tuple(phrase.split())] = ("edge", False)
+    for phrase in _REVERSED:
+        table[tuple(phrase.split())] = ("edge", True)
+    return table
+
+
+_PHRASES = _phrase_table()
+
+
+def _tokenize(text: str) -> List[str]:
+    return [
+        "->" if token in ("=>", "→") or token.endswith(">") else token
+        for token in _TOKEN_PATTERN.findall(text)
+    ]
+
+
+def _has_connector(tokens: List[str]) -> bool:
+    return any(_match(tokens, i)[1][0] == "edge" for i in range(len(tokens)))
+
+
+def _needs_llm(tokens: List[str]) -> bool:
+    return any(
+        token in _HARD_FALLBACK or _QUANTITY_PATTERN.fullmatch(token)
+        for token in tokens
+    )
+
+
+def _grouping_length(tokens: List[str], i: int) -> int:
+    """Length of an "inside a VPC" phrase starting at token i, or 0."""
+    if tokens[i] not in _GROUPING_PREPOSITIONS:
+        return 0
+    j = i + 1
+    while j < len(tokens) and j - i <= 2 and tokens[j] in _GROUPING_ARTICLES:
+        j += 1
+    return j + 1 - i if j < len(tokens) and tokens[j] == "vpc" else 0
+
+
+def _match(tokens: List[str], i: int) -> Tuple[int, Tuple[str, Any]]:
+    """Longest known phrase starting at token i, as (length, (kind, value))."""
+    length = _grouping_length(tokens, i)
+    if length:
+        return length, ("group", "vpc")
+    for length in range(_MAX_PHRASE_TOKENS, 0, -1):
+        phrase = tuple(tokens[i : i + length])
+        if len(phrase) == length and phrase in _PHRASES:
+            return length, _PHRASES[phrase]
+    if tokens[i] in _FILLER:
+        return 1, ("filler", None)
+    return 1, ("unknown", tokens[i])
+
+
+def _clauses(description: str) -> List[List[List[str]]]:
+    """
+    Split a description into clauses, each a list of comma-separated parts.
+
+    Sentences split at full stops, semicolons and line breaks. Comma-separated
+    parts stay in one clause unless they each describe their own connection, so
+    a list like "EC2, Lambda and RDS inside a VPC" remains one clause.
+    """
+    clauses = []
+    for sentence in _CLAUSE_SEPARATORS.split(description.lower()):
+        current: List[List[str]] = []
+        for part in sentence.split(","):
+            tokens = _tokenize(part)
+            if (
+                current
+                and _has_connector([t for p in current for t in p])
+                and _has_connector(tokens)
+            ):
+                clauses.append(current)
+                current = []
+            current.append(tokens)
+        if current:
+            clauses.append(current)
+    return clauses
+
+
+class RuleParse(NamedTuple):
+    schema: Optional[Dict[str, Any]]
+    confidence: float
+
+
+def parse_description(description: str) -> RuleParse:
+    """
+    Turn a simple, templated description into a diagram schema locally.
+
+    Recognizes the supported component names, "X -> Y" / "X connects to Y" /
+    "X behind Y" connections and "inside a VPC" groupings. A grouping applies
+    to the components before it in the same comma-separated part, or to the
+    whole clause so far when it stands in a part of its own ("..., all inside a
+    VPC"). Confidence is the share of words that were understood. Counts,
+    negations, exclusions, alternatives ("or") and intermediaries ("via"), and
+    structural problems such as a connection with nothing on one side or a
+    component connected to itself, give zero confidence.
+
+    Args:
+        description: Natural language description of the diagram
+
+    Returns:
+        RuleParse: The diagram schema (None if nothing was recognized) and the
+        parser's confidence in it
+    """
+    nodes: Dict[str, Dict[str, Any]] = {}
+    edges: List[Dict[str, str]] = []
+    vpc_members: List[str] = []
+    known = unknown = 0
+
+    def add_node(node_type: str, label: str) -> str:
+        node_id = node_type.lower()
+        nodes.setdefault(node_id, {"id": node_id, "type": node_type, "label": label})
+        return node_id
+
+    for parts in _clauses(description):
+        if _needs_llm([token for part in parts for token in part]):
+            return RuleParse(None, 0.0)
+        segments: List[List[str]] = [[]]
+        reversed_edges: List[bool] = []
+        clause_nodes: List[str] = []
+        for tokens in parts:
+            part_nodes: List[str] = []
+            i = 0
+            while i < len(tokens):
+                length, (kind, value) = _match(tokens, i)
+                i += length
+                if kind == "unknown":
+                    unknown += 1
+                    continue
+                known += length
+                if kind == "node":
+                    node_id = add_node(*value)
+                    if node_id in segments[-1]:
+                        # The same component twice on one side of a connection
+                        return RuleParse(None, 0.0)
+                    segments[-1].append(node_id)
+                    part_nodes.append(node_id)
+                    clause_nodes.append(node_id)
+                elif kind == "edge":
+                    segments.append([])
+                    reversed_edges.append(value)
+                elif kind == "group":
+                    members = part_nodes or clause_nodes
+                    if not members:
+                        # Nothing before the grouping for it to apply to
+                        return RuleParse(None, 0.0)
+                    vpc_members.extend(
+                        node_id
+                        for node_id in dict.fromkeys(members)
+                        if node_id not in vpc_members
+                    )
+
+        if len(segments) > 1 and not all(segments):
+            # A connection with no component on one side
+            return RuleParse(None, 0.0)
+        for (sources, targets), reverse in zip(
+            zip(segments, segments[1:]), reversed_edges
+        ):
+            if reverse:
+                sources, targets = targets, sources
+            if set(sources) & set(targets):
+                # A component connected to itself
+                return RuleParse(None, 0.0)
+            for source in sources:
+                for target in targets:
+                    edge = {"source": source, "target": target}
+                    if edge not in edges:
+                        edges.append(edge)
+
+    if vpc_members and "vpc" in nodes:
+        # A VPC named as a component as well as a grouping is ambiguous
+        return RuleParse(None, 0.0)
+
+    total = known + unknown
+    if not nodes or not total:
+        return RuleParse(None, 0.0)
+
+    name = " ".join(description.split())
+    schema = {
+        "name": (
+            name[0].upper() + name[1:] if len(name) <= 60 else "Architecture Diagram"
+        ),
+        "nodes": list(nodes.values()),
+        "edges": edges,
+        "clusters": (
+            [{"id": "vpc", "label": "VPC", "nodes": vpc_members}] if vpc_members else []
+        ),
+    }
+    return RuleParse(schema, known / total)
+
+
+class RuleBasedParser:
+    """
+    Local fast path for descriptions simple enough to parse without an LLM.
+    """
+
+    def __init__(
+        self,
+        min_confidence: float = RULE_PARSER_MIN_CONFIDENCE,
+        enabled: bool = RULE_PARSER,
+    ):
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self.parsed = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def parse(self, description: str) -> Optional[Dict[str, Any]]:
+        """Return a diagram schema, or None when the LLM should handle it."""
+        if not self.enabled or not description or not description.strip():
+            return None
+        result = parse_description(description)
+        accepted = (
+            result.schema is not None and result.confidence >= self.min_confidence
+        )
+        with self._lock:
+            if accepted:
+                self.parsed += 1
+            else:
+                self.fallbacks += 1
+        if not accepted:
+            logger.info(
+                f"Rule-based parse confidence {result.confidence:.2f}; using the LLM"
+            )
+            return None
+        return result.schema
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "min_confidence": self.min_confidence,
+                "parsed": self.parsed,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,211 @@
+from typing import Dict, Any, List, Optional
+import os
+import re
+import copy
+import math
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", "512"))
+SCHEMA_CACHE_TTL_SECONDS = float(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "3600"))
+SCHEMA_CACHE_SEMANTIC = os.getenv("SCHEMA_CACHE_SEMANTIC", "off").lower()
+SCHEMA_CACHE_SIMILARITY_THRESHOLD = float(
+    os.getenv("SCHEMA_CACHE_SIMILARITY_THRESHOLD", "0.95")
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_description(description: str) -> str:
+    """Fold case and whitespace so trivially edited descriptions compare equal."""
+    return " ".join(description.lower().split())
+
+
+class HashingEmbedder:
+    """
+    Local embedder based on feature hashing of words and word bigrams.
+
+    It needs no network access, which makes it a stand-in for a real embedding
+    model in tests and offline deployments.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    async def embed(self, text: str) -> List[float]:
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = [0.0] * self.dimensions
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        return _unit(vector)
+
+
+class OpenAIEmbedder:
+    """
+    Embedder backed by the OpenAI embeddings API.
+    """
+
+    def __init__(self, model: str = "text-embedding-3-small"):
+        from langchain_openai import OpenAIEmbeddings
+
+        self.client = OpenAIEmbeddings(model=model)
+
+    async def embed(self, text: str) -> List[float]:
+        return _unit(await self.client.aembed_query(text))
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return vector
+    return [value / norm for value in vector]
+
+
+class _Entry:
+    __slots__ = ("schema", "expires_at", "embedding")
+
+    def __init__(self, schema: Dict[str, Any], expires_at: float, embedding):
+        self.schema = schema
+        self.expires_at = expires_at
+        self.embedding = embedding
+
+
+class SchemaCache:
+    """
+    Cache of generated diagram structures keyed on normalized description text.
+
+    Lookups first try an exact match on the normalized description and then,
+    when an embedder is configured, the most similar stored description above
+    the similarity threshold. Entries expire after a TTL and the least recently
+    used entries are evicted beyond the size limit.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SCHEMA_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SCHEMA_CACHE_TTL_SECONDS,
+        embedder=None,
+        similarity_threshold: float = SCHEMA_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Embeddings computed during a missed lookup, reused when storing
+        self._pending_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    async def lookup(self, description: str) -> Optional[Dict[str, Any]]:
+        """Return a stored diagram structure for the description, if any.
+
+        Args:
+            description: Natural language description of the diagram
+
+        Returns:
+            Optional[Dict[str, Any]]: A copy of the stored diagram structure
+        """
+        if not self.enabled:
+            return None
+        key = normalize_description(description)
+        self._expire()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return copy.deepcopy(entry.schema)
+
+        embedding = await self._embed(key) if self._entries else None
+        if embedding is not None:
+            best_key, best_score = None, -1.0
+            for entry_key, entry in self._entries.items():
+                if entry.embedding is None:
+                    continue
+                score = sum(a * b for a, b in zip(embedding, entry.embedding))
+                if score > best_score:
+                    best_key, best_score = entry_key, score
+            if best_score >= self.similarity_threshold:
+                logger.info(f"Semantic schema cache hit (similarity {best_score:.3f})")
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return copy.deepcopy(self._entries[best_key].schema)
+
+        self.misses += 1
+        return None
+
+    async def store(self, description: str, schema: Dict[str, Any]) -> None:
+        """Remember the diagram structure generated for a description."""
+        if not self.enabled:
+            return
+        key = normalize_description(description)
+        embedding = await self._embed(key)
+        self._pending_embeddings.pop(key, None)
+        self._entries[key] = _Entry(
+            copy.deepcopy(schema), time.monotonic() + self.ttl_seconds, embedding
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _embed(self, key: str) -> Optional[List[float]]:
+        """Embed a normalized description, or return None without an embedder."""
+        if self.embedder is None:
+            return None
+        embedding = self._pending_embeddings.get(key)
+        if embedding is None:
+            try:
+                embedding = await self.embedder.embed(key)
+            except Exception as e:
+                # The similarity tier is best effort; fall back to exact matching
+                logger.warning(f"Failed to embed description: {str(e)}")
+                return None
+            self._pending_embeddings[key] = embedding
+            while len(self._pending_embeddings) > 64:
+                self._pending_embeddings.popitem(last=False)
+        return embedding
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items() if entry.expires_at <= now
+        ]
+        for key in expired:
+            del self._entries[key]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def build_schema_cache() -> SchemaCache:
+    """Create a schema cache configured from environment variables."""
+    embedder = None
+    if SCHEMA_CACHE_SEMANTIC == "local":
+        embedder = HashingEmbedder()
+    elif SCHEMA_CACHE_SEMANTIC == "openai":
+        embedder = OpenAIEmbedder()
+    return SchemaCache(embedder=embedder)
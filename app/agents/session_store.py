@@ -0,0 +1,288 @@
+from typing import Dict, Any, List, Optional
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+class SessionStore(ABC):
+    """
+    Server-side conversation history, keyed by session id.
+
+    Clients send only the new message with their session id; the backend
+    appends each turn itself. Unknown or expired sessions read as empty.
+    """
+
+    @abstractmethod
+    async def create(self, session_id: str) -> None:
+        """Store an empty session so it exists before its first turn."""
+
+    @abstractmethod
+    async def history(self, session_id: str) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def last_diagram(self, session_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def append(self, session_id: str, *messages: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    async def set_last_diagram(self, session_id: str, diagram: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
+
+
+class _Session:
+    __slots__ = ("messages", "last_diagram", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.messages: List[Dict[str, Any]] = []
+        self.last_diagram: Optional[Dict[str, Any]] = None
+        self.expires_at = expires_at
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    In-process session store with LRU eviction and a sliding TTL.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+    ):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None and session.expires_at <= now:
+            del self._sessions[session_id]
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = _Session(now + self.ttl_seconds)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        session.expires_at = now + self.ttl_seconds
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def create(self, session_id: str) -> None:
+        with self._lock:
+            self._get(session_id, create=True)
+
+    async def history(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            session = self._get(session_id)
+            return list(session.messages) if session is not None else []
+
+    async def last_diagram(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._get(session_id)
+            return session.last_diagram if session is not None else None
+
+    async def append(self, session_id: str, *messages: Dict[str, Any]) -> None:
+        with self._lock:
+            session = self._get(session_id, create=True)
+            session.messages.extend(messages)
+            del session.messages[: -self.max_messages]
+
+    async def set_last_diagram(self, session_id: str, diagram: Dict[str, Any]) -> None:
+        with self._lock:
+            self._get(session_id, create=True).last_diagram = diagram
+
+    async def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+            }
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the async Redis API the session
+    store uses, for development and tests without a Redis server.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expiry: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> bool:
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._data
+
+    async def rpush(self, key: str, *values: str) -> int:
+        with self._lock:
+            if not self._live(key):
+                self._data[key] = []
+            self._data[key].extend(values)
+            return len(self._data[key])
+
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            if not self._live(key):
+                return []
+            values = self._data[key]
+            return values[start : None if end == -1 else end + 1]
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            if self._live(key):
+                values = self._data[key]
+                self._data[key] = values[start : None if end == -1 else end + 1]
+            return True
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data.get(key) if self._live(key) else None
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        with self._lock:
+            self._data[key] = value
+            self._expiry.pop(key, None)
+            if ex is not None:
+                self._expiry[key] = time.monotonic() + ex
+            return True
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            if not self._live(key):
+                return False
+            self._expiry[key] = time.monotonic() + seconds
+            return True
+
+    async def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expiry.pop(key, None)
+            return removed
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store on Redis (or anything implementing the same commands), so
+    sessions are shared across backend replicas.
+
+    Each session is a capped list of JSON messages plus a JSON string holding
+    the last generated diagram, both with a sliding TTL.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        ttl_seconds: int = SESSION_TTL_SECONDS,
+        prefix: str = "session",
+    ):
+        self.client = client
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def _messages_key(self, session_id: str) -> str:
+        return f"{self.prefix}:{session_id}:messages"
+
+    def _diagram_key(self, session_id: str) -> str:
+        return f"{self.prefix}:{session_id}:diagram"
+
+    async def create(self, session_id: str) -> None:
+        # Redis has no empty lists, so an empty diagram slot marks the session
+        await self.client.set(
+            self._diagram_key(session_id), json.dumps(None), ex=self.ttl_seconds
+        )
+
+    async def history(self, session_id: str) -> List[Dict[str, Any]]:
+        values = await self.client.lrange(self._messages_key(session_id), 0, -1)
+        return [json.loads(value) for value in values]
+
+    async def last_diagram(self, session_id: str) -> Optional[Dict[str, Any]]:
+        value = await self.client.get(self._diagram_key(session_id))
+        return json.loads(value) if value is not None else None
+
+    async def append(self, session_id: str, *messages: Dict[str, Any]) -> None:
+        key = self._messages_key(session_id)
+        await self.client.rpush(key, *(json.dumps(m) for m in messages))
+        await self.client.ltrim(key, -self.max_messages, -1)
+        await self.client.expire(key, self.ttl_seconds)
+        await self.client.expire(self._diagram_key(session_id), self.ttl_seconds)
+
+    async def set_last_diagram(self, session_id: str, diagram: Dict[str, Any]) -> None:
+        await self.client.set(
+            self._diagram_key(session_id), json.dumps(diagram), ex=self.ttl_seconds
+        )
+
+    async def delete(self, session_id: str) -> bool:
+        removed = await self.client.delete(
+            self._messages_key(session_id), self._diagram_key(session_id)
+        )
+        return removed > 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self.client).__name__}
+
+
+def build_session_store() -> SessionStore:
+    """Create the session store selected by SESSION_STORE."""
+    if SESSION_STORE == "redis":
+        import redis.asyncio as redis
+
+        logger.info("Using Redis session store")
+        return RedisSessionStore(redis.from_url(REDIS_URL, decode_responses=True))
+    if SESSION_STORE == "local-redis":
+        return RedisSessionStore(LocalRedis())
+    if SESSION_STORE != "memory":
+        raise ValueError(f"Unsupported session store: {SESSION_STORE}")
+    return InMemorySessionStore()
@@ -0,0 +1,169 @@
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
+import os
+import re
+import time
+import asyncio
+import logging
+from langchain_core.callbacks import get_usage_metadata_callback
+
+from app.schemas.diagram import AssistantRequest, AssistantResponse
+from .schema_cache import HashingEmbedder, normalize_description
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "off").lower() == "on"
+SPECULATION_MATCH_THRESHOLD = float(os.getenv("SPECULATION_MATCH_THRESHOLD", "0.85"))
+
+# Messages that ask for something to be drawn are the ones likely to hand off
+_DIAGRAM_INTENT = re.compile(
+    r"\b(diagrams?|draw|sketch|visuali[sz]e|architecture|topology|chart|render)\b",
+    re.IGNORECASE,
+)
+# How many recent user messages make up the speculative description
+_CONTEXT_MESSAGES = 3
+
+
+class SpeculativeDiagramPrefetch:
+    """
+    Start diagram structure generation alongside the assistant call.
+
+    When the user's message looks like a diagram request, the structure is
+    generated from the conversation so far while the assistant is still
+    answering. If the assistant then hands off with a description similar to
+    the speculative one, the prefetched structure is used; otherwise the
+    speculative call is cancelled. Outcomes and token spend are counted so the
+    latency win can be weighed against the extra LLM calls.
+    """
+
+    def __init__(
+        self,
+        diagram_agent,
+        enabled: bool = SPECULATIVE_PREFETCH,
+        threshold: float = SPECULATION_MATCH_THRESHOLD,
+    ):
+        self.diagram_agent = diagram_agent
+        self.enabled = enabled
+        self.threshold = threshold
+        self.embedder = HashingEmbedder()
+        self.started = 0
+        self.hits = 0
+        self.mismatches = 0
+        self.no_handoff = 0
+        self.failures = 0
+        self.tokens_used = 0
+        self.tokens_wasted = 0
+        self.estimated_tokens_cancelled = 0
+        self.seconds_saved = 0.0
+
+    def should_speculate(self, request: AssistantRequest) -> bool:
+        return self.enabled and bool(_DIAGRAM_INTENT.search(request.message or ""))
+
+    @staticmethod
+    def speculative_description(request: AssistantRequest) -> str:
+        """Build a diagram description from the most recent user messages."""
+        user_messages = [
+            str(message.get("content", ""))
+            for message in request.context or []
+            if message.get("role") == "user"
+        ]
+        user_messages.append(request.message)
+        return "\n".join(user_messages[-_CONTEXT_MESSAGES:])
+
+    async def _generate(self, description: str) -> Tuple[Dict[str, Any], int, float]:
+        with get_usage_metadata_callback() as usage:
+            diagram_dict = await self.diagram_agent.generate_diagram_structure(
+                description
+            )
+        tokens = sum(u.get("total_tokens", 0) for u in usage.usage_metadata.values())
+        return diagram_dict, tokens, time.perf_counter()
+
+    async def similarity(self, first: str, second: str) -> float:
+        """Cosine similarity of the two descriptions after normalization."""
+        a = await self.embedder.embed(normalize_description(first))
+        b = await self.embedder.embed(normalize_description(second))
+        return sum(x * y for x, y in zip(a, b))
+
+    async def run(
+        self,
+        request: AssistantRequest,
+        respond: Callable[[AssistantRequest], Awaitable[AssistantResponse]],
+    ) -> Tuple[AssistantResponse, Optional[Dict[str, Any]]]:
+        """
+        Run the assistant, speculatively generating the diagram structure.
+
+        Args:
+            request (AssistantRequest): User message and conversation context.
+            respond: Coroutine function producing the assistant response.
+
+        Returns:
+            Tuple[AssistantResponse, Optional[Dict[str, Any]]]: The assistant
+            response and the prefetched diagram structure, or None when there
+            is nothing usable to reuse.
+        """
+        if not self.should_speculate(request):
+            return await respond(request), None
+
+        description = self.speculative_description(request)
+        self.started += 1
+        started_at = time.perf_counter()
+        task = asyncio.create_task(self._generate(description))
+
+        try:
+            reply = await respond(request)
+        except BaseException:
+            self._cancel(task, description)
+            raise
+        replied_at = time.perf_counter()
+
+        handoff = reply.invoke_diagram_generation
+        if not handoff:
+            self.no_handoff += 1
+            self._cancel(task, description)
+            return reply, None
+
+        score = await self.similarity(description, handoff)
+        if score < self.threshold:
+            logger.info(f"Speculative diagram discarded (similarity {score:.2f})")
+            self.mismatches += 1
+            self._cancel(task, description)
+            return reply, None
+
+        try:
+            diagram_dict, tokens, finished_at = await task
+        except Exception as e:
+            logger.warning(f"Speculative diagram generation failed: {str(e)}")
+            self.failures += 1
+            return reply, None
+
+        # Everything the speculative call did before the assistant returned is
+        # time the sequential pipeline would have spent afterwards
+        self.hits += 1
+        self.tokens_used += tokens
+        self.seconds_saved += min(finished_at, replied_at) - started_at
+        logger.info(f"Using speculative diagram structure (similarity {score:.2f})")
+        return reply, diagram_dict
+
+    def _cancel(self, task: asyncio.Task, description: str) -> None:
+        if task.done():
+            # Finished before we could cancel it: its tokens are pure overhead
+            if not task.cancelled() and task.exception() is None:
+                self.tokens_wasted += task.result()[1]
+            return
+        task.cancel()
+        self.estimated_tokens_cancelled += count_tokens(description)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "hits": self.hits,
+            "mismatches": self.mismatches,
+            "no_handoff": self.no_handoff,
+            "failures": self.failures,
+            "tokens_used": self.tokens_used,
+            "tokens_wasted": self.tokens_wasted,
+            "estimated_tokens_cancelled": self.estimated_tokens_cancelled,
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
@@ -0,0 +1,68 @@
+from typing import Dict, Any, List
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-4o")
+
+# Fallback ratio when tiktoken or its encoding files are unavailable
+_CHARS_PER_TOKEN = 4
+# Chat format overhead per message and for priming the reply (OpenAI cookbook)
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_REPLY = 3
+
+# Loaded once at startup by load_encoding(); None until then or if it failed
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def load_encoding():
+    """
+    Load the tiktoken encoding for TOKENIZER_MODEL.
+
+    tiktoken may download the encoding file on first use, so call this at
+    startup, off the event loop, never from request code. Until it has loaded,
+    and if loading fails, tokens are estimated from text length.
+
+    Returns:
+        The encoding, or None if it could not be loaded
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+            except Exception as e:
+                logger.warning(
+                    f"tiktoken unavailable ({str(e)}); estimating tokens from length"
+                )
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in a string with the local tokenizer, if loaded."""
+    encoding = _encoding
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_content(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, default=str)
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Count the prompt tokens a list of chat messages will use."""
+    total = _TOKENS_PER_REPLY
+    for message in messages:
+        total += _TOKENS_PER_MESSAGE + count_tokens(message_content(message))
+    return total
@@ -1,17 +1,95 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import logging
 import os
-from app.schemas.diagram import DiagramRequest, AssistantRequest
+import json
+import base64
+import functools
+from app.schemas.diagram import (
+    DiagramRequest,
+    AssistantRequest,
+    AssistantResponse,
+    AssistantDiagramRequest,
+    AssistantDiagramResponse,
+    SessionResponse,
+    DiagramEditRequest,
+    DiagramEditResponse,
+    DiagramBatchRequest,
+    JobResponse,
+)
 from app.agents.digram_generating_agent import DiagramGeneratingAgent
 from app.agents.assistant_agent import AssistantAgent
-from app.tools.generate_graph import parse_diagram_schema
+from app.agents.speculation import SpeculativeDiagramPrefetch
+from app.agents.session_store import build_session_store, new_session_id
+from app.tools.generate_graph import (
+    RENDER_MODE,
+    parse_diagram_schema,
+    render_diagram_bytes,
+    render_flight,
+)
+from app.tools.render_cache import get_render_cache, render_cache_stats
+from app.tools.node_registry import NODE_CLASSES
+from app.batch import (
+    BATCH_MAX_ITEMS,
+    BATCH_LLM_CONCURRENCY,
+    BATCH_RENDER_CONCURRENCY,
+    generate_batch,
+    ndjson_stream,
+    zip_stream,
+)
+from app.jobs import JobManager, JobQueueFullError, SUCCEEDED
+from app.tools.rate_limit import RateLimitedError, client_key
+from app.tools.llm_calls import LLMTimeoutError
+from app.tools.schema_patch import apply_patch, patch_size, SchemaPatchError
+from app.tools.render_pool import (
+    RenderPoolSaturatedError,
+    RenderTimeoutError,
+    render_pool,
+)
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["diagram-generation"])
+
+def _client_id(http_request: Request) -> str:
+    """Identify the caller for fair scheduling and per-client rate limits."""
+    return http_request.headers.get("X-Client-Id") or (
+        http_request.client.host if http_request.client else "anonymous"
+    )
+
+
+async def _bind_client(http_request: Request) -> None:
+    client_key.set(_client_id(http_request))
+
+
+def _llm_timed_out(error: LLMTimeoutError) -> HTTPException:
+    logger.warning(f"LLM call timed out: {str(error)}")
+    return HTTPException(status_code=504, detail=f"Model timed out: {str(error)}")
+
+
+def _rate_limited(error: RateLimitedError) -> HTTPException:
+    logger.warning(f"Rate limited: {str(error)}")
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+router = APIRouter(tags=["diagram-generation"], dependencies=[Depends(_bind_client)])
 diagram_agent = DiagramGeneratingAgent()
 assistant_agent = AssistantAgent()
+speculation = SpeculativeDiagramPrefetch(diagram_agent)
+session_store = build_session_store()
+
+
+async def _run_diagram_job(description: str):
+    diagram_dict = await diagram_agent.generate_diagram_structure(description)
+    image = await render_diagram_bytes(diagram_dict, os.getenv("TEMP_DIR"))
+    return diagram_dict, image
+
+
+job_manager = JobManager(_run_diagram_job)
 
 @router.post(
     "/generate-diagram",
@@ -22,7 +100,8 @@ async def generate_diagram(request: DiagramRequest):
     """
     Generate a diagram based on a natural language description.
 
-    Returns the diagram image file.
+    Returns the diagram image file. With a `session_id`, the diagram also becomes
+    that session's last diagram, so the assistant can refer back to it.
     """
     # Input validation
     if not request.description or not request.description.strip():
@@ -38,17 +117,37 @@ async def generate_diagram(request: DiagramRequest):
         diagram_dict = await diagram_agent.generate_diagram_structure(request.description)
         # logger.info(f"Generated diagram structure: {diagram_dict}")
 
+        temp_dir = os.getenv("TEMP_DIR")
+
+        if RENDER_MODE == "memory":
+            # Render straight to bytes, skipping the filesystem round trip
+            image = await render_diagram_bytes(diagram_dict, temp_dir)
+            logger.info(f"Generated diagram in memory ({len(image)} bytes)")
+            await _remember_diagram(request.session_id, diagram_dict)
+            return Response(content=image, media_type="image/png")
+
         # Generate the actual diagram image
-        diagram_path = await parse_diagram_schema(diagram_dict, os.getenv("TEMP_DIR"))
+        diagram_path = await parse_diagram_schema(diagram_dict, temp_dir)
         logger.info(f"Generated diagram at: {diagram_path}")
+        await _remember_diagram(request.session_id, diagram_dict)
+
+        # Files outside the render cache are single use; remove them once sent
+        cleanup = None
+        if not get_render_cache(temp_dir).enabled:
+            cleanup = BackgroundTask(os.remove, diagram_path)
 
         # Return the image file
         return FileResponse(
             path=diagram_path,
             media_type="image/png",
             filename=os.path.basename(diagram_path),
+            background=cleanup,
         )
 
+    except RateLimitedError as rl:
+        raise _rate_limited(rl)
+    except LLMTimeoutError as te:
+        raise _llm_timed_out(te)
     except ValueError as ve:
         # Check if this is an unsupported node type error
         error_msg = str(ve)
@@ -69,6 +168,19 @@ async def generate_diagram(request: DiagramRequest):
             status_code=400,
             detail=f"Missing required element in diagram definition: {str(ke)}",
         )
+    except RenderPoolSaturatedError as se:
+        # Shed load instead of queueing renders without bound
+        logger.warning(f"Rejected diagram render: {str(se)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Diagram renderer is busy, please retry: {str(se)}",
+            headers={"Retry-After": str(se.retry_after)},
+        )
+    except RenderTimeoutError as te:
+        logger.warning(f"Diagram render timed out: {str(te)}")
+        raise HTTPException(
+            status_code=504, detail=f"Diagram rendering timed out: {str(te)}"
+        )
     except Exception as e:
         # Catch-all for any other exceptions
         logger.error(f"Error generating diagram: {str(e)}", exc_info=True)
@@ -76,9 +188,260 @@ async def generate_diagram(request: DiagramRequest):
             status_code=500, detail=f"Error generating diagram: {str(e)}"
         )
 
+@router.post(
+    "/generate-diagrams/batch",
+    summary="Generate many diagrams, streaming results as they complete",
+    response_class=StreamingResponse,
+)
+async def generate_diagrams_batch(request: DiagramBatchRequest):
+    """
+    Generate diagrams for many descriptions with bounded concurrency.
+
+    - **descriptions**: Diagram descriptions; identical ones are generated once
+    - **format**: `ndjson` (one JSON result per line, base64 PNG in `image`) or
+      `zip` (PNGs plus a `manifest.json` of per-item status)
+
+    Results stream back in completion order; each carries its input `index`.
+    """
+    if not request.descriptions:
+        raise HTTPException(status_code=400, detail="No descriptions provided")
+    if len(request.descriptions) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: at most {BATCH_MAX_ITEMS} descriptions",
+        )
+
+    logger.info(f"Received batch of {len(request.descriptions)} descriptions")
+    items = generate_batch(
+        request.descriptions,
+        diagram_agent,
+        output_dir=os.getenv("TEMP_DIR"),
+        llm_concurrency=min(
+            request.llm_concurrency or BATCH_LLM_CONCURRENCY, BATCH_LLM_CONCURRENCY
+        ),
+        render_concurrency=min(
+            request.render_concurrency or BATCH_RENDER_CONCURRENCY,
+            BATCH_RENDER_CONCURRENCY,
+        ),
+    )
+
+    if request.format == "zip":
+        return StreamingResponse(
+            zip_stream(items),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="diagrams.zip"'},
+        )
+    return StreamingResponse(ndjson_stream(items), media_type="application/x-ndjson")
+
+
+def _job_response(job, http_request: Request) -> JobResponse:
+    image_url = None
+    if job.status == SUCCEEDED:
+        image_url = str(http_request.url_for("get_job_image", job_id=job.id))
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        description=job.description,
+        diagram=job.diagram,
+        image_url=image_url,
+        error=job.error,
+        error_status=job.error_status,
+    )
+
+
+@router.post(
+    "/jobs",
+    summary="Queue a diagram generation job",
+    response_model=JobResponse,
+    status_code=202,
+)
+async def create_job(request: DiagramRequest, http_request: Request, response: Response):
+    """
+    Queue diagram generation and return a job id immediately.
+
+    Poll `GET /jobs/{job_id}` (optionally with `wait` to long-poll) for the
+    result. Jobs are scheduled fairly across clients, identified by the
+    `X-Client-Id` header or the caller's address.
+    """
+    if not request.description or not request.description.strip():
+        logger.warning("Empty diagram description received")
+        raise HTTPException(
+            status_code=400, detail="Diagram description cannot be empty"
+        )
+
+    try:
+        job = await job_manager.submit(request.description, _client_id(http_request))
+    except JobQueueFullError as qe:
+        logger.warning(f"Rejected diagram job: {str(qe)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Diagram job queue is full, please retry: {str(qe)}",
+            headers={"Retry-After": str(qe.retry_after)},
+        )
+
+    response.headers["Location"] = str(http_request.url_for("get_job", job_id=job.id))
+    return _job_response(job, http_request)
+
+
+@router.get("/jobs/{job_id}",
+    name="get_job",
+    summary="Fetch a diagram job's status",
+    response_model=JobResponse,
+)
+async def get_job(job_id: str, http_request: Request, wait: float = 0):
+    """
+    Return a job's status, and its diagram once it has succeeded.
+
+    - **wait**: Seconds to hold the request open until the job finishes
+      (long-polling), capped by the server
+    """
+    job = await job_manager.get(job_id, wait=wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job, http_request)
+
+
+@router.get("/jobs/{job_id}/image",
+    name="get_job_image",
+    summary="Fetch the diagram rendered by a job",
+    response_class=Response,
+)
+async def get_job_image(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None or job.status != SUCCEEDED:
+        raise HTTPException(status_code=404, detail="Diagram not found")
+    return Response(content=job.image, media_type="image/png")
+
+
+@router.post(
+    "/edit-diagram",
+    summary="Edit an existing diagram with a natural language instruction",
+    response_model=DiagramEditResponse,
+)
+async def edit_diagram(request: DiagramEditRequest):
+    """
+    Apply a change to an existing diagram without regenerating it.
+
+    - **diagram**: The current diagram schema
+    - **instruction**: The change to make, e.g. "add a WAF in front of the ALB"
+    - **render**: Also return the edited diagram as a base64 PNG (default: true)
+
+    The LLM returns only a patch, which is validated and applied locally.
+    """
+    if not request.instruction or not request.instruction.strip():
+        logger.warning("Empty edit instruction received")
+        raise HTTPException(status_code=400, detail="Edit instruction cannot be empty")
+
+    logger.info(f"Received diagram edit request: {request.instruction}")
+    diagram_dict = request.diagram.model_dump()
+
+    try:
+        patch = await diagram_agent.generate_diagram_patch(
+            diagram_dict, request.instruction
+        )
+        edited = apply_patch(diagram_dict, patch)
+        logger.info(f"Applied diagram patch touching {patch_size(patch)} elements")
+
+        image = None
+        if request.render:
+            rendered = await render_diagram_bytes(edited, os.getenv("TEMP_DIR"))
+            image = base64.b64encode(rendered).decode("ascii")
+
+        return DiagramEditResponse(diagram=edited, patch=patch, image=image)
+
+    except SchemaPatchError as pe:
+        # The model proposed a change that does not fit the current diagram
+        logger.warning(f"Rejected diagram patch: {str(pe)}")
+        raise HTTPException(status_code=422, detail=str(pe))
+    except RateLimitedError as rl:
+        raise _rate_limited(rl)
+    except LLMTimeoutError as te:
+        raise _llm_timed_out(te)
+    except ValueError as ve:
+        logger.warning(f"Invalid edit: {str(ve)}")
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(ve)}")
+    except RenderPoolSaturatedError as se:
+        logger.warning(f"Rejected diagram render: {str(se)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Diagram renderer is busy, please retry: {str(se)}",
+            headers={"Retry-After": str(se.retry_after)},
+        )
+    except RenderTimeoutError as te:
+        logger.warning(f"Diagram render timed out: {str(te)}")
+        raise HTTPException(
+            status_code=504, detail=f"Diagram rendering timed out: {str(te)}"
+        )
+    except Exception as e:
+        logger.error(f"Error editing diagram: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error editing diagram: {str(e)}")
+
+
+async def _remember_diagram(session_id, diagram):
+    """Make a diagram generated outside the assistant its session's last one."""
+    if session_id:
+        await session_store.set_last_diagram(session_id, diagram)
+
+
+async def _load_session(request: AssistantRequest):
+    """Replace the request's context with its server-side session history."""
+    if not request.session_id:
+        return request, None
+    history = await session_store.history(request.session_id)
+    last_diagram = await session_store.last_diagram(request.session_id)
+    return request.model_copy(update={"context": history}), last_diagram
+
+
+async def _save_turn(request: AssistantRequest, reply_message: str, diagram=None):
+    """Append a completed turn to the request's session, if it has one."""
+    if not request.session_id:
+        return
+    await session_store.append(
+        request.session_id,
+        {"role": "user", "content": request.message},
+        {"role": "assistant", "content": reply_message},
+    )
+    if diagram is not None:
+        await _remember_diagram(request.session_id, diagram)
+
+
+@router.post("/sessions",
+    summary="Start a server-side conversation session",
+    response_model=SessionResponse,
+)
+async def create_session():
+    """
+    Create a session so clients can send only the new message each turn.
+
+    Pass the returned `session_id` with assistant requests; the backend keeps
+    the history and ignores any `context` sent alongside it.
+    """
+    session_id = new_session_id()
+    await session_store.create(session_id)
+    return SessionResponse(session_id=session_id)
+
+
+@router.get("/sessions/{session_id}", summary="Fetch a session's history")
+async def get_session(session_id: str):
+    return {
+        "session_id": session_id,
+        "messages": await session_store.history(session_id),
+    }
+
+
+@router.delete("/sessions/{session_id}",
+    summary="Delete a session",
+    status_code=204,
+)
+async def delete_session(session_id: str):
+    if not await session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return Response(status_code=204)
+
+
 @router.post("/assistant",
     summary="Interactive diagram assistant",
-    # response_model=AssistantResponse,
+    response_model=AssistantResponse,
 )
 async def assistant(request: AssistantRequest):
     """
@@ -86,14 +449,210 @@ async def assistant(request: AssistantRequest):
 
     - **message**: User message
     - **context**: Previous conversation context (optional)
+    - **session_id**: Server-side session to read and extend instead of `context` (optional)
 
     Returns assistant response with text and/or diagram.
     """
     logger.info(f"Received assistant request: {request}")
     try:
-        response = await assistant_agent.invoke_assistant(request)
+        if request.session_id:
+            request, last_diagram = await _load_session(request)
+            reply = await assistant_agent.respond(request, last_diagram)
+            await _save_turn(request, reply.message)
+            return reply
+
+        return await assistant_agent.invoke_assistant(request)
+    except RateLimitedError as rl:
+        raise _rate_limited(rl)
+    except LLMTimeoutError as te:
+        raise _llm_timed_out(te)
+    except Exception as e:
+        logger.error(f"Error in assistant: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in assistant: {str(e)}")
+
+
+@router.post("/assistant/diagram",
+    summary="Assistant reply and diagram in a single request",
+    response_model=AssistantDiagramResponse,
+)
+async def assistant_diagram(request: AssistantDiagramRequest, http_request: Request):
+    """
+    Run the assistant and, when it asks for one, generate the diagram server-side.
+
+    - **message**: User message
+    - **context**: Previous conversation context (optional)
+    - **session_id**: Server-side session to read and extend instead of `context` (optional)
+    - **image_delivery**: `inline` (base64 PNG in `image`) or `url` (`image_url`)
+
+    A failed diagram does not fail the turn; the reason is returned in
+    `diagram_error` alongside the assistant message.
+    """
+    if not request.message or not request.message.strip():
+        logger.warning("Empty assistant message received")
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-        return response
+    logger.info(f"Received assistant diagram request: {request}")
+    try:
+        request, last_diagram = await _load_session(request)
+        # Optionally generates the diagram structure while the assistant answers
+        reply, prefetched = await speculation.run(
+            request, functools.partial(assistant_agent.respond, last_diagram=last_diagram)
+        )
+    except RateLimitedError as rl:
+        raise _rate_limited(rl)
+    except LLMTimeoutError as te:
+        raise _llm_timed_out(te)
     except Exception as e:
         logger.error(f"Error in assistant: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error in assistant: {str(e)}")
+
+    result = AssistantDiagramResponse(
+        message=reply.message, diagram_description=reply.invoke_diagram_generation
+    )
+    if not reply.invoke_diagram_generation:
+        await _save_turn(request, reply.message)
+        return result
+
+    diagram_dict = None
+    try:
+        diagram_dict = prefetched
+        if diagram_dict is None:
+            diagram_dict = await diagram_agent.generate_diagram_structure(
+                reply.invoke_diagram_generation
+            )
+        temp_dir = os.getenv("TEMP_DIR")
+
+        if request.image_delivery == "url":
+            diagram_path = await parse_diagram_schema(diagram_dict, temp_dir)
+            result.image_url = str(
+                http_request.url_for(
+                    "get_diagram", filename=os.path.basename(diagram_path)
+                )
+            )
+        else:
+            image = await render_diagram_bytes(diagram_dict, temp_dir)
+            result.image = base64.b64encode(image).decode("ascii")
+        logger.info("Generated diagram for assistant reply")
+    except Exception as e:
+        logger.warning(f"Diagram generation for assistant reply failed: {str(e)}")
+        result.diagram_error = str(e)
+        diagram_dict = None
+
+    await _save_turn(request, reply.message, diagram_dict)
+    return result
+
+
+@router.get("/diagrams/{filename}",
+    name="get_diagram",
+    summary="Fetch a rendered diagram",
+    response_class=FileResponse,
+)
+async def get_diagram(filename: str):
+    """
+    Serve a diagram rendered by the combined assistant endpoint.
+
+    Cached renders can be fetched repeatedly; uncached renders are removed
+    after they are first sent.
+    """
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="Diagram not found")
+
+    temp_dir = os.getenv("TEMP_DIR")
+    cached_path = os.path.join(get_render_cache(temp_dir).cache_dir, filename)
+    if os.path.isfile(cached_path):
+        return FileResponse(path=cached_path, media_type="image/png")
+
+    diagram_path = os.path.join(temp_dir, filename)
+    if os.path.isfile(diagram_path):
+        return FileResponse(
+            path=diagram_path,
+            media_type="image/png",
+            background=BackgroundTask(os.remove, diagram_path),
+        )
+
+    raise HTTPException(status_code=404, detail="Diagram not found")
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/assistant/stream",
+    summary="Interactive diagram assistant (streaming)",
+    response_class=StreamingResponse,
+)
+async def assistant_stream(request: AssistantRequest):
+    """
+    Streaming variant of the assistant endpoint, using Server-Sent Events.
+
+    - **message**: User message
+    - **context**: Previous conversation context (optional)
+    - **session_id**: Server-side session to read and extend instead of `context` (optional)
+
+    Emits `token` events with `{"delta": ...}` as the reply is generated, then a
+    single `done` event carrying `message` and `invoke_diagram_generation`.
+    Failures after the stream has started are reported as an `error` event.
+    """
+    if not request.message or not request.message.strip():
+        logger.warning("Empty assistant message received")
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+
+    logger.info(f"Received streaming assistant request: {request}")
+
+    async def event_stream():
+        try:
+            # Loaded inside the stream so a session store failure is an error event
+            turn, last_diagram = await _load_session(request)
+            async for event in assistant_agent.stream_assistant(turn, last_diagram):
+                event_type = event.pop("type")
+                if event_type == "done":
+                    await _save_turn(turn, event["message"])
+                yield _sse_event(event_type, event)
+        except RateLimitedError as rl:
+            logger.warning(f"Rate limited: {str(rl)}")
+            yield _sse_event(
+                "error", {"detail": str(rl), "retry_after": rl.retry_after}
+            )
+        except Exception as e:
+            logger.error(f"Error in assistant stream: {str(e)}")
+            yield _sse_event("error", {"detail": f"Error in assistant: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats", summary="Cache and pipeline statistics")
+async def stats():
+    """
+    Report counters for the caching layers in front of the diagram pipeline.
+    """
+    return {
+        "render_cache": render_cache_stats(),
+        "schema_cache": diagram_agent.cache.stats(),
+        "render_pool": render_pool.stats(),
+        "speculation": speculation.stats(),
+        "context_compaction": assistant_agent.compactor.stats(),
+        "sessions": session_store.stats(),
+        "jobs": job_manager.stats(),
+        "rate_limits": {
+            "diagram": diagram_agent.limiter.stats(),
+            "assistant": assistant_agent.limiter.stats(),
+        },
+        "node_registry": NODE_CLASSES.stats(),
+        "rule_parser": diagram_agent.rule_parser.stats(),
+        "model_tiering": diagram_agent.model_router.stats(),
+        "llm_calls": {
+            "diagram": diagram_agent.llm_calls.stats(),
+            "diagram_fast": diagram_agent.fast_llm_calls.stats(),
+            "assistant": assistant_agent.llm_calls.stats(),
+            "assistant_stream": assistant_agent.stream_llm_calls.stats(),
+        },
+        "singleflight": {
+            "diagram_structure": diagram_agent.inflight.stats(),
+            "render": render_flight.stats(),
+        },
+    }
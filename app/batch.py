@@ -0,0 +1,236 @@
+"""Generate many diagrams at once with bounded LLM and render concurrency.
+
+Usage:
+    python -m app.batch descriptions.jsonl --output diagrams/
+
+The input is a file with one description per line, either plain text or a
+JSON object holding the description under --field (default: description).
+"""
+
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterable
+import os
+import re
+import sys
+import json
+import base64
+import asyncio
+import logging
+import zipfile
+import argparse
+
+from app.agents.schema_cache import normalize_description
+from app.tools.generate_graph import render_diagram_bytes
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_RENDER_CONCURRENCY = int(os.getenv("BATCH_RENDER_CONCURRENCY", "2"))
+
+
+async def generate_batch(
+    descriptions: List[str],
+    diagram_agent,
+    output_dir: Optional[str] = None,
+    llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+    render_concurrency: int = BATCH_RENDER_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Generate and render diagrams for many descriptions.
+
+    Identical descriptions (after case and whitespace folding) are generated
+    once. Results are yielded as each item completes, not in input order.
+
+    Args:
+        descriptions: Natural language diagram descriptions
+        diagram_agent: Agent providing generate_diagram_structure
+        output_dir: Directory holding the render cache
+        llm_concurrency: Maximum concurrent LLM calls
+        render_concurrency: Maximum concurrent renders
+
+    Yields:
+        Dict[str, Any]: One result per input description, with `index`,
+        `description`, `status` ("ok" or "error") and either `schema` and
+        `image` (PNG bytes) or `error`. Deduplicated items carry `duplicate_of`.
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, description in enumerate(descriptions):
+        if not description or not description.strip():
+            yield {
+                "index": index,
+                "description": description,
+                "status": "error",
+                "error": "Diagram description cannot be empty",
+            }
+            continue
+        groups.setdefault(normalize_description(description), []).append(index)
+
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    render_slots = asyncio.Semaphore(render_concurrency)
+
+    async def run(indexes: List[int]):
+        description = descriptions[indexes[0]]
+        try:
+            async with llm_slots:
+                schema = await diagram_agent.generate_diagram_structure(description)
+            async with render_slots:
+                image = await render_diagram_bytes(schema, output_dir)
+            return indexes, {"status": "ok", "schema": schema, "image": image}
+        except Exception as e:
+            logger.warning(f"Batch item {indexes[0]} failed: {str(e)}")
+            return indexes, {"status": "error", "error": str(e)}
+
+    tasks = [asyncio.create_task(run(indexes)) for indexes in groups.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indexes, result = await next_done
+            for index in indexes:
+                item = {"index": index, "description": descriptions[index], **result}
+                if index != indexes[0]:
+                    item["duplicate_of"] = indexes[0]
+                yield item
+    finally:
+        # The consumer went away (e.g. client disconnect): stop outstanding work
+        for task in tasks:
+            task.cancel()
+
+
+def _item_json(item: Dict[str, Any], include_image: bool = True) -> Dict[str, Any]:
+    encoded = {k: v for k, v in item.items() if k != "image"}
+    if include_image and item.get("image") is not None:
+        encoded["image"] = base64.b64encode(item["image"]).decode("ascii")
+    return encoded
+
+
+async def ndjson_stream(items: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Encode batch results as newline-delimited JSON, images in base64."""
+    async for item in items:
+        yield (json.dumps(_item_json(item)) + "\n").encode("utf-8")
+
+
+class _ChunkWriter:
+    """Write-only file object collecting what zipfile writes between drains."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def item_filename(item: Dict[str, Any]) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", item["description"].lower()).strip("_")
+    return f"{item['index']:04d}_{slug[:40] or 'diagram'}.png"
+
+
+async def zip_stream(items: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Encode batch results as a zip of PNGs, streamed entry by entry.
+
+    A manifest.json with every item's status is written last.
+    """
+    writer = _ChunkWriter()
+    manifest = []
+    with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        async for item in items:
+            entry = _item_json(item, include_image=False)
+            entry.pop("schema", None)
+            if item["status"] == "ok":
+                entry["file"] = item_filename(item)
+                archive.writestr(entry["file"], item["image"])
+                yield writer.drain()
+            manifest.append(entry)
+        manifest.sort(key=lambda entry: entry["index"])
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield writer.drain()
+
+
+def read_descriptions(lines: Iterable[str], field: str = "description") -> List[str]:
+    """Read descriptions from plain text or JSON lines.
+
+    Raises:
+        ValueError: If a JSON object line has no `field`
+    """
+    descriptions = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                if field not in record:
+                    raise ValueError(f"line {number}: JSON object has no {field!r}")
+                descriptions.append(str(record[field]))
+                continue
+        descriptions.append(line)
+    return descriptions
+
+
+async def _run_cli(args: argparse.Namespace) -> int:
+    from app.agents.digram_generating_agent import DiagramGeneratingAgent
+    from app.tools.render_pool import render_pool
+
+    with open(args.input, encoding="utf-8") as f:
+        try:
+            descriptions = read_descriptions(f, args.field)
+        except ValueError as e:
+            print(f"{args.input}: {e}", file=sys.stderr)
+            return 2
+    os.makedirs(args.output, exist_ok=True)
+
+    failures = 0
+    try:
+        async for item in generate_batch(
+            descriptions,
+            DiagramGeneratingAgent(),
+            output_dir=args.cache_dir,
+            llm_concurrency=args.llm_concurrency,
+            render_concurrency=args.render_concurrency,
+        ):
+            status = _item_json(item, include_image=False)
+            status.pop("schema", None)
+            if item["status"] == "ok":
+                status["file"] = os.path.join(args.output, item_filename(item))
+                with open(status["file"], "wb") as f:
+                    f.write(item["image"])
+            else:
+                failures += 1
+            print(json.dumps(status), flush=True)
+    finally:
+        render_pool.shutdown()
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="File with one description per line")
+    parser.add_argument("--output", default="diagrams", help="Directory for PNGs")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.getenv("TEMP_DIR", "temp"),
+        help="Directory for the render cache (default: TEMP_DIR)",
+    )
+    parser.add_argument("--field", default="description", help="JSON lines field")
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    parser.add_argument(
+        "--render-concurrency", type=int, default=BATCH_RENDER_CONCURRENCY
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, os.getenv("LOG_LEVEL", "WARNING")))
+    sys.exit(asyncio.run(_run_cli(args)))
+
+
+if __name__ == "__main__":
+    main()
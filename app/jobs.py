@@ -0,0 +1,349 @@
+"""Asynchronous diagram generation jobs.
+
+Submitting a job returns immediately; a small pool of background workers takes
+jobs from a broker and clients poll (or long-poll) for the result. The default
+broker keeps the queue in process and schedules round-robin across clients, so
+one client submitting many jobs cannot starve the others. Another broker can be
+plugged in with JOB_BROKER=package.module:ClassName.
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+import os
+import time
+import uuid
+import asyncio
+import logging
+import importlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+
+from app.tools.render_pool import RenderPoolSaturatedError, RenderTimeoutError
+from app.tools.rate_limit import RateLimitedError, client_key
+from app.tools.llm_calls import LLMTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+JOB_BROKER = os.getenv("JOB_BROKER", "memory")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "100"))
+JOB_CLIENT_QUEUE_DEPTH = int(os.getenv("JOB_CLIENT_QUEUE_DEPTH", "10"))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+
+# How often the default JobBroker.wait re-reads a job that is not finished
+_POLL_INTERVAL_SECONDS = 0.25
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# Produces the diagram structure and PNG bytes for a description
+JobRunner = Callable[[str], Awaitable[Tuple[Dict[str, Any], bytes]]]
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job cannot be queued because the queue is at capacity"""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """A diagram generation job and, once finished, its result."""
+
+    __slots__ = (
+        "id",
+        "client",
+        "description",
+        "status",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "diagram",
+        "image",
+        "error",
+        "error_status",
+    )
+
+    def __init__(self, description: str, client: str):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.description = description
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.diagram: Optional[Dict[str, Any]] = None
+        self.image: Optional[bytes] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+def error_status(error: Exception) -> int:
+    """HTTP status the synchronous endpoint returns for a generation error."""
+    if isinstance(error, RateLimitedError):
+        return 429
+    if isinstance(error, RenderPoolSaturatedError):
+        return 503
+    if isinstance(error, (RenderTimeoutError, LLMTimeoutError)):
+        return 504
+    if isinstance(error, (ValueError, KeyError)):
+        return 400
+    return 500
+
+
+class JobBroker(ABC):
+    """
+    Queue and record store for diagram jobs.
+
+    `submit` must reject work with JobQueueFullError rather than queue without
+    bound, and `next_job` blocks until a queued job is available.
+    """
+
+    @abstractmethod
+    async def submit(self, job: Job) -> None:
+        pass
+
+    @abstractmethod
+    async def next_job(self) -> Job:
+        pass
+
+    @abstractmethod
+    async def update(self, job: Job) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Return the job once it has finished or `timeout` seconds have passed."""
+        deadline = time.monotonic() + timeout
+        job = await self.get(job_id)
+        while job is not None and not job.finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(_POLL_INTERVAL_SECONDS, remaining))
+            job = await self.get(job_id)
+        return job
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
+
+
+class InMemoryJobBroker(JobBroker):
+    """
+    In-process job broker with per-client queues served round-robin.
+
+    At most `max_depth` jobs wait in total and `max_client_depth` per client.
+    Finished jobs are kept for `ttl_seconds` so clients can collect them.
+    """
+
+    def __init__(
+        self,
+        max_depth: int = JOB_QUEUE_DEPTH,
+        max_client_depth: int = JOB_CLIENT_QUEUE_DEPTH,
+        ttl_seconds: float = JOB_TTL_SECONDS,
+    ):
+        self.max_depth = max_depth
+        self.max_client_depth = max_client_depth
+        self.ttl_seconds = ttl_seconds
+        self.submitted = 0
+        self.rejected = 0
+        self._jobs: Dict[str, Job] = {}
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._depth = 0
+        # asyncio primitives bind to the loop that first uses them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._available: Optional[asyncio.Condition] = None
+        self._done: Dict[str, asyncio.Event] = {}
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._available = asyncio.Condition()
+            self._done = {}
+
+    def _prune(self) -> None:
+        """Forget finished jobs, and their images, once their TTL has passed."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._done.pop(job_id, None)
+
+    async def submit(self, job: Job) -> None:
+        self._bind_loop()
+        self._prune()
+        queue = self._queues.get(job.client)
+        if self._depth >= self.max_depth:
+            self.rejected += 1
+            raise JobQueueFullError(f"{self._depth} jobs already queued")
+        if queue is not None and len(queue) >= self.max_client_depth:
+            self.rejected += 1
+            raise JobQueueFullError(f"{len(queue)} jobs already queued for this client")
+
+        self._jobs[job.id] = job
+        self._queues.setdefault(job.client, deque()).append(job)
+        self._depth += 1
+        self.submitted += 1
+        async with self._available:
+            self._available.notify()
+
+    async def next_job(self) -> Job:
+        self._bind_loop()
+        async with self._available:
+            await self._available.wait_for(lambda: self._depth > 0)
+            # Serve the least recently served client, then send it to the back
+            client, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self._depth -= 1
+            return job
+
+    async def update(self, job: Job) -> None:
+        self._bind_loop()
+        self._jobs[job.id] = job
+        if job.finished and job.id in self._done:
+            self._done.pop(job.id).set()
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        self._bind_loop()
+        self._prune()
+        job = self._jobs.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        done = self._done.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "backend": "memory",
+            "queued": self._depth,
+            "clients_waiting": len(self._queues),
+            "running": statuses.count(RUNNING),
+            "succeeded": statuses.count(SUCCEEDED),
+            "failed": statuses.count(FAILED),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "max_depth": self.max_depth,
+            "max_client_depth": self.max_client_depth,
+        }
+
+
+def build_job_broker() -> JobBroker:
+    """Create the job broker selected by JOB_BROKER."""
+    if JOB_BROKER == "memory":
+        return InMemoryJobBroker()
+    if ":" not in JOB_BROKER:
+        raise ValueError(f"Unsupported job broker: {JOB_BROKER}")
+    module_name, class_name = JOB_BROKER.split(":", 1)
+    broker_class = getattr(importlib.import_module(module_name), class_name)
+    logger.info(f"Using job broker {JOB_BROKER}")
+    return broker_class()
+
+
+class JobManager:
+    """
+    Runs queued diagram jobs on a fixed number of background workers.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        broker: Optional[JobBroker] = None,
+        workers: int = JOB_WORKERS,
+    ):
+        self.runner = runner
+        self.broker = broker if broker is not None else build_job_broker()
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the workers on the running event loop."""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"diagram-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} diagram job workers")
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, description: str, client: str) -> Job:
+        """
+        Queue a diagram generation job.
+
+        Raises:
+            JobQueueFullError: If the queue, or the client's share of it, is full
+        """
+        job = Job(description, client)
+        await self.broker.submit(job)
+        logger.info(f"Queued diagram job {job.id} for client {client}")
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Job]:
+        """Fetch a job, waiting up to `wait` seconds for it to finish."""
+        if wait > 0:
+            return await self.broker.wait(job_id, min(wait, JOB_MAX_WAIT_SECONDS))
+        return await self.broker.get(job_id)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.broker.next_job()
+            await self.run(job)
+
+    async def run(self, job: Job) -> None:
+        # LLM calls made for the job count against its submitter's rate limit
+        client_key.set(job.client)
+        job.status = RUNNING
+        job.started_at = time.time()
+        await self.broker.update(job)
+        try:
+            job.diagram, job.image = await self.runner(job.description)
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status, job.error, job.error_status = FAILED, "Job cancelled", 503
+            raise
+        except Exception as e:
+            logger.warning(f"Diagram job {job.id} failed: {str(e)}")
+            job.status, job.error, job.error_status = FAILED, str(e), error_status(e)
+        finally:
+            job.finished_at = time.time()
+            await self.broker.update(job)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, **self.broker.stats()}
@@ -2,13 +2,20 @@ import logging
 import os
 import uvicorn
 import shutil
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 from dotenv import load_dotenv
-from app.api.v1.router import router as api_router
+from app.api.v1.router import router as api_router, job_manager
+from app.api.responses import ORJSONResponse
+from app.tools.render_pool import render_pool
+from app.tools.icon_cache import icon_cache
+from app.tools.generate_graph import sweep_rendered_files
+from app.agents.tokens import load_encoding
+from app.tools.stage_timing import SERVER_TIMING, ServerTimingMiddleware
 
 # Load environment variables
 load_dotenv()
@@ -25,6 +32,21 @@ TEMP_DIR = os.getenv("TEMP_DIR", "temp")
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 
+# How often diagrams handed out by URL but never fetched are looked for
+_SWEEP_INTERVAL_SECONDS = 300
+
+
+async def sweep_temp_dir() -> None:
+    """Periodically remove uncollected diagram files from the temp directory."""
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_rendered_files, TEMP_DIR)
+            if removed:
+                logger.info(f"Removed {removed} uncollected diagrams from {TEMP_DIR}")
+        except Exception as e:
+            logger.error(f"Error sweeping temporary directory: {str(e)}")
+        await asyncio.sleep(_SWEEP_INTERVAL_SECONDS)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
@@ -37,9 +59,20 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         logger.error(f"Failed to create temp directory: {str(e)}", exc_info=True)
         raise
 
+    # Pre-warm the render workers and node icons so the first request doesn't pay for it
+    await asyncio.to_thread(icon_cache.warm)
+    # May download the tokenizer's encoding file; requests never fetch it
+    await asyncio.to_thread(load_encoding)
+    await asyncio.to_thread(render_pool.start)
+    job_manager.start()
+    sweeper = asyncio.create_task(sweep_temp_dir())
+
     yield  # Application runs here
 
     # Shutdown code
+    sweeper.cancel()
+    await job_manager.shutdown()
+    render_pool.shutdown()
     logger.info(f"Server shutting down. Cleaning up temporary directory: {TEMP_DIR}")
     try:
         if os.path.exists(TEMP_DIR):
@@ -55,6 +88,7 @@ app = FastAPI(
     description="Generate diagrams from natural language descriptions using LLM-powered agents",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Setup development CORS middleware
@@ -66,6 +100,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Report per-stage server time (LLM, render) to clients such as the benchmarks
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+
 # Include routers
 app.include_router(api_router, prefix="/api/v1")
 
@@ -1,10 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 
 # Schemas for diagram generation
 class DiagramRequest(BaseModel):
     """Request model for diagram generation"""
     description: str = Field(..., description="Natural language description of the diagram to generate")
+    session_id: Optional[str] = Field(None,
+        description="Server-side session whose last diagram this becomes (optional)")
 
 class Node(BaseModel):
     id: str = Field(..., description="Unique identifier for the node")
@@ -26,6 +28,55 @@ class DiagramSchema(BaseModel):
     edges: List[Edge] = Field(default_factory=list, description="List of edges connecting nodes")
     clusters: Optional[List[Cluster]] = Field(default_factory=list, description="Optional list of node clusters/groups")
 
+class DiagramBatchRequest(BaseModel):
+    """Request model for batch diagram generation"""
+    descriptions: List[str] = Field(..., description="Natural language descriptions of the diagrams to generate")
+    format: Literal["ndjson", "zip"] = Field("ndjson",
+        description="Stream results as NDJSON (base64 images) or as a zip of PNGs")
+    llm_concurrency: Optional[int] = Field(None, ge=1,
+        description="Maximum concurrent LLM calls, capped by the server limit")
+    render_concurrency: Optional[int] = Field(None, ge=1,
+        description="Maximum concurrent renders, capped by the server limit")
+
+# Schemas for incremental diagram edits
+class DiagramPatch(BaseModel):
+    """A change to an existing diagram, applied locally to its schema"""
+    name: Optional[str] = Field(None, description="New diagram name, if it changes")
+    add_nodes: List[Node] = Field(default_factory=list, description="Nodes to add")
+    update_nodes: List[Node] = Field(default_factory=list, description="Existing nodes (by id) whose type or label changes")
+    remove_nodes: List[str] = Field(default_factory=list, description="Ids of nodes to remove, along with their edges")
+    add_edges: List[Edge] = Field(default_factory=list, description="Edges to add")
+    remove_edges: List[Edge] = Field(default_factory=list, description="Edges to remove")
+    add_clusters: List[Cluster] = Field(default_factory=list, description="Clusters to add, or to replace by id")
+    remove_clusters: List[str] = Field(default_factory=list, description="Ids of clusters to remove; their nodes are kept")
+
+class DiagramEditRequest(BaseModel):
+    """Request model for editing an existing diagram"""
+    diagram: DiagramSchema = Field(..., description="The current diagram schema")
+    instruction: str = Field(..., description="Natural language description of the change")
+    render: bool = Field(True, description="Also render the edited diagram")
+
+class DiagramEditResponse(BaseModel):
+    """Response model for diagram edits"""
+    diagram: DiagramSchema = Field(..., description="The edited diagram schema")
+    patch: DiagramPatch = Field(..., description="The patch that was applied")
+    image: Optional[str] = Field(None, description="Base64-encoded PNG of the edited diagram")
+
+# Schemas for asynchronous diagram jobs
+class JobResponse(BaseModel):
+    """Status of an asynchronous diagram generation job"""
+    job_id: str = Field(..., description="Identifier to poll the job with")
+    status: Literal["queued", "running", "succeeded", "failed"] = Field(...,
+        description="Current job state")
+    description: str = Field(..., description="The diagram description being generated")
+    diagram: Optional[DiagramSchema] = Field(None,
+        description="Generated diagram structure, once the job has succeeded")
+    image_url: Optional[str] = Field(None,
+        description="URL of the rendered diagram, once the job has succeeded")
+    error: Optional[str] = Field(None, description="Why the job failed")
+    error_status: Optional[int] = Field(None,
+        description="HTTP status the synchronous endpoint would have returned for the failure")
+
 # Schemas for assistant endpoint
 class AssistantRequest(BaseModel):
     """Request model for the assistant endpoint"""
@@ -33,10 +84,36 @@ class AssistantRequest(BaseModel):
         description="User message for the assistant")
     context: Optional[List[Dict[str, Any]]] = Field(None, 
         description="Previous conversation context as a list of message exchanges")
+    session_id: Optional[str] = Field(None,
+        description="Server-side session holding the conversation; when set, context is not needed")
     
+class SessionResponse(BaseModel):
+    """Response model for session creation"""
+    session_id: str = Field(...,
+        description="Identifier to send with subsequent assistant requests")
+
 class AssistantResponse(BaseModel):
     """Response model for the assistant endpoint"""
     message: str = Field(..., 
         description="Assistant's response message")
     invoke_diagram_generation: Optional[str] = Field(None,
-        description="When this is set, the assistant will invoke diagram generation tool with this diagram description")
\ No newline at end of file
+        description="When this is set, the assistant will invoke diagram generation tool with this diagram description")
+
+# Schemas for the combined assistant and diagram endpoint
+class AssistantDiagramRequest(AssistantRequest):
+    """Request model for the combined assistant and diagram endpoint"""
+    image_delivery: Literal["inline", "url"] = Field("inline",
+        description="Return the diagram inline as base64 PNG, or as a URL to fetch it from")
+
+class AssistantDiagramResponse(BaseModel):
+    """Response model for the combined assistant and diagram endpoint"""
+    message: str = Field(...,
+        description="Assistant's response message")
+    diagram_description: Optional[str] = Field(None,
+        description="Diagram description the assistant requested, if any")
+    image: Optional[str] = Field(None,
+        description="Base64-encoded PNG of the diagram (inline delivery)")
+    image_url: Optional[str] = Field(None,
+        description="URL of the rendered diagram (url delivery)")
+    diagram_error: Optional[str] = Field(None,
+        description="Why the requested diagram could not be generated")
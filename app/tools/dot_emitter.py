@@ -0,0 +1,173 @@
+from typing import Dict, Any, Callable, List
+import os
+import shutil
+import subprocess
+
+import diagrams
+from diagrams import Diagram, Cluster, Edge
+
+# Root the diagrams package resolves icon paths against (see Node._load_icon)
+_ICON_BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(diagrams.__file__)))
+
+_DIRECTIONS = ("TB", "BT", "LR", "RL")
+_CURVESTYLES = ("ortho", "curved")
+_CLUSTER_BGCOLOR = "#E5F5FD"
+
+
+class DotRenderError(Exception):
+    """Raised when Graphviz fails to render DOT source"""
+
+    pass
+
+
+def _quote(value: Any) -> str:
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{text}"'
+
+
+def _attr_list(attrs: Dict[str, Any]) -> str:
+    return " ".join(f"{key}={_quote(value)}" for key, value in sorted(attrs.items()))
+
+
+def icon_path(node_class) -> str:
+    """Resolve a node class's icon the same way diagrams.Node does."""
+    return os.path.join(_ICON_BASEDIR, node_class._icon_dir, node_class._icon)
+
+
+def schema_to_dot(
+    schema: Dict[str, Any],
+    attrs: Dict[str, Any],
+    resolve_node_class: Callable[[str], type],
+    resolve_icon: Callable[[type], str] = icon_path,
+) -> str:
+    """Emit Graphviz DOT source for a diagram schema.
+
+    The output mirrors the graph the diagrams library builds for the same
+    schema (same default attributes, icons and statement order), without
+    going through its global context managers.
+
+    Args:
+        schema: Dictionary containing diagram definition
+        attrs: Diagram render attributes, as accepted by diagrams.Diagram
+        resolve_node_class: Maps a schema node type to a diagrams node class
+        resolve_icon: Maps a node class to the icon file to draw it with
+
+    Returns:
+        str: DOT source
+    """
+    diagram_name = schema.get("name", "Architecture Diagram")
+
+    direction = attrs.get("direction", "LR")
+    if direction.upper() not in _DIRECTIONS:
+        raise ValueError(f'"{direction}" is not a valid direction')
+    curvestyle = attrs.get("curvestyle", "ortho")
+    if curvestyle.lower() not in _CURVESTYLES:
+        raise ValueError(f'"{curvestyle}" is not a valid curvestyle')
+
+    graph_attrs = {
+        **Diagram._default_graph_attrs,
+        "label": diagram_name,
+        "rankdir": direction,
+        "splines": curvestyle,
+        **attrs.get("graph_attr", {}),
+    }
+    node_attrs = {**Diagram._default_node_attrs, **attrs.get("node_attr", {})}
+    edge_attrs = {**Diagram._default_edge_attrs, **attrs.get("edge_attr", {})}
+
+    strict = "strict " if attrs.get("strict") else ""
+    lines: List[str] = [
+        f"{strict}digraph {_quote(diagram_name)} {{",
+        f"\tgraph [{_attr_list(graph_attrs)}]",
+        f"\tnode [{_attr_list(node_attrs)}]",
+        f"\tedge [{_attr_list(edge_attrs)}]",
+    ]
+
+    # Map nodes to their cluster definitions
+    node_to_cluster = {}
+    for cluster_def in schema.get("clusters") or []:
+        for node_id in cluster_def.get("nodes", []):
+            node_to_cluster[node_id] = cluster_def
+
+    # Emit nodes in schema order; clustered nodes go in a subgraph block named
+    # after the cluster label, which Graphviz merges into a single cluster
+    node_ids = set()
+    for node in schema.get("nodes", []):
+        node_id = node["id"]
+        node_type = node["type"]
+        label = node.get("label") or node_id
+        NodeClass = resolve_node_class(node_type)
+        if attrs.get("autolabel"):
+            label = f"{NodeClass.__name__}\n{label}"
+
+        statement_attrs = {"label": label}
+        if NodeClass._icon:
+            statement_attrs.update(
+                {
+                    "shape": "none",
+                    "height": str(NodeClass._height + 0.4 * label.count("\n")),
+                    "image": resolve_icon(NodeClass),
+                }
+            )
+        statement = f"{_quote(node_id)} [{_attr_list(statement_attrs)}]"
+
+        if node_id in node_to_cluster:
+            cluster_def = node_to_cluster[node_id]
+            cluster_label = cluster_def.get("label") or cluster_def["id"]
+            cluster_attrs = {
+                **Cluster._default_graph_attrs,
+                "label": cluster_label,
+                "rankdir": "LR",
+                "bgcolor": _CLUSTER_BGCOLOR,
+            }
+            lines.append(f"\tsubgraph {_quote('cluster_' + cluster_label)} {{")
+            lines.append(f"\t\tgraph [{_attr_list(cluster_attrs)}]")
+            lines.append(f"\t\t{statement}")
+            lines.append("\t}")
+        else:
+            lines.append(f"\t{statement}")
+        node_ids.add(node_id)
+
+    # Emit edges between known nodes
+    connection_attrs = {**Edge._default_edge_attrs, "dir": "forward"}
+    for edge_def in schema.get("edges", []):
+        source_id = edge_def["source"]
+        target_id = edge_def["target"]
+        if source_id not in node_ids or target_id not in node_ids:
+            print(f"Warning: Edge refers to undefined node: {source_id} -> {target_id}")
+            continue
+        lines.append(
+            f"\t{_quote(source_id)} -> {_quote(target_id)}"
+            f" [{_attr_list(connection_attrs)}]"
+        )
+
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def render_dot(source: str, outformat: str = "png") -> bytes:
+    """Lay out and encode DOT source with a single `dot` invocation.
+
+    Args:
+        source: DOT source
+        outformat: Graphviz output format
+
+    Returns:
+        bytes: The encoded image
+
+    Raises:
+        DotRenderError: If Graphviz is missing or fails
+    """
+    dot_binary = shutil.which("dot")
+    if dot_binary is None:
+        raise DotRenderError("Graphviz 'dot' executable not found on PATH")
+    result = subprocess.run(
+        [dot_binary, f"-T{outformat}"],
+        input=source.encode("utf-8"),
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise DotRenderError(
+            f"Graphviz exited with status {result.returncode}: "
+            f"{result.stderr.decode('utf-8', errors='replace').strip()}"
+        )
+    return result.stdout
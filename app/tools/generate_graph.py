@@ -1,36 +1,160 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional
 import os
+import re
+import time
+import uuid
+import shutil
 import asyncio
-from diagrams import Diagram, Cluster
-
-# Import all node types at import time
-from diagrams.aws.compute import EC2, Lambda
-from diagrams.aws.database import RDS, ElastiCache, Dynamodb
-from diagrams.aws.storage import S3
-from diagrams.aws.network import ELB, ALB, VPC, APIGateway
-from diagrams.aws.management import Cloudwatch
-from diagrams.aws.security import WAF
-from diagrams.aws.integration import SQS, SNS
-from diagrams.programming.framework import Fastapi
-
-# Create a mapping of string names to actual classes
-NODE_CLASSES = {
-    "ec2": EC2,
-    "lambda": Lambda,
-    "rds": RDS,
-    "elasticache": ElastiCache,
-    "dynamodb": Dynamodb,
-    "s3": S3,
-    "elb": ELB,
-    "alb": ALB,
-    "vpc": VPC,
-    "cloudwatch": Cloudwatch,
-    "waf": WAF,
-    "apigateway": APIGateway,
-    "sqs": SQS,
-    "sns": SNS,
-    "fastapi": Fastapi,
-}
+import tempfile
+from diagrams import Diagram, Cluster, setdiagram
+
+from app.tools.render_cache import RenderCache, get_render_cache, render_cache_key
+from app.tools.render_pool import render_pool
+from app.tools.singleflight import SingleFlight
+from app.tools.dot_emitter import schema_to_dot, render_dot
+from app.tools.node_registry import NODE_CLASSES, CORE_NODE_TYPES
+from app.tools.icon_cache import icon_cache
+
+# Configuration from environment variables
+RENDER_MODE = os.getenv("RENDER_MODE", "file").lower()
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "diagrams").lower()
+RENDER_FILE_TTL_SECONDS = float(os.getenv("RENDER_FILE_TTL_SECONDS", "3600"))
+
+# Identical renders already in progress are shared rather than repeated
+render_flight = SingleFlight("render")
+
+
+def get_node_class(node_type: str):
+    """Get the appropriate node class based on node type."""
+    if node_type in NODE_CLASSES:
+        return NODE_CLASSES[node_type]
+    else:
+        available_types = ", ".join(CORE_NODE_TYPES)
+        raise ValueError(
+            f"Unsupported node type: {node_type}. Available types include: "
+            f"{available_types}, and the other diagrams provider classes"
+        )
+
+
+def get_render_attrs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the schema's render attributes over the defaults."""
+    attrs = {
+        "show": False,
+        "direction": "LR",
+        "outformat": "png",
+    }
+    attrs.update(schema.get("attributes", {}))
+    return attrs
+
+
+def draw_schema(
+    schema: Dict[str, Any], resolve_icon: Optional[Callable[[type], str]] = None
+) -> None:
+    """Add the schema's clusters, nodes and edges to the active diagram context.
+
+    Args:
+        schema: Dictionary containing diagram definition
+        resolve_icon: Maps a node class to the icon file to draw it with
+            (the class's own icon if None)
+    """
+    # Dictionary to store node objects by ID
+    node_objects = {}
+
+    # Dictionary to store cluster objects by ID
+    cluster_objects = {}
+
+    # Process clusters first to establish hierarchy
+    clusters = schema.get("clusters") or []
+    for cluster_def in clusters:
+        cluster_id = cluster_def["id"]
+        cluster_label = cluster_def.get("label") or cluster_id
+        cluster_objects[cluster_id] = Cluster(cluster_label)
+
+    # Map nodes to their clusters
+    node_to_cluster = {}
+    for cluster_def in clusters:
+        cluster_id = cluster_def["id"]
+        for node_id in cluster_def.get("nodes", []):
+            node_to_cluster[node_id] = cluster_id
+
+    # Create all nodes
+    for node in schema.get("nodes", []):
+        node_id = node["id"]
+        node_type = node["type"]
+        node_label = node.get("label") or node_id
+
+        # Get the node class
+        NodeClass = get_node_class(node_type)
+        node_attrs = {}
+        if resolve_icon is not None and NodeClass._icon:
+            node_attrs["image"] = resolve_icon(NodeClass)
+
+        # Check if this node belongs to a cluster
+        if node_id in node_to_cluster:
+            cluster_id = node_to_cluster[node_id]
+            with cluster_objects[cluster_id]:
+                node_objects[node_id] = NodeClass(node_label, **node_attrs)
+        else:
+            # Create node without a cluster
+            node_objects[node_id] = NodeClass(node_label, **node_attrs)
+
+    # Create all edges
+    for edge_def in schema.get("edges", []):
+        source_id = edge_def["source"]
+        target_id = edge_def["target"]
+
+        if source_id not in node_objects or target_id not in node_objects:
+            print(f"Warning: Edge refers to undefined node: {source_id} -> {target_id}")
+            continue
+
+        source = node_objects[source_id]
+        target = node_objects[target_id]
+
+        source >> target
+
+
+class _PipedDiagram(Diagram):
+    """Diagram context that leaves rendering to the caller instead of writing files."""
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        setdiagram(None)
+
+
+def create_diagram(schema: Dict[str, Any], attrs: Dict[str, Any]) -> str:
+    """Render a schema to the file named by attrs["filename"].
+
+    Returns:
+        str: Path to the rendered file
+    """
+    output_path = f"{attrs['filename']}.{attrs['outformat']}"
+    if RENDER_BACKEND == "dot":
+        image = create_diagram_bytes(schema, attrs)
+        with open(output_path, "wb") as f:
+            f.write(image)
+        return output_path
+
+    diagram_name = schema.get("name", "Architecture Diagram")
+    with Diagram(diagram_name, **attrs):
+        draw_schema(schema, icon_cache.resolver(attrs))
+    return output_path
+
+
+def create_diagram_bytes(schema: Dict[str, Any], attrs: Dict[str, Any]) -> bytes:
+    """Render a schema by piping its DOT source through Graphviz.
+
+    Returns:
+        bytes: The encoded image
+    """
+    if RENDER_BACKEND == "dot":
+        source = schema_to_dot(
+            schema, attrs, get_node_class, icon_cache.resolver(attrs)
+        )
+        return render_dot(source, attrs["outformat"])
+
+    diagram_name = schema.get("name", "Architecture Diagram")
+    with _PipedDiagram(diagram_name, **attrs) as diagram:
+        draw_schema(schema, icon_cache.resolver(attrs))
+    return diagram.dot.pipe(format=attrs["outformat"])
 
 
 async def parse_diagram_schema(
@@ -48,103 +172,140 @@ async def parse_diagram_schema(
 
     # Extract diagram attributes
     diagram_name = schema.get("name", "Architecture Diagram")
-    diagram_attrs = schema.get("attributes", {})
+    file_stem = (
+        re.sub(r"[^a-z0-9_-]+", "_", diagram_name.lower()).strip("_") or "diagram"
+    )
+    attrs = get_render_attrs(schema)
 
-    # Default diagram attributes
-    attrs = {
-        "show": False,
-        "direction": "LR",
-        "outformat": "png",
-        "filename": os.path.join(output_dir, diagram_name.replace(" ", "_").lower()),
-    }
-    attrs.update(diagram_attrs)
+    # Return the existing render if this exact diagram was drawn before
+    render_cache = get_render_cache(output_dir)
+    cache_key = render_cache_key(
+        schema, attrs, RENDER_BACKEND, icon_cache.scaled_size(attrs)
+    )
+    if render_cache.enabled:
+        cached_path = render_cache.get(cache_key)
+        if cached_path is not None:
+            return cached_path
+        # The cached file outlives the request, so concurrent callers can share it
+        return await render_flight.do(
+            f"file:{render_cache.cache_dir}:{cache_key}",
+            lambda: _render_file(schema, attrs, output_dir, file_stem, cache_key),
+        )
+    return await _render_file(schema, attrs, output_dir, file_stem, cache_key)
 
-    # Dictionary to store node objects by ID
-    node_objects = {}
 
-    # Dictionary to store cluster objects by ID
-    cluster_objects = {}
+async def _render_file(
+    schema: Dict[str, Any],
+    attrs: Dict[str, Any],
+    output_dir: str,
+    file_stem: str,
+    cache_key: str,
+) -> str:
+    render_cache = get_render_cache(output_dir)
 
-    def get_node_class(node_type: str):
-        """Get the appropriate node class based on node type."""
-        node_type_lower = node_type.lower()
-        if node_type_lower in NODE_CLASSES:
-            return NODE_CLASSES[node_type_lower]
-        else:
-            available_types = ", ".join(NODE_CLASSES.keys())
-            raise ValueError(
-                f"Unsupported node type: {node_type}. Available types: {available_types}"
-            )
+    # Render inside a private workspace so concurrent requests never share files
+    os.makedirs(output_dir, exist_ok=True)
+    workspace = tempfile.mkdtemp(prefix=".render-", dir=output_dir)
+    attrs["filename"] = os.path.join(workspace, file_stem)
 
-    # Prepare the expected output path
-    output_path = f"{attrs['filename']}.{attrs['outformat']}"
+    try:
+        # Run CPU-bound operation on the render pool to avoid blocking the event loop
+        result = await render_pool.run(create_diagram, schema, attrs)
 
-    # Define the diagram creation function
-    def create_diagram():
-        # Create the diagram
-        with Diagram(diagram_name, **attrs):
-            # Process clusters first to establish hierarchy
-            clusters = schema.get("clusters") or []
-            for cluster_def in clusters:
-                cluster_id = cluster_def["id"]
-                cluster_label = cluster_def.get("label", cluster_id)
-                cluster_objects[cluster_id] = Cluster(cluster_label)
-
-            # Map nodes to their clusters
-            node_to_cluster = {}
-            for cluster_def in clusters:
-                cluster_id = cluster_def["id"]
-                for node_id in cluster_def.get("nodes", []):
-                    node_to_cluster[node_id] = cluster_id
-
-            # Create all nodes
-            for node in schema.get("nodes", []):
-                node_id = node["id"]
-                node_type = node["type"]
-                node_label = node.get("label", node_id)
-
-                # Get the node class
-                NodeClass = get_node_class(node_type)
-
-                # Check if this node belongs to a cluster
-                if node_id in node_to_cluster:
-                    cluster_id = node_to_cluster[node_id]
-                    with cluster_objects[cluster_id]:
-                        node_objects[node_id] = NodeClass(node_label)
-                else:
-                    # Create node without a cluster
-                    node_objects[node_id] = NodeClass(node_label)
-
-            # Create all edges
-            for edge_def in schema.get("edges", []):
-                source_id = edge_def["source"]
-                target_id = edge_def["target"]
-
-                if source_id not in node_objects or target_id not in node_objects:
-                    print(
-                        f"Warning: Edge refers to undefined node: {source_id} -> {target_id}"
-                    )
-                    continue
-
-                source = node_objects[source_id]
-                target = node_objects[target_id]
-
-                source >> target
+        # Atomically move the finished file out of the workspace
+        if render_cache.enabled:
+            return render_cache.put(cache_key, result)
+        final_path = os.path.join(
+            output_dir, f"{file_stem}_{uuid.uuid4().hex[:12]}.{attrs['outformat']}"
+        )
+        os.replace(result, final_path)
+        return final_path
+
+    finally:
+        # Drop the workspace along with Graphviz intermediates or partial output
+        shutil.rmtree(workspace, ignore_errors=True)
 
-        return output_path
 
+def sweep_rendered_files(
+    output_dir: str, max_age: float = RENDER_FILE_TTL_SECONDS
+) -> int:
+    """Remove uncached renders that were never fetched.
+
+    Renders outside the render cache are deleted once served, so any left in
+    `output_dir` after `max_age` seconds were handed out as URLs and not
+    collected. The render cache directory manages its own files.
+
+    Args:
+        output_dir: Directory the renders were written to
+        max_age: Seconds a render is kept for collection
+
+    Returns:
+        int: Number of files removed
+    """
+    cutoff = time.time() - max_age
+    removed = 0
     try:
-        # Run CPU-bound operation in a thread pool to avoid blocking the event loop
-        result = await asyncio.to_thread(create_diagram)
-        return result
+        entries = list(os.scandir(output_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Fetched, and so removed, while we were looking
+            pass
+    return removed
+
+
+async def render_diagram_bytes(
+    schema: Dict[str, Any], cache_dir: Optional[str] = None
+) -> bytes:
+    """Render a schema in memory without writing intermediate files.
 
-    except Exception as e:
-        # If diagram creation fails, clean up any partially created file
-        if os.path.exists(output_path):
+    Args:
+        schema: Dictionary containing diagram definition
+        cache_dir: Directory holding the render cache (no caching if None)
+
+    Returns:
+        bytes: The encoded diagram image
+    """
+    attrs = get_render_attrs(schema)
+
+    cache_key = render_cache_key(
+        schema, attrs, RENDER_BACKEND, icon_cache.scaled_size(attrs)
+    )
+    render_cache = get_render_cache(cache_dir) if cache_dir else None
+    if render_cache is not None and render_cache.enabled:
+        cached_path = render_cache.get(cache_key)
+        if cached_path is not None:
             try:
-                os.remove(output_path)
-                print(f"Removed incomplete diagram file: {output_path}")
-            except OSError:
-                print(f"Failed to remove incomplete diagram file: {output_path}")
-        # Re-raise the original exception
-        raise
+                with open(cached_path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                # Evicted between lookup and read; render it again
+                pass
+
+    return await render_flight.do(
+        f"bytes:{cache_dir}:{cache_key}",
+        lambda: _render_bytes(schema, attrs, render_cache, cache_key),
+    )
+
+
+async def _render_bytes(
+    schema: Dict[str, Any],
+    attrs: Dict[str, Any],
+    render_cache: Optional[RenderCache],
+    cache_key: str,
+) -> bytes:
+    # Run CPU-bound operation on the render pool to avoid blocking the event loop
+    image = await render_pool.run(create_diagram_bytes, schema, attrs)
+
+    if render_cache is not None and render_cache.enabled:
+        await asyncio.to_thread(
+            render_cache.put_bytes, cache_key, image, attrs["outformat"]
+        )
+    return image
@@ -0,0 +1,201 @@
+from typing import Dict, Any, Callable, Optional, Tuple
+import os
+import math
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+import importlib.util
+
+from app.tools.dot_emitter import icon_path
+from app.tools.node_registry import NODE_CLASSES, CORE_NODE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+ICON_CACHE = os.getenv("ICON_CACHE", "on").lower() == "on"
+ICON_CACHE_DIR = os.getenv(
+    "ICON_CACHE_DIR", os.path.join(tempfile.gettempdir(), "diagram-icons")
+)
+
+# Graphviz draws raster output at 96 dpi unless the graph sets its own; vector
+# formats reference the icon files by path, so they keep the originals
+_DEFAULT_DPI = 96.0
+_DEFAULT_NODE_WIDTH = 1.4
+_RASTER_FORMATS = ("png", "jpg", "jpeg", "gif", "bmp")
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def png_size(path: str) -> Optional[Tuple[int, int]]:
+    """Read a PNG's width and height from its header, or None if it isn't one."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or not header.startswith(_PNG_SIGNATURE):
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def icon_size_px(attrs: Dict[str, Any]) -> Optional[int]:
+    """
+    Largest size, in pixels, an icon is drawn at for these render attributes.
+
+    Returns:
+        Optional[int]: The size, or None if the output format is not a raster
+        image
+    """
+    if str(attrs.get("outformat", "png")).lower() not in _RASTER_FORMATS:
+        return None
+    dpi = float(attrs.get("graph_attr", {}).get("dpi", _DEFAULT_DPI))
+    width = float(attrs.get("node_attr", {}).get("width", _DEFAULT_NODE_WIDTH))
+    return math.ceil(width * dpi)
+
+
+class IconCache:
+    """
+    Index of the node icons, plus icons pre-scaled to the size they are drawn at.
+
+    The index maps every icon of the registry's providers to its pixel size
+    and is read from the PNG headers once. Icons larger than the size a render
+    draws them at are scaled down once with Pillow and kept on disk, keyed by
+    the source file and the size, so Graphviz reads and scales a small file
+    instead of the original on every render. Pillow is a backend dependency;
+    if it is missing, a warning is logged and the original icons are used.
+    """
+
+    def __init__(self, cache_dir: str = ICON_CACHE_DIR, enabled: bool = ICON_CACHE):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.scaled = 0
+        self._sizes: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._variants: Dict[Tuple[str, int], str] = {}
+        self._indexed = False
+        self._lock = threading.Lock()
+
+    def build_index(self) -> int:
+        """Record the pixel size of every icon the node registry can use."""
+        spec = importlib.util.find_spec("diagrams")
+        resources = os.path.join(
+            os.path.dirname(list(spec.submodule_search_locations)[0]), "resources"
+        )
+        sizes = {}
+        for provider in NODE_CLASSES.providers:
+            for dirpath, _, filenames in os.walk(os.path.join(resources, provider)):
+                for filename in filenames:
+                    if filename.endswith(".png"):
+                        path = os.path.join(dirpath, filename)
+                        sizes[path] = png_size(path)
+        with self._lock:
+            self._sizes.update(sizes)
+            self._indexed = True
+        logger.info(f"Indexed {len(sizes)} node icons")
+        return len(sizes)
+
+    def warm(self, size_px: Optional[int] = None) -> None:
+        """Build the index and pre-scale the core node types' icons."""
+        if not self.enabled:
+            return
+        if importlib.util.find_spec("PIL") is None:
+            self._disable_without_pillow()
+            return
+        self.build_index()
+        size_px = size_px or icon_size_px({})
+        for node_type in CORE_NODE_TYPES:
+            node_class = NODE_CLASSES[node_type]
+            if node_class._icon:
+                self.icon_file(node_class, size_px)
+
+    def icon_file(self, node_class, size_px: Optional[int]) -> str:
+        """
+        Path of the icon to draw a node class with.
+
+        Args:
+            node_class: diagrams node class with an icon
+            size_px: Size the icon is drawn at (None keeps the original file)
+
+        Returns:
+            str: The pre-scaled icon if one applies, else the original icon
+        """
+        source = icon_path(node_class)
+        if not self.enabled or size_px is None:
+            return source
+
+        key = (source, size_px)
+        variant = self._variants.get(key)
+        if variant is None:
+            variant = self._scaled_variant(source, size_px)
+            with self._lock:
+                self._variants[key] = variant
+        return variant
+
+    def _scaled_variant(self, source: str, size_px: int) -> str:
+        if source not in self._sizes:
+            self._sizes[source] = png_size(source)
+        size = self._sizes[source]
+        if size is None or max(size) <= size_px:
+            return source
+
+        stat = os.stat(source)
+        digest = hashlib.sha1(
+            f"{source}:{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8")
+        ).hexdigest()[:16]
+        # Keep the icon's own file name, so DOT source still says which icon it is
+        target = os.path.join(
+            self.cache_dir, f"{digest}-{size_px}-{os.path.basename(source)}"
+        )
+        if os.path.exists(target):
+            return target
+
+        try:
+            from PIL import Image
+        except ImportError:
+            self._disable_without_pillow()
+            return source
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".png", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f, Image.open(source) as image:
+                image.thumbnail((size_px, size_px), Image.LANCZOS)
+                image.save(f, format="PNG")
+            # Atomic, so renders in other workers never read a partial icon
+            os.replace(tmp_path, target)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logger.warning(f"Could not scale icon {source}: {str(e)}")
+            return source
+        with self._lock:
+            self.scaled += 1
+        return target
+
+    def _disable_without_pillow(self) -> None:
+        logger.warning(
+            "ICON_CACHE is on but Pillow is not installed; node icons will not be "
+            "pre-scaled. Install the backend extras or set ICON_CACHE=off."
+        )
+        self.enabled = False
+
+    def scaled_size(self, attrs: Dict[str, Any]) -> Optional[int]:
+        """Size icons are pre-scaled to for these attributes, or None if off."""
+        return icon_size_px(attrs) if self.enabled else None
+
+    def resolver(self, attrs: Dict[str, Any]) -> Callable[[type], str]:
+        """Icon lookup for one render with the given attributes."""
+        size_px = icon_size_px(attrs)
+        return lambda node_class: self.icon_file(node_class, size_px)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "indexed_icons": len(self._sizes) if self._indexed else 0,
+                "variants": len(self._variants),
+                "scaled": self.scaled,
+            }
+
+
+icon_cache = IconCache()
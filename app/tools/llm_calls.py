@@ -0,0 +1,217 @@
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+from app.tools.rate_limit import LLMLimiter
+from app.tools.stage_timing import stage
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# Budget for one call across all its attempts and backoff. /assistant/diagram
+# makes two calls, so twice this must stay below the client's read timeout
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "50"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "off").lower() == "on"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+
+# Latencies kept for the hedge delay, and how many are needed before hedging
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+# Longest single backoff, whatever the attempt number or Retry-After says
+_MAX_BACKOFF_SECONDS = 30.0
+
+T = TypeVar("T")
+
+
+class LLMTimeoutError(Exception):
+    """Raised when an LLM call does not finish within its deadline"""
+
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed LLM call is worth repeating."""
+    return isinstance(
+        error,
+        (
+            LLMTimeoutError,
+            APITimeoutError,
+            APIConnectionError,
+            RateLimitError,
+            InternalServerError,
+        ),
+    )
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMCaller:
+    """
+    Deadline, retry and hedging policy for one agent's LLM calls.
+
+    Every attempt runs under the agent's limiter and the per-attempt timeout,
+    and all attempts of one call share a total deadline. Retryable failures
+    are repeated with full-jitter exponential backoff while time remains. With
+    hedging on, an attempt that outlives the recent `hedge_percentile` latency
+    gets a second, identical request, and whichever finishes first is used.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limiter: LLMLimiter,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        deadline: float = LLM_DEADLINE_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_RETRY_BACKOFF,
+        hedging: bool = LLM_HEDGING,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+    ):
+        self.name = name
+        self.limiter = limiter
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Make an LLM call under the deadline, retry and hedging policy.
+
+        Args:
+            fn: Starts one request to the model; called once per attempt
+
+        Returns:
+            The model response
+
+        Raises:
+            LLMTimeoutError: If the call ran out of time
+            RateLimitedError: If an attempt is not admitted by the limiter
+        """
+        self.calls += 1
+        with stage("llm"):
+            return await self._call(fn)
+
+    async def _call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        deadline_at = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            try:
+                delay = self.hedge_delay()
+                if delay is None:
+                    return await self._attempt(fn, deadline_at)
+                return await self._hedged(fn, delay, deadline_at)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                wait = random.uniform(0, self.backoff * 2**attempt)
+                wait = min(max(wait, _retry_after(e) or 0), _MAX_BACKOFF_SECONDS)
+                if time.monotonic() + wait >= deadline_at:
+                    # No time left for another attempt
+                    raise
+                self.retries += 1
+                logger.warning(
+                    f"{self.name} LLM call failed ({type(e).__name__}: {str(e)}); "
+                    f"retrying in {wait:.2f}s"
+                )
+                await asyncio.sleep(wait)
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], deadline_at: float) -> T:
+        async with self.limiter.slot():
+            started = time.monotonic()
+            timeout = min(self.timeout, deadline_at - started)
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+                result = await asyncio.wait_for(fn(), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise LLMTimeoutError(
+                    f"{self.name} LLM call timed out after "
+                    f"{time.monotonic() - started:.0f}s"
+                )
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+    async def _hedged(
+        self, fn: Callable[[], Awaitable[T]], delay: float, deadline_at: float
+    ) -> T:
+        primary = asyncio.ensure_future(self._attempt(fn, deadline_at))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            logger.info(f"{self.name} LLM call slower than {delay:.2f}s; sending hedge")
+            hedge = asyncio.ensure_future(self._attempt(fn, deadline_at))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+            # Both failed; report the original request's error
+            return primary.result()
+        finally:
+            # Also stops the requests when the caller is cancelled mid-wait
+            for task in pending:
+                task.cancel()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging does not apply."""
+        if not self.hedging or len(self._latencies) < _HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(
+            len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100)
+        )
+        return max(self.hedge_min_delay, latencies[index])
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedging": self.hedging,
+            "hedge_delay": round(delay, 3) if delay is not None else None,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+        }
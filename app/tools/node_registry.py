@@ -0,0 +1,158 @@
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import os
+import re
+import logging
+import importlib
+import importlib.util
+import threading
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+NODE_PROVIDERS = [
+    provider.strip().lower()
+    for provider in os.getenv(
+        "NODE_PROVIDERS", "aws,gcp,azure,k8s,onprem,programming"
+    ).split(",")
+    if provider.strip()
+]
+
+# The original node types keep resolving to exactly these classes, whatever
+# other providers define a class of the same name
+_PINNED = {
+    "ec2": "aws.compute.EC2",
+    "lambda": "aws.compute.Lambda",
+    "rds": "aws.database.RDS",
+    "elasticache": "aws.database.ElastiCache",
+    "dynamodb": "aws.database.Dynamodb",
+    "s3": "aws.storage.S3",
+    "elb": "aws.network.ELB",
+    "alb": "aws.network.ALB",
+    "vpc": "aws.network.VPC",
+    "cloudwatch": "aws.management.Cloudwatch",
+    "waf": "aws.security.WAF",
+    "apigateway": "aws.network.APIGateway",
+    "sqs": "aws.integration.SQS",
+    "sns": "aws.integration.SNS",
+    "fastapi": "programming.framework.Fastapi",
+}
+CORE_NODE_TYPES = list(_PINNED)
+
+# The provider modules are generated code: one class per node, followed by
+# "Alias = Class" lines, so they can be indexed without importing them
+_CLASS_PATTERN = re.compile(r"^class ([A-Za-z]\w*)\(", re.M)
+_ALIAS_PATTERN = re.compile(r"^([A-Za-z]\w*) = ([A-Za-z]\w*)\s*$", re.M)
+_NON_NAME = re.compile(r"[^a-z0-9.]")
+
+
+def normalize_node_type(node_type: str) -> str:
+    """Lowercase a node type and drop spaces and punctuation other than dots."""
+    return _NON_NAME.sub("", node_type.lower())
+
+
+def _index_module(path: str) -> List[Tuple[str, str]]:
+    """(name, class) pairs for a provider module's node classes and aliases."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    classes = set(_CLASS_PATTERN.findall(source))
+    entries = [(name, name) for name in sorted(classes)]
+    entries += [
+        (alias, target)
+        for alias, target in _ALIAS_PATTERN.findall(source)
+        if target in classes
+    ]
+    return entries
+
+
+class NodeRegistry(Mapping):
+    """
+    Node types of the diagrams provider catalog, imported on first use.
+
+    The catalog is indexed from the provider modules' source the first time a
+    type is looked up. Each class is reachable by its name or alias, by
+    "provider.name" and by "provider.module.name", all matched after
+    normalize_node_type. Bare names shared by several providers go to the
+    first provider in `providers`. A class's module is only imported when the
+    class itself is first requested.
+    """
+
+    def __init__(self, providers: Optional[List[str]] = None):
+        self.providers = list(providers if providers is not None else NODE_PROVIDERS)
+        self._index: Optional[Dict[str, Tuple[str, str]]] = None
+        self._classes: Dict[Tuple[str, str], type] = {}
+        self._lock = threading.Lock()
+
+    def _catalog(self) -> Dict[str, Tuple[str, str]]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build_index()
+        return self._index
+
+    def _build_index(self) -> Dict[str, Tuple[str, str]]:
+        spec = importlib.util.find_spec("diagrams")
+        root = list(spec.submodule_search_locations)[0]
+        index: Dict[str, Tuple[str, str]] = {}
+
+        for key, qualified in _PINNED.items():
+            module, name = qualified.rsplit(".", 1)
+            index[key] = (f"diagrams.{module}", name)
+
+        for provider in self.providers:
+            provider_dir = os.path.join(root, provider)
+            if not os.path.isdir(provider_dir):
+                logger.warning(f"Unknown diagrams provider: {provider}")
+                continue
+            for filename in sorted(os.listdir(provider_dir)):
+                if not filename.endswith(".py") or filename.startswith("_"):
+                    continue
+                module = filename[:-3]
+                entries = _index_module(os.path.join(provider_dir, filename))
+                for name, target in entries:
+                    entry = (f"diagrams.{provider}.{module}", target)
+                    key = normalize_node_type(name)
+                    index.setdefault(key, entry)
+                    index.setdefault(f"{provider}.{key}", entry)
+                    index[f"{provider}.{module}.{key}"] = entry
+
+        logger.info(
+            f"Indexed {len(set(index.values()))} node classes from "
+            f"{', '.join(self.providers)}"
+        )
+        return index
+
+    def __contains__(self, node_type: object) -> bool:
+        return (
+            isinstance(node_type, str)
+            and normalize_node_type(node_type) in self._catalog()
+        )
+
+    def __getitem__(self, node_type: str) -> type:
+        entry = self._catalog().get(normalize_node_type(node_type))
+        if entry is None:
+            raise KeyError(node_type)
+        node_class = self._classes.get(entry)
+        if node_class is None:
+            module, name = entry
+            node_class = getattr(importlib.import_module(module), name)
+            self._classes[entry] = node_class
+        return node_class
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._catalog())
+
+    def __len__(self) -> int:
+        return len(self._catalog())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": self.providers,
+            "indexed": self._index is not None,
+            "node_types": len(set(self._index.values())) if self._index else 0,
+            "resolved": len(self._classes),
+        }
+
+
+# Create a mapping of string names to actual classes
+NODE_CLASSES = NodeRegistry()
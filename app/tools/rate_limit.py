@@ -0,0 +1,278 @@
+from typing import Dict, Any, Optional, AsyncIterator
+import os
+import math
+import time
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from openai import RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables; each agent's limiter reads
+# <NAME>_LLM_<SETTING> first (e.g. DIAGRAM_LLM_RPS) and falls back to these
+LLM_RPS = float(os.getenv("LLM_RPS", "5"))
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_CLIENT_RPS = float(os.getenv("LLM_CLIENT_RPS", "1"))
+LLM_CLIENT_BURST = int(os.getenv("LLM_CLIENT_BURST", "5"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_ADAPTIVE_LIMIT = os.getenv("LLM_ADAPTIVE_LIMIT", "on").lower() == "on"
+
+# Adaptive mode: halve the rate on an upstream 429 (at most once per cooldown),
+# then win it back a step at a time on successful calls
+_BACKOFF_FACTOR = 0.5
+_BACKOFF_COOLDOWN_SECONDS = 1.0
+_RECOVERY_STEP = 0.05
+_MIN_RATE_FRACTION = 0.1
+# Per-client buckets kept before the least recently used are dropped
+_MAX_CLIENTS = 1024
+
+# Who the current request is for; set per request by the API layer
+client_key: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "client_key", default="anonymous"
+)
+
+
+class RateLimitedError(Exception):
+    """Raised when an LLM call is not admitted within the queue timeout"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_upstream_rate_limit(error: BaseException) -> bool:
+    """Whether an error, or the error it wraps, is a provider 429."""
+    while error is not None:
+        if isinstance(error, RateLimitError):
+            return True
+        error = error.__cause__
+    return False
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second.
+
+    A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Take a token, possibly one that has not been refilled yet.
+
+        Returns:
+            Optional[float]: Seconds to wait before the token may be used, or
+            None (without taking it) if that would exceed `max_wait`
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def refund(self) -> None:
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class LLMLimiter:
+    """
+    Admission control for calls to an LLM provider.
+
+    A call is admitted once it has a token from the shared bucket and from its
+    client's bucket and one of `max_in_flight` slots is free. Calls that cannot
+    be admitted within `queue_timeout` are rejected straight away with
+    RateLimitedError rather than left to queue. In adaptive mode the shared
+    rate backs off when the provider answers with a rate limit error.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = LLM_RPS,
+        burst: int = LLM_BURST,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        client_rate: float = LLM_CLIENT_RPS,
+        client_burst: int = LLM_CLIENT_BURST,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+        adaptive: bool = LLM_ADAPTIVE_LIMIT,
+    ):
+        self.name = name
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.admitted = 0
+        self.rejected = 0
+        self.upstream_limited = 0
+        self._bucket = TokenBucket(rate, burst)
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._in_flight = 0
+        self._last_backoff = 0.0
+        # asyncio primitives bind to the loop that first uses them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._released: Optional[asyncio.Condition] = None
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._released = asyncio.Condition()
+
+    def _client_bucket(self, key: str) -> TokenBucket:
+        bucket = self._clients.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst)
+            self._clients[key] = bucket
+            while len(self._clients) > _MAX_CLIENTS:
+                self._clients.popitem(last=False)
+        self._clients.move_to_end(key)
+        return bucket
+
+    def _reject(self, reason: str, retry_after: float) -> RateLimitedError:
+        self.rejected += 1
+        logger.warning(f"Rejected {self.name} LLM call: {reason}")
+        return RateLimitedError(
+            f"Too many {self.name} requests: {reason}",
+            retry_after=max(1, math.ceil(retry_after)),
+        )
+
+    async def _acquire(self) -> None:
+        self._bind_loop()
+        deadline = time.monotonic() + self.queue_timeout
+        key = client_key.get()
+        client_bucket = self._client_bucket(key)
+
+        client_wait = client_bucket.reserve(self.queue_timeout)
+        if client_wait is None:
+            raise self._reject(
+                f"rate limit for client {key}", client_bucket.wait_time()
+            )
+        shared_wait = self._bucket.reserve(self.queue_timeout)
+        if shared_wait is None:
+            client_bucket.refund()
+            raise self._reject("rate limit", self._bucket.wait_time())
+        try:
+            await asyncio.sleep(max(client_wait, shared_wait))
+            if self.max_in_flight > 0 and self._in_flight >= self.max_in_flight:
+                async with self._released:
+                    await asyncio.wait_for(
+                        self._released.wait_for(
+                            lambda: self._in_flight < self.max_in_flight
+                        ),
+                        max(0.0, deadline - time.monotonic()),
+                    )
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # A call that is never made gives its rate budget back
+            client_bucket.refund()
+            self._bucket.refund()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("too many calls in flight", 1)
+            raise
+        self._in_flight += 1
+        self.admitted += 1
+
+    async def _release(self) -> None:
+        self._in_flight -= 1
+        if self.max_in_flight > 0:
+            async with self._released:
+                self._released.notify()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold an admitted slot for one LLM call.
+
+        Raises:
+            RateLimitedError: If the call is not admitted within the queue timeout
+        """
+        await self._acquire()
+        try:
+            yield
+        except BaseException as e:
+            if is_upstream_rate_limit(e):
+                self._backoff()
+            raise
+        else:
+            self._recover()
+        finally:
+            await self._release()
+
+    def _backoff(self) -> None:
+        self.upstream_limited += 1
+        now = time.monotonic()
+        if not self.adaptive or now - self._last_backoff < _BACKOFF_COOLDOWN_SECONDS:
+            return
+        self._last_backoff = now
+        floor = self.rate * _MIN_RATE_FRACTION
+        self._bucket.rate = max(floor, self._bucket.rate * _BACKOFF_FACTOR)
+        logger.warning(
+            f"Upstream rate limit hit; {self.name} LLM rate lowered to "
+            f"{self._bucket.rate:.2f}/s"
+        )
+
+    def _recover(self) -> None:
+        if self.adaptive and self._bucket.rate < self.rate:
+            self._bucket.rate = min(
+                self.rate, self._bucket.rate + self.rate * _RECOVERY_STEP
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "effective_rate": round(self._bucket.rate, 3),
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "clients": len(self._clients),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "upstream_limited": self.upstream_limited,
+        }
+
+
+def build_llm_limiter(name: str) -> LLMLimiter:
+    """Create the limiter for one agent, with per-agent environment overrides."""
+    prefix = f"{name.upper()}_LLM_"
+
+    def setting(key: str, default: Any) -> str:
+        return os.getenv(prefix + key, str(default))
+
+    return LLMLimiter(
+        name,
+        rate=float(setting("RPS", LLM_RPS)),
+        burst=int(setting("BURST", LLM_BURST)),
+        max_in_flight=int(setting("MAX_IN_FLIGHT", LLM_MAX_IN_FLIGHT)),
+        client_rate=float(setting("CLIENT_RPS", LLM_CLIENT_RPS)),
+        client_burst=int(setting("CLIENT_BURST", LLM_CLIENT_BURST)),
+        queue_timeout=float(
+            setting("QUEUE_TIMEOUT_SECONDS", LLM_QUEUE_TIMEOUT_SECONDS)
+        ),
+    )
@@ -0,0 +1,227 @@
+from typing import Dict, Any, Optional
+import os
+import json
+import tempfile
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "256"))
+RENDER_CACHE_DIRNAME = "render_cache"
+
+# Render attributes that only affect where/how the output is written, not its content
+_VOLATILE_ATTRS = ("filename", "show")
+
+
+def normalize_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a diagram schema to the fields that affect the rendered image.
+
+    Defaults are filled in the same way the renderer fills them, so two schemas
+    that render identically normalize identically.
+
+    Args:
+        schema: Dictionary containing diagram definition
+
+    Returns:
+        Dict[str, Any]: Normalized diagram definition
+    """
+    return {
+        "name": schema.get("name", "Architecture Diagram"),
+        "nodes": [
+            {
+                "id": node["id"],
+                "type": node["type"].lower(),
+                "label": node.get("label") or node["id"],
+            }
+            for node in schema.get("nodes", [])
+        ],
+        "edges": [
+            {"source": edge["source"], "target": edge["target"]}
+            for edge in schema.get("edges", [])
+        ],
+        "clusters": [
+            {
+                "id": cluster["id"],
+                "label": cluster.get("label") or cluster["id"],
+                "nodes": list(cluster.get("nodes", [])),
+            }
+            for cluster in schema.get("clusters") or []
+        ],
+    }
+
+
+def render_cache_key(
+    schema: Dict[str, Any],
+    attrs: Dict[str, Any],
+    backend: str = "diagrams",
+    icon_size: Optional[int] = None,
+) -> str:
+    """Compute the content address of a render.
+
+    Args:
+        schema: Dictionary containing diagram definition
+        attrs: Diagram render attributes
+        backend: Rendering backend that produces the output
+        icon_size: Size node icons are pre-scaled to (None for the originals)
+
+    Returns:
+        str: Hex digest identifying the rendered output
+    """
+    render_attrs = {k: v for k, v in attrs.items() if k not in _VOLATILE_ATTRS}
+    canonical = json.dumps(
+        {
+            "schema": normalize_schema(schema),
+            "attrs": render_attrs,
+            "backend": backend,
+            "icon_size": icon_size,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Bounded on-disk store of rendered diagrams with an in-memory LRU index.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = RENDER_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_existing()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _load_existing(self) -> None:
+        """Index renders left on disk by a previous process, oldest first."""
+        if not self.enabled or not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            key, _ = os.path.splitext(filename)
+            if os.path.isfile(path) and not filename.startswith("."):
+                entries.append((os.path.getmtime(path), key, path))
+        for _, key, path in sorted(entries):
+            self._index[key] = path
+        self._evict()
+        logger.info(f"Indexed {len(self._index)} cached renders in {self.cache_dir}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of a cached render, or None on a miss."""
+        with self._lock:
+            path = self._index.get(key)
+            if path is not None and not os.path.exists(path):
+                # The file was removed underneath us (e.g. temp dir cleanup)
+                del self._index[key]
+                path = None
+            if path is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return path
+
+    def put(self, key: str, source_path: str) -> str:
+        """Move a freshly rendered file into the store.
+
+        Args:
+            key: Content address of the render
+            source_path: Path of the rendered file
+
+        Returns:
+            str: Path of the file inside the store
+        """
+        _, extension = os.path.splitext(source_path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached_path = os.path.join(self.cache_dir, f"{key}{extension}")
+        os.replace(source_path, cached_path)
+        self._add(key, cached_path)
+        return cached_path
+
+    def put_bytes(self, key: str, data: bytes, outformat: str) -> str:
+        """Write an in-memory render into the store.
+
+        Args:
+            key: Content address of the render
+            data: Encoded image
+            outformat: Image format, used as the file extension
+
+        Returns:
+            str: Path of the file inside the store
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached_path = os.path.join(self.cache_dir, f"{key}.{outformat}")
+        fd, partial_path = tempfile.mkstemp(prefix=".partial-", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(partial_path, cached_path)
+        except BaseException:
+            os.remove(partial_path)
+            raise
+        self._add(key, cached_path)
+        return cached_path
+
+    def _add(self, key: str, cached_path: str) -> None:
+        with self._lock:
+            self._index[key] = cached_path
+            self._index.move_to_end(key)
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._index) > self.max_entries:
+            _, path = self._index.popitem(last=False)
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except OSError:
+                logger.warning(f"Failed to remove evicted render: {path}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_caches: Dict[str, RenderCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_render_cache(output_dir: str) -> RenderCache:
+    """Return the render cache living under the given output directory."""
+    cache_dir = os.path.join(output_dir, RENDER_CACHE_DIRNAME)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = RenderCache(cache_dir)
+        return _caches[cache_dir]
+
+
+def render_cache_stats() -> Dict[str, Any]:
+    """Aggregate hit/miss counters across all render caches."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    totals = {"entries": 0, "hits": 0, "misses": 0, "evictions": 0}
+    for cache in caches:
+        for name, value in cache.stats().items():
+            if name in totals:
+                totals[name] += value
+    return totals
@@ -0,0 +1,171 @@
+from typing import Dict, Any, Callable, Optional
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.tools.stage_timing import stage
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+RENDER_EXECUTOR = os.getenv("RENDER_EXECUTOR", "process").lower()
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDER_QUEUE_DEPTH = int(os.getenv("RENDER_QUEUE_DEPTH", "16"))
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "60"))
+
+
+class RenderPoolSaturatedError(Exception):
+    """Raised when the render pool has no free worker or queue slot"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RenderTimeoutError(Exception):
+    """Raised when a render does not finish within the configured timeout"""
+
+    pass
+
+
+def _warm_worker() -> None:
+    """Load the core node classes and icons once per worker, before the first job."""
+    import app.tools.generate_graph  # noqa: F401
+    from app.tools.icon_cache import icon_cache
+
+    icon_cache.warm()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class RenderPool:
+    """
+    Dedicated, bounded worker pool for diagram rendering.
+
+    Process workers keep the diagrams graph construction off the event loop's
+    GIL. At most `max_workers + queue_depth` renders are admitted at once;
+    further submissions are rejected immediately so callers can shed load.
+    """
+
+    def __init__(
+        self,
+        executor: str = RENDER_EXECUTOR,
+        max_workers: int = RENDER_WORKERS,
+        queue_depth: int = RENDER_QUEUE_DEPTH,
+        timeout: float = RENDER_TIMEOUT_SECONDS,
+    ):
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unsupported render executor: {executor}")
+        self.executor = executor
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_depth
+
+    def start(self) -> None:
+        """Create the worker pool and pre-warm every worker."""
+        with self._lock:
+            if self._pool is not None:
+                return
+            if self.executor == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="render"
+                )
+            pool = self._pool
+        if self.executor == "process":
+            # Process workers are spawned on demand; force them all up now
+            for future in [pool.submit(_ping) for _ in range(self.max_workers)]:
+                future.result()
+        logger.info(
+            f"Started {self.executor} render pool with {self.max_workers} workers"
+        )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.info("Render pool shut down")
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a render function on the pool.
+
+        Args:
+            fn: Module-level (picklable) render function
+            *args: Arguments passed to fn
+
+        Returns:
+            Any: The function's result
+
+        Raises:
+            RenderPoolSaturatedError: If all workers and queue slots are taken
+            RenderTimeoutError: If the render exceeds the timeout
+        """
+        if self._pool is None:
+            await asyncio.to_thread(self.start)
+
+        with self._lock:
+            if self._pool is None:
+                raise RenderPoolSaturatedError("Render pool is shutting down")
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise RenderPoolSaturatedError(
+                    f"Render pool saturated ({self._in_flight} renders in flight)"
+                )
+            self._in_flight += 1
+            future = self._pool.submit(fn, *args)
+
+        # Release the slot only when the worker is actually done, even after a
+        # timeout, so abandoned renders still count against capacity
+        future.add_done_callback(self._release)
+
+        try:
+            with stage("render"):
+                return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError as e:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise RenderTimeoutError(
+                f"Render did not finish within {self.timeout:g} seconds"
+            ) from e
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executor": self.executor,
+                "workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+render_pool = RenderPool()
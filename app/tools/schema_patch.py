@@ -0,0 +1,108 @@
+from typing import Dict, Any, List
+import copy
+
+from app.schemas.diagram import DiagramPatch, DiagramSchema
+
+
+class SchemaPatchError(ValueError):
+    """Raised when a patch does not apply cleanly to a diagram schema"""
+
+    pass
+
+
+def _edge_key(edge: Dict[str, Any]) -> tuple:
+    return (edge["source"], edge["target"])
+
+
+def apply_patch(schema: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply a diagram patch to a schema without modifying either.
+
+    Args:
+        schema: Dictionary containing diagram definition
+        patch: Dictionary following the DiagramPatch model
+
+    Returns:
+        Dict[str, Any]: The edited diagram definition
+
+    Raises:
+        SchemaPatchError: If the patch or the resulting diagram is invalid
+    """
+    try:
+        patch = DiagramPatch.model_validate(patch)
+        current = DiagramSchema.model_validate(schema).model_dump()
+    except ValueError as e:
+        raise SchemaPatchError(f"Invalid diagram patch: {str(e)}") from e
+
+    result = copy.deepcopy(current)
+    nodes = {node["id"]: node for node in result["nodes"]}
+    errors: List[str] = []
+
+    # Removals cascade to the edges and cluster memberships of removed nodes
+    for node_id in patch.remove_nodes:
+        if nodes.pop(node_id, None) is None:
+            errors.append(f"cannot remove unknown node '{node_id}'")
+
+    for node in patch.update_nodes:
+        if node.id not in nodes:
+            errors.append(f"cannot update unknown node '{node.id}'")
+            continue
+        nodes[node.id] = {
+            **nodes[node.id],
+            **node.model_dump(exclude_none=True),
+        }
+
+    for node in patch.add_nodes:
+        if node.id in nodes:
+            errors.append(f"node '{node.id}' already exists")
+            continue
+        nodes[node.id] = node.model_dump()
+
+    removed_edges = {_edge_key(edge.model_dump()) for edge in patch.remove_edges}
+    edges = [
+        edge
+        for edge in result["edges"]
+        if _edge_key(edge) not in removed_edges
+        and edge["source"] in nodes
+        and edge["target"] in nodes
+    ]
+    existing_edges = {_edge_key(edge) for edge in edges}
+    for edge in patch.add_edges:
+        edge_dict = edge.model_dump()
+        if edge.source not in nodes or edge.target not in nodes:
+            errors.append(
+                f"edge {edge.source} -> {edge.target} references unknown node"
+            )
+        elif _edge_key(edge_dict) not in existing_edges:
+            edges.append(edge_dict)
+            existing_edges.add(_edge_key(edge_dict))
+
+    clusters = {cluster["id"]: cluster for cluster in result.get("clusters") or []}
+    for cluster_id in patch.remove_clusters:
+        if clusters.pop(cluster_id, None) is None:
+            errors.append(f"cannot remove unknown cluster '{cluster_id}'")
+    for cluster in patch.add_clusters:
+        unknown = [node_id for node_id in cluster.nodes if node_id not in nodes]
+        if unknown:
+            errors.append(f"cluster '{cluster.id}' references unknown nodes {unknown}")
+            continue
+        clusters[cluster.id] = cluster.model_dump()
+    for cluster in clusters.values():
+        cluster["nodes"] = [node_id for node_id in cluster["nodes"] if node_id in nodes]
+
+    if errors:
+        raise SchemaPatchError("Invalid diagram patch: " + "; ".join(errors))
+
+    result["name"] = patch.name or result["name"]
+    result["nodes"] = list(nodes.values())
+    result["edges"] = edges
+    result["clusters"] = [cluster for cluster in clusters.values() if cluster["nodes"]]
+    return result
+
+
+def patch_size(patch: Dict[str, Any]) -> int:
+    """Count the elements a patch touches."""
+    return sum(
+        len(value)
+        for value in DiagramPatch.model_validate(patch).model_dump().values()
+        if isinstance(value, list)
+    )
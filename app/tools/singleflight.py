@@ -0,0 +1,87 @@
+from typing import Dict, Any, Callable, Awaitable, TypeVar
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "on").lower() == "on"
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving while
+    it is in flight await the same task and receive its result or exception.
+    The task is shielded, so one caller going away (e.g. a client disconnect)
+    does not cancel the work for the others. When the last waiting caller is
+    cancelled the task is cancelled too, so abandoned work stops spending.
+    """
+
+    def __init__(self, name: str, enabled: bool = SINGLEFLIGHT):
+        self.name = name
+        self.enabled = enabled
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        # Callers currently awaiting each in-flight task
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn`, or join the in-flight run for the same key.
+
+        Args:
+            key: Identity of the work; equal keys must produce equal results
+            fn: Coroutine function doing the work
+
+        Returns:
+            The result of the shared run
+        """
+        self.calls += 1
+        if not self.enabled:
+            self.executions += 1
+            return await fn()
+
+        task = self._in_flight.get(key)
+        # Tasks left over from another event loop (e.g. between test clients) can't be awaited
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            logger.info(f"Coalesced {self.name} call with one already in flight")
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(task) == 1:
+                task.cancel()
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        self._waiters.pop(task, None)
+        # Mark the exception retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
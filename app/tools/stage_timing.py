@@ -0,0 +1,76 @@
+from typing import Dict, Optional, Iterator
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+# Configuration from environment variables
+SERVER_TIMING = os.getenv("SERVER_TIMING", "off").lower() == "on"
+
+# Seconds spent per stage by the current request; None outside a timed request
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Add the time spent in the block to the current request's `name` stage.
+
+    Does nothing outside a request timed by ServerTimingMiddleware.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """Format stage timings as a Server-Timing header value, in milliseconds."""
+    entries = [*timings.items(), ("total", total)]
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in entries)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware reporting per-stage server time in a Server-Timing header.
+
+    Stages are recorded with `stage()` anywhere in the request's task, or in
+    tasks it starts, e.g. `llm` for model calls and `render` for diagram
+    renders. `total` covers the request up to the start of the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                value = server_timing_header(timings, time.perf_counter() - started)
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", value.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
@@ -0,0 +1,86 @@
+"""Compare ways of sending the /assistant reply from the API to the client.
+
+Usage:
+    python -m benchmarks.assistant_payload [--sizes 1 10 100] [--repeat 200]
+
+For each reply size (in KB of message text) this times the server-side
+encoding and the client-side decoding of an AssistantResponse. "repr" is
+the previous wire format, a Python repr string sent as a JSON string and read
+back with ast.literal_eval. "json" is the standard library encoder, and
+"orjson" is the application's default response class.
+"""
+
+import argparse
+import ast
+import json
+import statistics
+import time
+
+import orjson
+
+from app.api.responses import ORJSONResponse
+from app.schemas.diagram import AssistantResponse
+
+
+def build_response(size_kb: int) -> AssistantResponse:
+    """Create a reply with roughly size_kb kilobytes of markdown text."""
+    paragraph = (
+        "- **ALB** routes HTTPS traffic to the EC2 web tier, which reads from "
+        "RDS and caches sessions in ElastiCache. It's a 'typical' setup.\n"
+    )
+    message = paragraph * max(1, size_kb * 1024 // len(paragraph))
+    return AssistantResponse(
+        message=message,
+        invoke_diagram_generation="An ALB in front of two EC2 instances and RDS",
+    )
+
+
+def encoders(response: AssistantResponse) -> dict:
+    return {
+        "repr": lambda: json.dumps(str(response.model_dump())).encode("utf-8"),
+        "json": lambda: json.dumps(response.model_dump()).encode("utf-8"),
+        "orjson": lambda: ORJSONResponse(response.model_dump()).body,
+    }
+
+
+DECODERS = {
+    "repr": lambda body: ast.literal_eval(json.loads(body)),
+    "json": json.loads,
+    "orjson": orjson.loads,
+}
+
+
+def time_call(fn, repeat: int) -> float:
+    """Return the median wall time of fn() in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    header = f"{'KB':>5} {'format':>7} {'encode us':>10} {'decode us':>10}"
+    print(header)
+    print("-" * len(header))
+
+    for size in args.sizes:
+        response = build_response(size)
+        expected = response.model_dump()
+        for name, encode in encoders(response).items():
+            body = encode()
+            decode = DECODERS[name]
+            assert decode(body) == expected
+            encode_us = time_call(encode, args.repeat)
+            decode_us = time_call(lambda: decode(body), args.repeat)
+            print(f"{size:>5} {name:>7} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
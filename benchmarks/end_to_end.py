@@ -0,0 +1,346 @@
+"""Load-test the API end to end against a local OpenAI stand-in.
+
+Usage:
+    python -m benchmarks.end_to_end [--scenarios diagram assistant]
+        [--requests 50] [--concurrency 8] [--latency 0.5]
+        [--tokens-per-second 100] [--diagram-nodes 8]
+        [--env KEY=VALUE ...] [--output results.json] [--baseline old.json]
+
+Starts benchmarks.fake_openai in-process and `app.main:app` under uvicorn in
+a subprocess pointed at it. It then sends `--requests` requests per scenario
+with `--concurrency` in flight. For each scenario it reports requests per
+second, p50/p95/p99 latency and the median time per stage:
+
+- llm and render are read from the app's Server-Timing header
+- io is the rest of the server's time
+- transport is the client's latency beyond the server's total
+
+Results are saved as JSON, tagged with the git commit, under
+benchmarks/results/ by default. `--baseline` prints the change against an
+earlier results file.
+
+Descriptions are unique per request, and the fake server names every
+diagram it returns after its request, so neither the schema cache nor the
+render cache answers them. Pass --repeat-descriptions to measure the cached
+path instead: the schema cache then returns the same diagram each time, and
+its render is cached too.
+
+The app runs with rate limiting and the rule-based parser off; override any
+setting with --env.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+
+from benchmarks.fake_openai import create_app
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STAGES = ("llm", "render", "io", "transport")
+_STARTUP_TIMEOUT_SECONDS = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(values: list, percent: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def parse_server_timing(header: str) -> dict:
+    """Turn "llm;dur=12.5, total;dur=20.1" into {"llm": 12.5, "total": 20.1}."""
+    timings = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                timings[name] = float(value)
+    return timings
+
+
+def start_fake_openai(port: int, args) -> uvicorn.Server:
+    app = create_app(args.latency, args.tokens_per_second, args.diagram_nodes)
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + _STARTUP_TIMEOUT_SECONDS
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Fake OpenAI server did not start")
+        time.sleep(0.05)
+    return server
+
+
+def app_environment(fake_port: int, temp_dir: str, overrides: list) -> dict:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "SERVER_TIMING": "on",
+        "TEMP_DIR": temp_dir,
+        "RULE_PARSER": "off",
+        "LLM_RPS": "0",
+        "LLM_CLIENT_RPS": "0",
+        "LLM_MAX_IN_FLIGHT": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    for override in overrides:
+        key, _, value = override.partition("=")
+        env[key] = value
+    return env
+
+
+def start_app(port: int, env: dict) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    deadline = time.monotonic() + _STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup ({process.returncode})")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not become healthy")
+
+
+def scenario_request(scenario: str, index: int, repeat: bool) -> tuple:
+    suffix = "" if repeat else f" (variant {index})"
+    if scenario == "diagram":
+        description = (
+            "A web application with a load balancer, a tier of EC2 web servers, "
+            f"a Redis cache and a PostgreSQL database inside a VPC{suffix}"
+        )
+        return "/api/v1/generate-diagram", {"description": description}
+    if scenario == "assistant":
+        message = f"What should a typical web application include?{suffix}"
+        return "/api/v1/assistant", {"message": message}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+async def run_scenario(base_url: str, scenario: str, args) -> dict:
+    """Send the scenario's requests and summarize latency, throughput and stages."""
+    samples = []
+    errors = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def send(client: httpx.AsyncClient, index: int, record: bool) -> None:
+        path, payload = scenario_request(scenario, index, args.repeat_descriptions)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    path, json=payload, headers={"X-Client-Id": f"bench-{index}"}
+                )
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latency_ms = (time.perf_counter() - started) * 1000
+        if not record:
+            return
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+            return
+        timing = parse_server_timing(response.headers.get("server-timing", ""))
+        total = timing.get("total", latency_ms)
+        llm = timing.get("llm", 0.0)
+        render = timing.get("render", 0.0)
+        samples.append(
+            {
+                "latency": latency_ms,
+                "llm": llm,
+                "render": render,
+                "io": max(0.0, total - llm - render),
+                "transport": max(0.0, latency_ms - total),
+            }
+        )
+
+    timeout = httpx.Timeout(args.request_timeout)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        for index in range(args.warmup):
+            await send(client, -1 - index, record=False)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(send(client, index, record=True) for index in range(args.requests))
+        )
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": args.requests,
+        "succeeded": len(samples),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+    }
+    if samples:
+        latencies = [sample["latency"] for sample in samples]
+        result["latency_ms"] = {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(statistics.mean(latencies), 1),
+        }
+        result["stages_ms"] = {
+            stage: round(statistics.median(sample[stage] for sample in samples), 1)
+            for stage in STAGES
+        }
+    return result
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    header = (
+        f"{'scenario':>10} {'ok':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} " + " ".join(f"{stage:>9}" for stage in STAGES)
+    )
+    print(header)
+    print("-" * len(header))
+    for scenario, result in results.items():
+        latency = result.get("latency_ms", {})
+        stages = result.get("stages_ms", {})
+        print(
+            f"{scenario:>10} {result['succeeded']:>5} {result['rps']:>7.2f} "
+            f"{latency.get('p50', 0):>8.1f} {latency.get('p95', 0):>8.1f} "
+            f"{latency.get('p99', 0):>8.1f} "
+            + " ".join(f"{stages.get(stage, 0):>9.1f}" for stage in STAGES)
+        )
+        if result["errors"]:
+            print(f"{'':>10} errors: {result['errors']}")
+
+    if baseline is None:
+        return
+    print(f"\nChange against {baseline.get('commit', 'baseline')}:")
+    for scenario, result in results.items():
+        before = baseline.get("results", {}).get(scenario)
+        if not before or "latency_ms" not in before or "latency_ms" not in result:
+            continue
+        changes = [f"rps {_change(before['rps'], result['rps'])}"]
+        changes += [
+            f"{key} {_change(before['latency_ms'][key], result['latency_ms'][key])}"
+            for key in ("p50", "p95", "p99")
+        ]
+        print(f"{scenario:>10} " + ", ".join(changes))
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["diagram", "assistant"],
+        choices=["diagram", "assistant"],
+    )
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--diagram-nodes", type=int, default=8)
+    parser.add_argument("--repeat-descriptions", action="store_true")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    fake_port, app_port = free_port(), free_port()
+    fake_server = start_fake_openai(fake_port, args)
+    with tempfile.TemporaryDirectory(prefix="e2e-bench-") as temp_dir:
+        env = app_environment(fake_port, os.path.join(temp_dir, "temp"), args.env)
+        app_process = start_app(app_port, env)
+        try:
+            results = {
+                scenario: asyncio.run(
+                    run_scenario(f"http://127.0.0.1:{app_port}", scenario, args)
+                )
+                for scenario in args.scenarios
+            }
+        finally:
+            # SIGINT lets uvicorn run the app's shutdown, stopping its render pool
+            app_process.send_signal(signal.SIGINT)
+            app_process.wait(timeout=30)
+            fake_server.should_exit = True
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        "results": results,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"end_to_end-{commit}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Usage:
+    python -m benchmarks.fake_openai [--port 8100] [--latency 0.5]
+        [--tokens-per-second 100] [--diagram-nodes 8]
+
+Answers /v1/chat/completions with canned DiagramSchema, DiagramPatch and
+AssistantResponse outputs, chosen by the structured output schema the caller
+requests. Each DiagramSchema is named after its request number, so the render
+cache, which is keyed on the schema, never answers for a fresh request.
+
+Each reply waits `latency` seconds before its first token and then emits
+tokens at `tokens-per-second`, so load tests see realistic model time without
+spending API credits. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.tools.node_registry import CORE_NODE_TYPES
+
+# Rough token size used to pace replies; real tokenizers average ~4 characters
+_CHARS_PER_TOKEN = 4
+_STREAM_CHUNK_TOKENS = 4
+
+
+def diagram_schema(node_count: int) -> dict:
+    """A chain of core node types, every other node inside a VPC cluster."""
+    nodes = [
+        {
+            "id": f"node_{i}",
+            "type": CORE_NODE_TYPES[i % len(CORE_NODE_TYPES)],
+            "label": f"Component {i}",
+        }
+        for i in range(node_count)
+    ]
+    return {
+        "name": f"Benchmark Architecture ({node_count} nodes)",
+        "nodes": nodes,
+        "edges": [
+            {"source": f"node_{i}", "target": f"node_{i + 1}"}
+            for i in range(node_count - 1)
+        ],
+        "clusters": [
+            {
+                "id": "vpc",
+                "label": "VPC",
+                "nodes": [f"node_{i}" for i in range(1, node_count, 2)],
+            }
+        ],
+    }
+
+
+def canned_outputs(node_count: int) -> dict:
+    return {
+        "DiagramSchema": diagram_schema(node_count),
+        "DiagramPatch": {
+            "add_nodes": [{"id": "waf", "type": "WAF", "label": "WAF"}],
+            "add_edges": [{"source": "waf", "target": "node_0"}],
+        },
+        "AssistantResponse": {
+            "message": (
+                "A load balancer in front of an auto-scaled EC2 web tier, with "
+                "RDS for persistent data and ElastiCache for sessions, covers "
+                "most web applications. Tell me which parts you need and I can "
+                "draw the diagram."
+            ),
+            "invoke_diagram_generation": None,
+        },
+    }
+
+
+def requested_output(body: dict):
+    """Work out which schema the request asks for and whether to use a tool call."""
+    for tool in body.get("tools") or []:
+        return tool["function"]["name"], True
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return response_format["json_schema"]["name"], False
+    # JSON mode is only used for the streamed assistant reply
+    if response_format.get("type") == "json_object":
+        return "AssistantResponse", False
+    return None, False
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // _CHARS_PER_TOKEN)
+
+
+def create_app(
+    latency: float = 0.5, tokens_per_second: float = 100.0, diagram_nodes: int = 8
+) -> FastAPI:
+    """Build the fake API with the given model timing and diagram size."""
+    app = FastAPI(title="Fake OpenAI API")
+    outputs = canned_outputs(diagram_nodes)
+    app.state.requests = 0
+
+    def generation_time(tokens: int) -> float:
+        return tokens / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        name, as_tool = requested_output(body)
+        output = outputs.get(name)
+        if name == "DiagramSchema":
+            output = {**output, "name": f"{output['name']} #{app.state.requests}"}
+        text = json.dumps(output) if output is not None else "OK"
+        prompt_tokens = sum(
+            count_tokens(str(message.get("content", "")))
+            for message in body.get("messages", [])
+        )
+        completion_tokens = count_tokens(text)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4o")
+
+        await asyncio.sleep(latency)
+
+        if body.get("stream"):
+
+            async def chunks():
+                size = _STREAM_CHUNK_TOKENS * _CHARS_PER_TOKEN
+                for start in range(0, len(text), size):
+                    await asyncio.sleep(generation_time(_STREAM_CHUNK_TOKENS))
+                    delta = {"content": text[start : start + size]}
+                    if start == 0:
+                        delta["role"] = "assistant"
+                    yield _sse(completion_id, created, model, delta, None)
+                yield _sse(completion_id, created, model, {}, "stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(generation_time(completion_tokens))
+        message = {"role": "assistant", "content": text, "refusal": None}
+        finish_reason = "stop"
+        if as_tool:
+            message["content"] = None
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": text},
+                }
+            ]
+            finish_reason = "tool_calls"
+        return JSONResponse(
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": finish_reason,
+                        "logprobs": None,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+    return app
+
+
+def _sse(completion_id: str, created: int, model: str, delta: dict, finish) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [
+            {"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}
+        ],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--diagram-nodes", type=int, default=8)
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.tokens_per_second, args.diagram_nodes)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
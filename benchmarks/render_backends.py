@@ -0,0 +1,96 @@
+"""Compare the diagrams-library and native DOT rendering backends.
+
+Usage:
+    python -m benchmarks.render_backends [--sizes 10 50 200] [--repeat 5]
+
+For each synthetic diagram size this times DOT source construction for both
+backends and, when Graphviz is installed, the full render to PNG.
+"""
+
+import argparse
+import shutil
+import statistics
+import time
+
+from app.tools.dot_emitter import render_dot, schema_to_dot
+from app.tools.node_registry import CORE_NODE_TYPES
+from app.tools.generate_graph import (
+    _PipedDiagram,
+    draw_schema,
+    get_node_class,
+    get_render_attrs,
+)
+
+
+def build_schema(node_count: int) -> dict:
+    """Create a chain-shaped diagram with every fourth node in a cluster."""
+    node_types = CORE_NODE_TYPES
+    nodes = [
+        {"id": f"n{i}", "type": node_types[i % len(node_types)], "label": f"Node {i}"}
+        for i in range(node_count)
+    ]
+    edges = [{"source": f"n{i}", "target": f"n{i + 1}"} for i in range(node_count - 1)]
+    clusters = [
+        {
+            "id": f"c{i}",
+            "label": f"Cluster {i}",
+            "nodes": [f"n{j}" for j in range(i, min(i + 4, node_count))],
+        }
+        for i in range(0, node_count, 16)
+    ]
+    return {
+        "name": f"Benchmark {node_count}",
+        "nodes": nodes,
+        "edges": edges,
+        "clusters": clusters,
+    }
+
+
+def diagrams_source(schema: dict) -> str:
+    attrs = {**get_render_attrs(schema), "filename": "benchmark"}
+    with _PipedDiagram(schema["name"], **attrs) as diagram:
+        draw_schema(schema)
+    return diagram.dot.source
+
+
+def emitter_source(schema: dict) -> str:
+    return schema_to_dot(schema, get_render_attrs(schema), get_node_class)
+
+
+def time_call(fn, repeat: int) -> float:
+    """Return the median wall time of fn() in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    has_graphviz = shutil.which("dot") is not None
+    header = f"{'nodes':>6} {'backend':>9} {'build ms':>10} {'render ms':>10}"
+    print(header)
+    print("-" * len(header))
+
+    for size in args.sizes:
+        schema = build_schema(size)
+        for backend, build in (("diagrams", diagrams_source), ("dot", emitter_source)):
+            build_ms = time_call(lambda: build(schema), args.repeat)
+            render_ms = "n/a"
+            if has_graphviz:
+                source = build(schema)
+                render_ms = f"{time_call(lambda: render_dot(source), args.repeat):.1f}"
+            print(f"{size:>6} {backend:>9} {build_ms:>10.2f} {render_ms:>10}")
+
+    if not has_graphviz:
+        print("\nGraphviz 'dot' not found; only source construction was timed.")
+
+
+if __name__ == "__main__":
+    main()
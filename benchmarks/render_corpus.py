@@ -0,0 +1,306 @@
+"""Time diagram rendering phase by phase over a generated schema corpus.
+
+Usage:
+    python -m benchmarks.render_corpus [--sizes 2 10 50 200 500 1000 2000]
+        [--densities 1 3] [--cluster-sizes 0 8] [--backends diagrams dot]
+        [--engine dot] [--repeat 3] [--write-corpus DIR] [--output FILE]
+
+The corpus holds one DiagramSchema per combination of node count, edge
+density (edges per node) and cluster size. Fixtures are generated from a fixed
+seed, so every run and every commit measures the same diagrams. Schemas have
+flat clusters only, so cluster size stands in for nesting depth.
+
+For each fixture and backend this records the median of:
+
+- resolve: the node-class lookups (the first, cold lookups are reported
+  separately as first_resolve_ms)
+- build: DOT source construction
+- layout: `<engine> -Tdot`
+- encode: PNG encoding of the laid-out graph with `neato -n2`
+- total: the whole `parse_diagram_schema` call on the same backend, with a
+  fresh output directory so the render cache never answers
+
+Engines other than dot are passed to every phase as the graph's `layout`
+attribute, so `total` uses them too.
+
+Each fixture runs in its own process so that its peak RSS, and that of its
+Graphviz children, can be reported. Results are printed as a table and saved
+as JSON tagged with the git commit. Layout, encoding and total need Graphviz
+on PATH.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from app.schemas.diagram import DiagramSchema
+from app.tools import generate_graph
+from app.tools.dot_emitter import schema_to_dot
+from app.tools.generate_graph import (
+    _PipedDiagram,
+    draw_schema,
+    get_node_class,
+    get_render_attrs,
+    parse_diagram_schema,
+)
+from app.tools.icon_cache import icon_cache
+from app.tools.node_registry import CORE_NODE_TYPES
+from benchmarks.end_to_end import RESULTS_DIR, git_commit
+
+PHASES = ("resolve", "build", "layout", "encode", "total")
+
+
+def build_case(node_count: int, density: float, cluster_size: int, seed: int) -> dict:
+    """
+    Create one corpus diagram.
+
+    Every node after the first links to a random earlier node, so the graph is
+    connected. Random extra edges are then added until there are
+    `density * node_count` edges. Consecutive nodes are grouped into clusters
+    of `cluster_size`; 0 means no clusters.
+    """
+    rng = random.Random(f"{seed}:{node_count}:{density}:{cluster_size}")
+    nodes = [
+        {
+            "id": f"n{i}",
+            "type": CORE_NODE_TYPES[i % len(CORE_NODE_TYPES)],
+            "label": f"Node {i}",
+        }
+        for i in range(node_count)
+    ]
+    pairs = {(rng.randrange(i), i) for i in range(1, node_count)}
+    max_edges = node_count * (node_count - 1) // 2
+    target = min(max_edges, round(density * node_count))
+    while len(pairs) < target:
+        source, dest = sorted(rng.sample(range(node_count), 2))
+        pairs.add((source, dest))
+    edges = [{"source": f"n{s}", "target": f"n{t}"} for s, t in sorted(pairs)]
+    clusters = []
+    if cluster_size > 0:
+        clusters = [
+            {
+                "id": f"c{start}",
+                "label": f"Cluster {start // cluster_size}",
+                "nodes": [
+                    f"n{i}" for i in range(start, min(start + cluster_size, node_count))
+                ],
+            }
+            for start in range(0, node_count, cluster_size)
+        ]
+    schema = {
+        "name": f"Corpus {node_count} x{density:g} c{cluster_size}",
+        "nodes": nodes,
+        "edges": edges,
+        "clusters": clusters,
+    }
+    return DiagramSchema.model_validate(schema).model_dump()
+
+
+def generate_corpus(sizes, densities, cluster_sizes, seed: int = 0) -> dict:
+    """Map fixture ids such as "n200-d3-c8" to their schemas."""
+    return {
+        f"n{size}-d{density:g}-c{cluster_size}": build_case(
+            size, density, cluster_size, seed
+        )
+        for size in sizes
+        for density in densities
+        for cluster_size in cluster_sizes
+    }
+
+
+def build_source(schema: dict, backend: str) -> str:
+    attrs = get_render_attrs(schema)
+    if backend == "dot":
+        return schema_to_dot(schema, attrs, get_node_class, icon_cache.resolver(attrs))
+    with _PipedDiagram(schema["name"], **{**attrs, "filename": "corpus"}) as diagram:
+        draw_schema(schema, icon_cache.resolver(attrs))
+    return diagram.dot.source
+
+
+def run_graphviz(command: list, source: bytes, timeout: float) -> bytes:
+    result = subprocess.run(command, input=source, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode("utf-8", errors="replace").strip())
+    return result.stdout
+
+
+def timed(fn) -> tuple:
+    started = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - started) * 1000
+
+
+def measure_case(job: tuple) -> dict:
+    """Time one fixture with one backend; runs in a fresh worker process."""
+    schema, backend, engine, repeat, timeout = job
+    dot_binary = shutil.which("dot")
+    # parse_diagram_schema renders with the backend named by this module setting
+    generate_graph.RENDER_BACKEND = backend
+    if engine != "dot":
+        schema = {**schema, "attributes": {"graph_attr": {"layout": engine}}}
+    samples = {phase: [] for phase in PHASES}
+    error = None
+
+    # The first lookups index the node registry and import the node classes
+    _, first_resolve_ms = timed(
+        lambda: [get_node_class(node["type"]) for node in schema["nodes"]]
+    )
+    # Warm the diagrams imports and the icon cache so each phase is timed steady-state
+    build_source(schema, backend)
+
+    for _ in range(repeat):
+        _, resolve_ms = timed(
+            lambda: [get_node_class(node["type"]) for node in schema["nodes"]]
+        )
+        samples["resolve"].append(resolve_ms)
+        source, build_ms = timed(lambda: build_source(schema, backend))
+        samples["build"].append(build_ms)
+        if dot_binary is None or error is not None:
+            continue
+        try:
+            laid_out, layout_ms = timed(
+                lambda: run_graphviz(
+                    [dot_binary, f"-K{engine}", "-Tdot"], source.encode(), timeout
+                )
+            )
+            _, encode_ms = timed(
+                lambda: run_graphviz(
+                    [dot_binary, "-Kneato", "-n2", "-Tpng"], laid_out, timeout
+                )
+            )
+            with tempfile.TemporaryDirectory(prefix="corpus-") as output_dir:
+                _, total_ms = timed(
+                    lambda: asyncio.run(parse_diagram_schema(schema, output_dir))
+                )
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            error = f"{type(e).__name__}: {str(e)[:200]}"
+            continue
+        samples["layout"].append(layout_ms)
+        samples["encode"].append(encode_ms)
+        samples["total"].append(total_ms)
+
+    return {
+        "first_resolve_ms": round(first_resolve_ms, 2),
+        "phases_ms": {
+            phase: round(statistics.median(values), 2) if values else None
+            for phase, values in samples.items()
+        },
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "graphviz_peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1
+        ),
+        "error": error,
+    }
+
+
+def print_header() -> None:
+    header = (
+        f"{'fixture':>16} {'backend':>9} "
+        + " ".join(f"{phase + ' ms':>11}" for phase in PHASES)
+        + f" {'rss MB':>8} {'dot MB':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+
+
+def print_row(row: dict) -> None:
+    phases = " ".join(
+        f"{value:>11.1f}" if value is not None else f"{'n/a':>11}"
+        for value in (row["phases_ms"][phase] for phase in PHASES)
+    )
+    print(
+        f"{row['fixture']:>16} {row['backend']:>9} {phases} "
+        f"{row['peak_rss_mb']:>8.1f} {row['graphviz_peak_rss_mb']:>8.1f}"
+    )
+    if row["error"]:
+        print(f"{'':>16} {row['error']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[2, 10, 50, 200, 500, 1000, 2000]
+    )
+    parser.add_argument("--densities", type=float, nargs="+", default=[1.0, 3.0])
+    parser.add_argument("--cluster-sizes", type=int, nargs="+", default=[0, 8])
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["diagrams", "dot"],
+        choices=["diagrams", "dot"],
+    )
+    parser.add_argument("--engine", default="dot", help="Graphviz layout engine")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--write-corpus", metavar="DIR")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.sizes, args.densities, args.cluster_sizes, args.seed)
+    if args.write_corpus:
+        os.makedirs(args.write_corpus, exist_ok=True)
+        for fixture, schema in corpus.items():
+            with open(os.path.join(args.write_corpus, f"{fixture}.json"), "w") as f:
+                json.dump(schema, f, indent=2)
+        print(f"Wrote {len(corpus)} fixtures to {args.write_corpus}")
+
+    # Workers render in-process rather than starting a render pool of their own
+    os.environ["RENDER_EXECUTOR"] = "thread"
+    rows = []
+    print_header()
+    for fixture, schema in corpus.items():
+        for backend in args.backends:
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                job = (schema, backend, args.engine, args.repeat, args.timeout)
+                result = pool.submit(measure_case, job).result()
+            rows.append(
+                {
+                    "fixture": fixture,
+                    "backend": backend,
+                    "nodes": len(schema["nodes"]),
+                    "edges": len(schema["edges"]),
+                    "clusters": len(schema["clusters"]),
+                    **result,
+                }
+            )
+            print_row(rows[-1])
+
+    if shutil.which("dot") is None:
+        print("\nGraphviz 'dot' not found; only resolve and build were timed.")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": rows,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"render_corpus-{commit}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@ import streamlit as st
 from dotenv import load_dotenv
 import argparse
 import logging
-from client import generate_response
+import os
+from client import (
+    create_session,
+    generate_combined_response,
+    generate_diagram,
+    stream_assistant,
+)
 from io import BytesIO
 
 load_dotenv()
@@ -30,10 +36,60 @@ logger.info("Streamlit app has started")
 USER_AVATAR = "👤"
 BOT_AVATAR = "🤖"
 
+# Stream assistant replies token by token unless disabled
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+# Keep the conversation on the backend so each request carries only the new message
+SERVER_SESSIONS = os.getenv("SERVER_SESSIONS", "true").lower() == "true"
+
+
+def stream_response(message_list, session_id=None):
+    """
+    Render the assistant reply as it streams in, then any requested diagram.
+
+    Returns:
+        dict: The response in the same format as generate_response
+    """
+    final = {}
+    errors = []
+
+    def tokens():
+        for event, data in stream_assistant(message_list, session_id):
+            if event == "token":
+                yield data
+            elif event == "done":
+                final.update(data)
+            else:
+                errors.append(data)
+
+    streamed = st.write_stream(tokens())
+    if errors:
+        st.markdown(errors[0])
+        return {"type": "text", "message": errors[0]}
+
+    message = final.get("message") or streamed
+    invoke_diagram = final.get("invoke_diagram_generation")
+    if invoke_diagram is None:
+        return {"type": "text", "message": message}
+
+    with st.spinner("Generating diagram..."):
+        diagram_image = generate_diagram(invoke_diagram, session_id)
+    if diagram_image:
+        st.image(diagram_image)
+        return {"type": "diagram", "message": message, "image": diagram_image}
+
+    note = "\n(Note: Diagram generation failed)"
+    st.markdown(note)
+    return {"type": "text", "message": message + note}
+
+
 # Initialize messages in session state if not present
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# Without a server-side session the full history is sent with every request
+if "session_id" not in st.session_state:
+    st.session_state.session_id = create_session() if SERVER_SESSIONS else None
+
 # Display chat messages
 for message in st.session_state.messages:
     avatar = USER_AVATAR if message["role"] == "user" else BOT_AVATAR
@@ -62,27 +118,32 @@ if prompt := st.chat_input("How can I help?"):
         st.markdown(prompt)
 
     with st.chat_message("assistant", avatar=BOT_AVATAR):
-        # Create a list of messages to pass to generate_response
+        # Create a list of messages to pass to the API
         message_list = []
         for msg in st.session_state.messages:
             message_list.append({"role": msg["role"], "content": msg["content"]})
 
-        # Pass the message list to generate_response
-        response = generate_response(message_list)
+        if STREAM_RESPONSES:
+            # Tokens, and then the diagram, are displayed as they arrive
+            response = stream_response(message_list, st.session_state.session_id)
+        else:
+            # The backend generates any requested diagram in the same call
+            response = generate_combined_response(
+                message_list, st.session_state.session_id
+            )
+
+            # Show message as text first, then the image without a caption
+            st.markdown(response["message"])
+            if response["type"] == "diagram":
+                st.image(response["image"])
 
         # Handle different response types
         if response["type"] == "diagram":
-            # For responses with both text and image, show message as text first
-            st.markdown(response["message"])
-            # Then display the image without a caption
-            st.image(response["image"])
             content_type = "image"
 
             # Store both the image and message
             full_response = {"image": response["image"], "message": response["message"]}
         else:
-            # For text-only responses, display the text directly
-            st.markdown(response["message"])
             content_type = "text"
             full_response = response["message"]
 
@@ -1,10 +1,18 @@
 import os
+import time
+import random
+import asyncio
+import threading
+import weakref
 import requests
+import httpx
 import logging
 import sys
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from io import BytesIO
-import ast
+import json
+import base64
 
 # Load environment variables
 load_dotenv()
@@ -33,12 +41,155 @@ API_PORT = os.getenv("API_PORT", "8000")
 API_BASE_URL = os.getenv("API_BASE_URL", f"http://{API_DOMAIN}:{API_PORT}")
 
 API_ASSISTANT_ENDPOINT = f"{API_BASE_URL}/api/v1/assistant"
+API_ASSISTANT_STREAM_ENDPOINT = f"{API_BASE_URL}/api/v1/assistant/stream"
+API_ASSISTANT_DIAGRAM_ENDPOINT = f"{API_BASE_URL}/api/v1/assistant/diagram"
+API_SESSIONS_ENDPOINT = f"{API_BASE_URL}/api/v1/sessions"
 API_DIAGRAM_ENDPOINT = f"{API_BASE_URL}/api/v1/generate-diagram"
 
 logger.info(f"Final API Base URL: {API_BASE_URL}")
 logger.info(f"Final API Assistant Endpoint: {API_ASSISTANT_ENDPOINT}")
 logger.info(f"Final API Diagram Endpoint: {API_DIAGRAM_ENDPOINT}")
 
+# HTTP client configuration
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "120"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+
+# Gateway errors, load shedding and rate limiting are transient; a 500 from the
+# assistant is not. A 504 is not retried: the POSTs are not idempotent and the
+# server may still be working on the first request
+RETRY_STATUS_CODES = (429, 502, 503)
+
+_TIMEOUT_MESSAGE = "Sorry, the server took too long to respond. Please try again."
+_CONNECTION_MESSAGE = (
+    "Sorry, I was unable to connect to the server. Please try again later."
+)
+_GENERIC_ERROR_MESSAGE = "Sorry, there was an error communicating with the server."
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Exponential backoff with full jitter, honouring a server Retry-After.
+
+    Args:
+        attempt (int): Zero-based number of the attempt that just failed
+        retry_after (str): Retry-After header value, if any
+
+    Returns:
+        float: Seconds to wait before the next attempt
+    """
+    delay = random.uniform(0, API_RETRY_BACKOFF * 2**attempt)
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def get_session():
+    """
+    Return the shared HTTP session, keeping connections to the backend alive.
+
+    Returns:
+        requests.Session: Pooled session shared by all sync API calls
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=API_POOL_SIZE, max_retries=0
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def post_with_retries(url, **kwargs):
+    """
+    POST through the shared session with timeouts and jittered retries.
+
+    Connection failures and gateway/overload statuses are retried; read
+    timeouts are not, since the request may already be running on the server.
+
+    Returns:
+        requests.Response: The final response
+    """
+    kwargs.setdefault("timeout", (API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
+    for attempt in range(API_MAX_RETRIES + 1):
+        last_attempt = attempt == API_MAX_RETRIES
+        try:
+            response = get_session().post(url, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if last_attempt:
+                raise
+            delay = retry_delay(attempt)
+            logger.warning(f"Request to {url} failed ({e}); retrying in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                return response
+            delay = retry_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning(
+                f"Request to {url} returned {response.status_code}; retrying in {delay:.2f}s"
+            )
+            response.close()
+        time.sleep(delay)
+
+
+def get_async_client():
+    """
+    Return the pooled async HTTP client for the running event loop.
+
+    Returns:
+        httpx.AsyncClient: Client shared by async API calls on this loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(API_READ_TIMEOUT, connect=API_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=API_POOL_SIZE,
+                max_keepalive_connections=API_POOL_SIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def apost_with_retries(url, **kwargs):
+    """
+    Async counterpart of post_with_retries.
+
+    Returns:
+        httpx.Response: The final response
+    """
+    for attempt in range(API_MAX_RETRIES + 1):
+        last_attempt = attempt == API_MAX_RETRIES
+        try:
+            response = await get_async_client().post(url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            if last_attempt:
+                raise
+            delay = retry_delay(attempt)
+            logger.warning(f"Request to {url} failed ({e}); retrying in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                return response
+            delay = retry_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning(
+                f"Request to {url} returned {response.status_code}; retrying in {delay:.2f}s"
+            )
+        await asyncio.sleep(delay)
+
 
 def process_messages(message_list):
     """
@@ -68,12 +219,73 @@ def process_messages(message_list):
     return processed_messages
 
 
-def generate_diagram(diagram_data):
+def request_headers(accept, session_id=None):
+    """
+    Build the request headers for a backend call.
+
+    Args:
+        accept (str): The accepted response media type
+        session_id (str): Server-side session id, if one was created
+
+    Returns:
+        dict: The request headers
+    """
+    headers = {"accept": accept, "Content-Type": "application/json"}
+    if session_id:
+        # All UI users share one address; the session tells them apart for rate limits
+        headers["X-Client-Id"] = session_id
+    return headers
+
+
+def assistant_payload(message_list, session_id=None):
+    """
+    Build the request body for the assistant endpoints.
+
+    With a server-side session only the new message is sent; otherwise the
+    whole conversation goes along as context.
+
+    Args:
+        message_list (list): The conversation history
+        session_id (str): Server-side session id, if one was created
+
+    Returns:
+        dict: The request payload
+    """
+    if session_id:
+        latest = process_messages(message_list[-1:])[0]
+        return {"message": latest["content"], "session_id": session_id}
+
+    processed_messages = process_messages(message_list)
+    return {
+        "message": processed_messages[-1]["content"],
+        "context": processed_messages[:-1],
+    }
+
+
+def create_session():
+    """
+    Start a server-side conversation session.
+
+    Returns:
+        str: The session id, or None if sessions are unavailable
+    """
+    try:
+        response = post_with_retries(API_SESSIONS_ENDPOINT)
+        if response.status_code == 200:
+            return response.json()["session_id"]
+        logger.error(f"Session creation failed with status code {response.status_code}")
+    except Exception as e:
+        logger.error(f"Error creating session: {str(e)}", exc_info=True)
+    return None
+
+
+def generate_diagram(diagram_data, session_id=None):
     """
     Generate a diagram by calling the generate-diagram API endpoint.
 
     Args:
         diagram_data: The description to pass to the diagram generation endpoint
+        session_id (str): Server-side session to record the diagram in, if any
 
     Returns:
         BytesIO: The generated image as BytesIO object or None if error occurs
@@ -84,10 +296,15 @@ def generate_diagram(diagram_data):
 
         # Create the payload with the description
         payload = {"description": diagram_data}
+        if session_id:
+            # Lets the assistant see the diagram on the session's next turn
+            payload["session_id"] = session_id
 
         # Make the API request to the diagram endpoint
         logger.info(f"Sending request to diagram API at: {API_DIAGRAM_ENDPOINT}")
-        response = requests.post(API_DIAGRAM_ENDPOINT, json=payload, headers=headers)
+        response = post_with_retries(
+            API_DIAGRAM_ENDPOINT, json=payload, headers=headers
+        )
 
         if response.status_code == 200:
             # Convert the response content (image) to BytesIO
@@ -102,43 +319,102 @@ def generate_diagram(diagram_data):
         return None
 
 
-def generate_response(message_list):
+def _iter_sse_events(lines):
+    """
+    Parse Server-Sent Events from an iterable of decoded lines.
+
+    Yields:
+        tuple: (event name, decoded JSON data)
+    """
+    event, data_lines = "message", []
+    for line in lines:
+        if not line:
+            # A blank line terminates the current event
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:") :].strip())
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
+
+
+def stream_assistant(message_list, session_id=None):
+    """
+    Stream the assistant reply from the API as it is generated.
+
+    Args:
+        message_list (list): The conversation history
+        session_id (str): Server-side session id, if one was created
+
+    Yields:
+        tuple: ("token", text delta) while the reply streams in, then exactly one
+        ("done", response dict) or ("error", error message)
+    """
+    logger.info("Streaming response from assistant API...")
+    payload = assistant_payload(message_list, session_id)
+    headers = request_headers("text/event-stream", session_id)
+
+    try:
+        logger.info(f"Sending request to API at: {API_ASSISTANT_STREAM_ENDPOINT}")
+        with post_with_retries(
+            API_ASSISTANT_STREAM_ENDPOINT, json=payload, headers=headers, stream=True
+        ) as response:
+            if response.status_code != 200:
+                logger.error(
+                    f"API request to Assistant API failed with status code {response.status_code}: {response.text}"
+                )
+                yield "error", f"Error: Unable to get a response from the server (Status code: {response.status_code})"
+                return
+
+            for event, data in _iter_sse_events(
+                response.iter_lines(decode_unicode=True)
+            ):
+                if event == "token":
+                    yield "token", data["delta"]
+                elif event == "done":
+                    yield "done", data
+                    return
+                elif event == "error":
+                    logger.error(f"Assistant stream failed: {data.get('detail')}")
+                    yield "error", "Sorry, there was an error generating a response."
+                    return
+
+        yield "error", "Sorry, the response ended unexpectedly."
+    except Exception as e:
+        logger.error(f"Error communicating with API: {str(e)}", exc_info=True)
+        yield "error", "Sorry, there was an error communicating with the server."
+
+
+def generate_response(message_list, session_id=None):
     """
     Send user message to the API and return the generated response.
 
     Args:
         message_list (list): The conversation history
+        session_id (str): Server-side session id, if one was created
 
     Returns:
         dict: Contains the response message and possibly an image (as BytesIO)
     """
     logger.info("Generating response from assistant API...")
     try:
-        headers = {"accept": "*/*", "Content-Type": "application/json"}
+        headers = request_headers("*/*", session_id)
 
-        # Process messages to ensure JSON serializable content
-        processed_messages = process_messages(message_list)
-
-        # Prepare the payload with processed messages
-        payload = {
-            "message": processed_messages[-1]["content"],
-            "context": processed_messages[:-1],
-        }
+        # Prepare the payload with JSON serializable messages
+        payload = assistant_payload(message_list, session_id)
 
         # Make the API request
         logger.info(f"Sending request to API at: {API_ASSISTANT_ENDPOINT}")
-        response = requests.post(API_ASSISTANT_ENDPOINT, json=payload, headers=headers)
+        response = post_with_retries(
+            API_ASSISTANT_ENDPOINT, json=payload, headers=headers
+        )
 
         # Check for successful response
         if response.status_code == 200:
-            result = response.json()
-            # logger.info(f"Response JSON: {result}")
-
-            # Parse the response
-            if isinstance(result, str):
-                parsed_result = ast.literal_eval(result)
-            else:
-                parsed_result = result
+            parsed_result = response.json()
 
             message = parsed_result.get(
                 "message", "Sorry, I couldn't generate a response."
@@ -148,7 +424,7 @@ def generate_response(message_list):
             # Check if diagram generation is needed
             if invoke_diagram is not None:
                 # Call diagram generation function
-                diagram_image = generate_diagram(invoke_diagram)
+                diagram_image = generate_diagram(invoke_diagram, session_id)
                 # Return both the message and image (if diagram generation was successful)
                 if diagram_image:
                     return {
@@ -172,7 +448,114 @@ def generate_response(message_list):
                 "message": f"Error: Unable to get a response from the server (Status code: {response.status_code})",
             }
 
+    except requests.exceptions.Timeout:
+        logger.error("Assistant API request timed out", exc_info=True)
+        return {"type": "text", "message": _TIMEOUT_MESSAGE}
+    except requests.exceptions.ConnectionError:
+        logger.error("Unable to connect to Assistant API", exc_info=True)
+        return {"type": "text", "message": _CONNECTION_MESSAGE}
     except Exception as e:
         logger.error(f"Error communicating with API: {str(e)}", exc_info=True)
         error_msg = "Sorry, there was an error communicating with the server."
         return {"type": "text", "message": error_msg}
+
+
+def _combined_payload(message_list, session_id=None):
+    return {**assistant_payload(message_list, session_id), "image_delivery": "inline"}
+
+
+def _parse_combined_response(status_code, result, text):
+    """Turn an assistant diagram API response into the chat UI's format."""
+    if status_code != 200:
+        logger.error(
+            f"API request to Assistant Diagram API failed with status code {status_code}: {text}"
+        )
+        return {
+            "type": "text",
+            "message": f"Error: Unable to get a response from the server (Status code: {status_code})",
+        }
+
+    message = result.get("message", "Sorry, I couldn't generate a response.")
+    if result.get("image"):
+        return {
+            "type": "diagram",
+            "message": message,
+            "image": BytesIO(base64.b64decode(result["image"])),
+        }
+    if result.get("diagram_description"):
+        return {
+            "type": "text",
+            "message": message + "\n(Note: Diagram generation failed)",
+        }
+    return {"type": "text", "message": message}
+
+
+def generate_combined_response(message_list, session_id=None):
+    """
+    Get the assistant reply and any diagram it requests in a single API call.
+
+    The backend chains the assistant, diagram generation and rendering itself,
+    so a diagram turn costs one round trip instead of two.
+
+    Args:
+        message_list (list): The conversation history
+        session_id (str): Server-side session id, if one was created
+
+    Returns:
+        dict: Same format as generate_response
+    """
+    logger.info("Generating combined response from assistant diagram API...")
+    headers = request_headers("application/json", session_id)
+    try:
+        logger.info(f"Sending request to API at: {API_ASSISTANT_DIAGRAM_ENDPOINT}")
+        response = post_with_retries(
+            API_ASSISTANT_DIAGRAM_ENDPOINT,
+            json=_combined_payload(message_list, session_id),
+            headers=headers,
+        )
+        result = response.json() if response.status_code == 200 else None
+        return _parse_combined_response(response.status_code, result, response.text)
+
+    except requests.exceptions.Timeout:
+        logger.error("Assistant Diagram API request timed out", exc_info=True)
+        return {"type": "text", "message": _TIMEOUT_MESSAGE}
+    except requests.exceptions.ConnectionError:
+        logger.error("Unable to connect to Assistant Diagram API", exc_info=True)
+        return {"type": "text", "message": _CONNECTION_MESSAGE}
+    except Exception as e:
+        logger.error(f"Error communicating with API: {str(e)}", exc_info=True)
+        return {"type": "text", "message": _GENERIC_ERROR_MESSAGE}
+
+
+async def agenerate_combined_response(message_list, session_id=None):
+    """
+    Async variant of generate_combined_response on the pooled async client.
+
+    Args:
+        message_list (list): The conversation history
+        session_id (str): Server-side session id, if one was created
+
+    Returns:
+        dict: Same format as generate_response
+    """
+    logger.info("Generating combined response from assistant diagram API...")
+    headers = request_headers("application/json", session_id)
+    try:
+        logger.info(f"Sending request to API at: {API_ASSISTANT_DIAGRAM_ENDPOINT}")
+        response = await apost_with_retries(
+            API_ASSISTANT_DIAGRAM_ENDPOINT,
+            json=_combined_payload(message_list, session_id),
+            headers=headers,
+        )
+        result = response.json() if response.status_code == 200 else None
+        return _parse_combined_response(response.status_code, result, response.text)
+
+    except httpx.TimeoutException:
+        logger.error("Assistant Diagram API request timed out", exc_info=True)
+        return {"type": "text", "message": _TIMEOUT_MESSAGE}
+    except httpx.ConnectError:
+        logger.error("Unable to connect to Assistant Diagram API", exc_info=True)
+        return {"type": "text", "message": _CONNECTION_MESSAGE}
+    except Exception as e:
+        logger.error(f"Error communicating with API: {str(e)}", exc_info=True)
+        return {"type": "text", "message": _GENERIC_ERROR_MESSAGE}
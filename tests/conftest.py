@@ -1,6 +1,7 @@
 import os
 import pytest
 import sys
+import importlib.util
 from pathlib import Path
 
 # Add the project root to the Python path
@@ -9,3 +10,39 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 # Set test environment variables
 os.environ["LOG_LEVEL"] = "ERROR"
 os.environ["TEMP_DIR"] = "tests/temp"
+os.environ["RENDER_EXECUTOR"] = "thread"
+
+
+@pytest.fixture
+def fake_graphviz():
+    """Replace the Graphviz render step with one that writes placeholder files."""
+    from unittest.mock import patch
+
+    def fake_render(diagram):
+        with open(diagram.filename, "w") as f:
+            f.write(str(diagram.dot))
+        with open(f"{diagram.filename}.{diagram.outformat}", "wb") as f:
+            f.write(b"\x89PNG fake")
+
+    with patch(
+        "diagrams.Diagram.render", autospec=True, side_effect=fake_render
+    ) as mock_render:
+        yield mock_render
+
+
+@pytest.fixture(scope="session")
+def streamlit_client():
+    """Load streamlit/client.py as `client`, the name chat_ui.py imports it by.
+
+    The installed streamlit package shadows the local streamlit/ directory, so
+    the module is loaded from its file path instead.
+    """
+    path = Path(__file__).parent.parent / "streamlit" / "client.py"
+    spec = importlib.util.spec_from_file_location("client", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["client"] = module
+    try:
+        spec.loader.exec_module(module)
+        yield module
+    finally:
+        sys.modules.pop("client", None)
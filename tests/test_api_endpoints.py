@@ -3,10 +3,11 @@ from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, AsyncMock
 import os
 import json
+import base64
 from app.main import app
 from app.api.v1.router import router, diagram_agent, assistant_agent
 from app.agents.digram_generating_agent import DiagramGenerationError
-from app.schemas.diagram import DiagramRequest, AssistantRequest
+from app.schemas.diagram import DiagramRequest, AssistantRequest, AssistantResponse
 
 
 # Create test client
@@ -114,6 +115,26 @@ class TestAPIEndpoints:
         assert response.json()["message"] == "I'll help you create a diagram."
         mock_invoke_assistant.assert_called_once()
 
+    @patch("app.api.v1.router.assistant_agent.respond")
+    def test_assistant_returns_json_object(self, mock_respond):
+        """Test the assistant reply is a JSON object, not a serialized string"""
+        # Setup mock
+        mock_respond.return_value = AssistantResponse(
+            message="Here you go", invoke_diagram_generation="An EC2 behind an ALB"
+        )
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post("/api/v1/assistant", json={"message": "Draw it"})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {
+            "message": "Here you go",
+            "invoke_diagram_generation": "An EC2 behind an ALB",
+        }
+
     @patch("app.api.v1.router.assistant_agent.invoke_assistant")
     async def test_assistant_empty_message(self, mock_invoke_assistant):
         """Test assistant with empty message"""
@@ -159,3 +180,280 @@ class TestAPIEndpoints:
         # Assert
         assert response.status_code == 500
         assert "unexpected error" in response.json()["message"].lower()
+
+    @patch("app.api.v1.router.RENDER_MODE", "memory")
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+    @patch("app.api.v1.router.render_diagram_bytes")
+    def test_generate_diagram_memory_mode(
+        self, mock_render_bytes, mock_generate_structure
+    ):
+        """Test diagram generation returning in-memory image bytes"""
+        # Setup mocks
+        mock_generate_structure.return_value = {
+            "name": "Test",
+            "nodes": [{"id": "node1", "type": "EC2"}],
+        }
+        mock_render_bytes.return_value = b"\x89PNG"
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/generate-diagram",
+                json={"description": "Create an EC2 instance"},
+            )
+
+        # Assert
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.content == b"\x89PNG"
+
+    @patch("app.api.v1.router.RENDER_MODE", "memory")
+    @patch("app.api.v1.router.session_store.set_last_diagram", new_callable=AsyncMock)
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+    @patch("app.api.v1.router.render_diagram_bytes")
+    def test_generate_diagram_records_session_diagram(
+        self, mock_render_bytes, mock_generate_structure, mock_set_last_diagram
+    ):
+        """Test a diagram generated for a session becomes its last diagram"""
+        # Setup mocks
+        diagram = {"name": "Test", "nodes": [{"id": "node1", "type": "EC2"}]}
+        mock_generate_structure.return_value = diagram
+        mock_render_bytes.return_value = b"\x89PNG"
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/generate-diagram",
+                json={"description": "Create an EC2 instance", "session_id": "s1"},
+            )
+
+        # Assert
+        assert response.status_code == 200
+        mock_set_last_diagram.assert_awaited_once_with("s1", diagram)
+
+    @patch("app.api.v1.router.assistant_agent.respond")
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+    @patch("app.api.v1.router.render_diagram_bytes")
+    def test_assistant_diagram_inline(
+        self, mock_render_bytes, mock_generate_structure, mock_respond
+    ):
+        """Test the combined endpoint returns the message and an inline image"""
+        # Setup mocks
+        mock_respond.return_value = AssistantResponse(
+            message="Here's your diagram", invoke_diagram_generation="One EC2"
+        )
+        mock_generate_structure.return_value = {
+            "name": "Test",
+            "nodes": [{"id": "node1", "type": "EC2"}],
+        }
+        mock_render_bytes.return_value = b"\x89PNG"
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/assistant/diagram", json={"message": "Draw one EC2"}
+            )
+
+        # Assert
+        assert response.status_code == 200
+        body = response.json()
+        assert body["message"] == "Here's your diagram"
+        assert base64.b64decode(body["image"]) == b"\x89PNG"
+        assert body["image_url"] is None
+        mock_generate_structure.assert_called_once_with("One EC2")
+
+    @patch("app.api.v1.router.assistant_agent.respond")
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+    def test_assistant_diagram_text_only(self, mock_generate_structure, mock_respond):
+        """Test the combined endpoint skips diagram generation when not requested"""
+        # Setup mocks
+        mock_respond.return_value = AssistantResponse(message="Hello")
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post("/api/v1/assistant/diagram", json={"message": "Hi"})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json()["image"] is None
+        mock_generate_structure.assert_not_called()
+
+    @patch("app.api.v1.router.assistant_agent.respond")
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+    def test_assistant_diagram_failure_keeps_message(
+        self, mock_generate_structure, mock_respond
+    ):
+        """Test a failed diagram is reported without failing the turn"""
+        # Setup mocks
+        mock_respond.return_value = AssistantResponse(
+            message="Here's your diagram", invoke_diagram_generation="Something"
+        )
+        mock_generate_structure.side_effect = ValueError("Unsupported node type: X")
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/assistant/diagram", json={"message": "Draw it"}
+            )
+
+        # Assert
+        assert response.status_code == 200
+        body = response.json()
+        assert body["message"] == "Here's your diagram"
+        assert body["image"] is None
+        assert "Unsupported node type" in body["diagram_error"]
+
+    @patch("app.api.v1.router.assistant_agent.respond")
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+    @patch("app.api.v1.router.parse_diagram_schema")
+    def test_assistant_diagram_url_delivery(
+        self, mock_parse_schema, mock_generate_structure, mock_respond
+    ):
+        """Test url delivery returns a link that serves the rendered file once"""
+        # Setup mocks
+        temp_dir = os.getenv("TEMP_DIR")
+        mock_respond.return_value = AssistantResponse(
+            message="Here's your diagram", invoke_diagram_generation="One EC2"
+        )
+        mock_generate_structure.return_value = {"name": "Test", "nodes": []}
+
+        # Execute
+        with TestClient(app) as client:
+            diagram_path = os.path.join(temp_dir, "test_abc123.png")
+            with open(diagram_path, "wb") as f:
+                f.write(b"\x89PNG")
+            mock_parse_schema.return_value = diagram_path
+
+            response = client.post(
+                "/api/v1/assistant/diagram",
+                json={"message": "Draw one EC2", "image_delivery": "url"},
+            )
+            image_url = response.json()["image_url"]
+            image_response = client.get(image_url)
+            second_response = client.get(image_url)
+
+        # Assert
+        assert response.status_code == 200
+        assert image_url.endswith("/api/v1/diagrams/test_abc123.png")
+        assert image_response.status_code == 200
+        assert image_response.content == b"\x89PNG"
+        assert second_response.status_code == 404
+
+    def test_get_diagram_rejects_hidden_files(self):
+        """Test the diagram route does not serve workspace or partial files"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.get("/api/v1/diagrams/.partial-abc")
+
+        # Assert
+        assert response.status_code == 404
+
+    @patch("app.api.v1.router.assistant_agent.respond")
+    def test_assistant_session_keeps_history(self, mock_respond):
+        """Test a session lets clients send only the new message"""
+        # Setup mocks
+        mock_respond.side_effect = [
+            AssistantResponse(message="First reply"),
+            AssistantResponse(message="Second reply"),
+        ]
+
+        # Execute
+        with TestClient(app) as client:
+            session_id = client.post("/api/v1/sessions").json()["session_id"]
+            client.post(
+                "/api/v1/assistant",
+                json={"message": "First", "session_id": session_id},
+            )
+            response = client.post(
+                "/api/v1/assistant",
+                json={"message": "Second", "session_id": session_id},
+            )
+            history = client.get(f"/api/v1/sessions/{session_id}").json()["messages"]
+            deleted = client.delete(f"/api/v1/sessions/{session_id}")
+
+        # Assert
+        assert response.status_code == 200
+        second_request = mock_respond.call_args_list[1].args[0]
+        assert second_request.context == [
+            {"role": "user", "content": "First"},
+            {"role": "assistant", "content": "First reply"},
+        ]
+        assert [m["content"] for m in history] == [
+            "First",
+            "First reply",
+            "Second",
+            "Second reply",
+        ]
+        assert deleted.status_code == 204
+
+    def test_new_session_can_be_deleted(self):
+        """Test a session exists as soon as it is created"""
+        # Execute
+        with TestClient(app) as client:
+            session_id = client.post("/api/v1/sessions").json()["session_id"]
+            response = client.delete(f"/api/v1/sessions/{session_id}")
+
+        # Assert
+        assert response.status_code == 204
+
+    def test_delete_unknown_session(self):
+        """Test deleting a session that does not exist"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.delete("/api/v1/sessions/unknown")
+
+        # Assert
+        assert response.status_code == 404
+
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_patch")
+    @patch("app.api.v1.router.render_diagram_bytes")
+    def test_edit_diagram_applies_patch(self, mock_render_bytes, mock_generate_patch):
+        """Test editing a diagram applies the generated patch and renders it"""
+        # Setup mocks
+        mock_generate_patch.return_value = {
+            "add_nodes": [{"id": "waf", "type": "WAF", "label": "WAF"}],
+            "add_edges": [{"source": "waf", "target": "alb"}],
+        }
+        mock_render_bytes.return_value = b"\x89PNG"
+        diagram = {
+            "name": "Web",
+            "nodes": [{"id": "alb", "type": "ALB", "label": "ALB"}],
+            "edges": [],
+            "clusters": [],
+        }
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/edit-diagram",
+                json={"diagram": diagram, "instruction": "Add a WAF in front"},
+            )
+
+        # Assert
+        assert response.status_code == 200
+        body = response.json()
+        assert [n["id"] for n in body["diagram"]["nodes"]] == ["alb", "waf"]
+        assert body["diagram"]["edges"] == [{"source": "waf", "target": "alb"}]
+        assert base64.b64decode(body["image"]) == b"\x89PNG"
+        mock_generate_patch.assert_called_once_with(diagram, "Add a WAF in front")
+
+    @patch("app.api.v1.router.diagram_agent.generate_diagram_patch")
+    def test_edit_diagram_rejects_invalid_patch(self, mock_generate_patch):
+        """Test a patch referencing unknown nodes is rejected"""
+        # Setup mock
+        mock_generate_patch.return_value = {"remove_nodes": ["missing"]}
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/edit-diagram",
+                json={
+                    "diagram": {"name": "Web", "nodes": []},
+                    "instruction": "Remove the cache",
+                    "render": False,
+                },
+            )
+
+        # Assert
+        assert response.status_code == 422
+        assert "missing" in response.json()["detail"]
@@ -0,0 +1,224 @@
+import pytest
+import asyncio
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from app.main import app
+from app.agents.assistant_agent import AssistantAgent, AssistantError
+from app.tools.llm_calls import LLMTimeoutError
+from app.schemas.diagram import AssistantRequest
+
+
+def fake_stream_client(agent, content):
+    """Replace the agent's streaming chain with a fake model emitting `content`."""
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=content)]))
+    agent.stream_client = model | agent.stream_parser
+
+
+class SlowStreamClient:
+    """Streaming chain stand-in that yields one partial, then stalls."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    async def astream(self, messages):
+        yield {"message": "Hel"}
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestAssistantStream:
+    """Tests for streaming assistant responses"""
+
+    @pytest.mark.asyncio
+    @patch("app.agents.assistant_agent.ChatOpenAI")
+    async def test_stream_yields_tokens_then_done(self, mock_chat_openai):
+        """Test that message deltas reassemble to the final message"""
+        # Setup
+        agent = AssistantAgent()
+        fake_stream_client(
+            agent,
+            '{"message": "Here is a web app with a load balancer", '
+            '"invoke_diagram_generation": "ALB in front of two EC2 instances"}',
+        )
+
+        # Execute
+        events = [
+            event
+            async for event in agent.stream_assistant(
+                AssistantRequest(message="Draw a web app")
+            )
+        ]
+
+        # Assert
+        tokens = [e["delta"] for e in events if e["type"] == "token"]
+        assert len(tokens) > 1
+        assert "".join(tokens) == "Here is a web app with a load balancer"
+        assert events[-1] == {
+            "type": "done",
+            "message": "Here is a web app with a load balancer",
+            "invoke_diagram_generation": "ALB in front of two EC2 instances",
+        }
+
+    @pytest.mark.asyncio
+    @patch("app.agents.assistant_agent.ChatOpenAI")
+    async def test_stream_invalid_response_raises(self, mock_chat_openai):
+        """Test that a response missing required fields raises AssistantError"""
+        # Setup
+        agent = AssistantAgent()
+        fake_stream_client(agent, '{"reply": "no message field"}')
+
+        # Execute & Assert
+        with pytest.raises(AssistantError):
+            async for _ in agent.stream_assistant(AssistantRequest(message="Hi")):
+                pass
+
+    @pytest.mark.asyncio
+    @patch("app.agents.assistant_agent.ChatOpenAI")
+    async def test_slow_reader_does_not_hold_slot(self, mock_chat_openai):
+        """Test that the limiter slot is freed once the model finishes"""
+        # Setup
+        agent = AssistantAgent()
+        fake_stream_client(
+            agent, '{"message": "Hello there", "invoke_diagram_generation": null}'
+        )
+        stream = agent.stream_assistant(AssistantRequest(message="Hi"))
+
+        # Execute
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)
+        in_flight = agent.limiter.stats()["in_flight"]
+        rest = [event async for event in stream]
+
+        # Assert
+        assert first["type"] == "token"
+        assert in_flight == 0
+        assert rest[-1]["type"] == "done"
+
+    @pytest.mark.asyncio
+    @patch("app.agents.assistant_agent.ChatOpenAI")
+    async def test_closed_stream_releases_slot(self, mock_chat_openai):
+        """Test that a reader going away stops the model and frees its slot"""
+        # Setup
+        agent = AssistantAgent()
+        agent.stream_client = SlowStreamClient()
+        stream = agent.stream_assistant(AssistantRequest(message="Hi"))
+
+        # Execute
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+        # Assert
+        assert first == {"type": "token", "delta": "Hel"}
+        assert agent.stream_client.cancelled
+        assert agent.limiter.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    @patch("app.agents.assistant_agent.ChatOpenAI")
+    async def test_stream_runs_under_deadline(self, mock_chat_openai):
+        """Test that a stalled stream ends with LLMTimeoutError at the deadline"""
+        # Setup
+        agent = AssistantAgent()
+        agent.stream_client = SlowStreamClient()
+        agent.stream_llm_calls.deadline = 0.05
+        events = []
+
+        # Execute & Assert
+        with pytest.raises(LLMTimeoutError):
+            async for event in agent.stream_assistant(AssistantRequest(message="Hi")):
+                events.append(event)
+        assert events == [{"type": "token", "delta": "Hel"}]
+        assert agent.limiter.stats()["in_flight"] == 0
+
+    @patch("app.api.v1.router.assistant_agent.stream_assistant")
+    def test_stream_endpoint_emits_sse(self, mock_stream):
+        """Test the streaming endpoint frames agent events as SSE"""
+
+        # Setup
+        async def events(request, last_diagram=None):
+            yield {"type": "token", "delta": "Hel"}
+            yield {"type": "token", "delta": "lo"}
+            yield {
+                "type": "done",
+                "message": "Hello",
+                "invoke_diagram_generation": None,
+            }
+
+        mock_stream.side_effect = events
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post("/api/v1/assistant/stream", json={"message": "Hi"})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert parse_sse(response.text) == [
+            ("token", {"delta": "Hel"}),
+            ("token", {"delta": "lo"}),
+            ("done", {"message": "Hello", "invoke_diagram_generation": None}),
+        ]
+
+    @patch("app.api.v1.router.assistant_agent.stream_assistant")
+    def test_stream_endpoint_reports_errors_as_events(self, mock_stream):
+        """Test that failures after the stream starts become an error event"""
+
+        # Setup
+        async def events(request, last_diagram=None):
+            yield {"type": "token", "delta": "Hel"}
+            raise AssistantError("API error")
+
+        mock_stream.side_effect = events
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post("/api/v1/assistant/stream", json={"message": "Hi"})
+
+        # Assert
+        assert response.status_code == 200
+        events = parse_sse(response.text)
+        assert events[0] == ("token", {"delta": "Hel"})
+        assert events[-1][0] == "error"
+        assert "API error" in events[-1][1]["detail"]
+
+    @patch("app.api.v1.router.session_store.history")
+    def test_stream_endpoint_reports_session_errors_as_events(self, mock_history):
+        """Test that a failed session load becomes an error event"""
+        # Setup
+        mock_history.side_effect = RuntimeError("session store down")
+
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/assistant/stream",
+                json={"message": "Hi", "session_id": "abc"},
+            )
+
+        # Assert
+        assert response.status_code == 200
+        events = parse_sse(response.text)
+        assert events[-1][0] == "error"
+        assert "session store down" in events[-1][1]["detail"]
+
+    def test_stream_endpoint_empty_message(self):
+        """Test the streaming endpoint rejects empty messages up front"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.post("/api/v1/assistant/stream", json={"message": " "})
+
+        # Assert
+        assert response.status_code == 400
@@ -0,0 +1,158 @@
+import pytest
+import io
+import json
+import asyncio
+import zipfile
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.batch import generate_batch, zip_stream, read_descriptions
+
+
+class FakeDiagramAgent:
+    def __init__(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_diagram_structure(self, description):
+        self.calls.append(description)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if "fail" in description:
+            raise ValueError("Unsupported node type: Mainframe")
+        return {"name": description, "nodes": [{"id": "n", "type": "EC2"}]}
+
+
+async def fake_render(schema, output_dir=None):
+    return f"PNG:{schema['name']}".encode()
+
+
+async def collect(items):
+    return [item async for item in items]
+
+
+class TestGenerateBatch:
+    """Tests for batch diagram generation"""
+
+    @pytest.mark.asyncio
+    @patch("app.batch.render_diagram_bytes", side_effect=fake_render)
+    async def test_duplicates_generated_once(self, mock_render):
+        """Test identical descriptions share one generation"""
+        # Setup
+        agent = FakeDiagramAgent()
+        descriptions = ["Web app on EC2", "web app  on ec2", "Queue with SQS"]
+
+        # Execute
+        items = await collect(generate_batch(descriptions, agent))
+
+        # Assert
+        assert len(agent.calls) == 2
+        assert sorted(item["index"] for item in items) == [0, 1, 2]
+        duplicate = next(item for item in items if item["index"] == 1)
+        assert duplicate["duplicate_of"] == 0
+        assert duplicate["image"] == b"PNG:Web app on EC2"
+
+    @pytest.mark.asyncio
+    @patch("app.batch.render_diagram_bytes", side_effect=fake_render)
+    async def test_llm_concurrency_is_bounded(self, mock_render):
+        """Test no more than llm_concurrency LLM calls run at once"""
+        # Setup
+        agent = FakeDiagramAgent()
+        descriptions = [f"Diagram {i}" for i in range(10)]
+
+        # Execute
+        items = await collect(generate_batch(descriptions, agent, llm_concurrency=3))
+
+        # Assert
+        assert len(items) == 10
+        assert agent.max_active == 3
+
+    @pytest.mark.asyncio
+    @patch("app.batch.render_diagram_bytes", side_effect=fake_render)
+    async def test_failures_reported_per_item(self, mock_render):
+        """Test a failing item does not stop the batch"""
+        # Setup
+        agent = FakeDiagramAgent()
+
+        # Execute
+        items = await collect(generate_batch(["ok", "please fail", " "], agent))
+
+        # Assert
+        by_index = {item["index"]: item for item in items}
+        assert by_index[0]["status"] == "ok"
+        assert by_index[1]["status"] == "error"
+        assert "Unsupported node type" in by_index[1]["error"]
+        assert by_index[2]["status"] == "error"
+
+    @pytest.mark.asyncio
+    @patch("app.batch.render_diagram_bytes", side_effect=fake_render)
+    async def test_zip_stream(self, mock_render):
+        """Test results stream into a valid zip with a manifest"""
+        # Setup
+        agent = FakeDiagramAgent()
+        items = generate_batch(["Web app", "please fail"], agent)
+
+        # Execute
+        data = b"".join([chunk async for chunk in zip_stream(items)])
+
+        # Assert
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        manifest = json.loads(archive.read("manifest.json"))
+        assert [entry["status"] for entry in manifest] == ["ok", "error"]
+        assert archive.read(manifest[0]["file"]) == b"PNG:Web app"
+
+    def test_read_descriptions(self):
+        """Test descriptions are read from plain and JSON lines"""
+        # Setup
+        lines = ['{"description": "From JSON"}', "Plain text", "", "{not json"]
+
+        # Execute
+        descriptions = read_descriptions(lines)
+
+        # Assert
+        assert descriptions == ["From JSON", "Plain text", "{not json"]
+
+    def test_read_descriptions_missing_field(self):
+        """Test a JSON line without the field is an error naming the line"""
+        # Setup
+        lines = ['{"description": "From JSON"}', "", '{"other": 1}']
+
+        # Execute & Assert
+        with pytest.raises(ValueError, match="line 3"):
+            read_descriptions(lines)
+
+
+class TestBatchEndpoint:
+    """Tests for the batch generation endpoint"""
+
+    @patch("app.api.v1.router.diagram_agent", new_callable=FakeDiagramAgent)
+    @patch("app.batch.render_diagram_bytes", side_effect=fake_render)
+    def test_batch_streams_ndjson(self, mock_render, mock_agent):
+        """Test the endpoint streams one JSON line per description"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/generate-diagrams/batch",
+                json={"descriptions": ["Web app", "Web app", "Data lake"]},
+            )
+
+        # Assert
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["index"] for line in lines) == [0, 1, 2]
+        assert all(line["status"] == "ok" for line in lines)
+
+    def test_batch_rejects_empty_request(self):
+        """Test an empty batch is rejected"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/generate-diagrams/batch", json={"descriptions": []}
+            )
+
+        # Assert
+        assert response.status_code == 400
@@ -0,0 +1,154 @@
+import pytest
+from unittest.mock import patch
+from app.agents import tokens
+from app.agents.context_compaction import ContextCompactor, split_turns
+from app.agents.tokens import count_message_tokens
+
+
+def make_history(turns, words=40):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i} " + "word " * words})
+        history.append(
+            {"role": "assistant", "content": f"answer {i} " + "word " * words}
+        )
+    return history
+
+
+class TestContextCompactor:
+    """Tests for assistant context compaction"""
+
+    def test_short_history_is_unchanged(self):
+        """Test conversations within the kept turns are sent verbatim"""
+        # Setup
+        compactor = ContextCompactor(keep_turns=4, token_budget=10000)
+        history = make_history(3)
+
+        # Execute
+        result = compactor.compact("system", history, "next")
+
+        # Assert
+        assert result.messages == [
+            {"role": "system", "content": "system"},
+            *history,
+            {"role": "user", "content": "next"},
+        ]
+        assert result.tokens_saved == 0
+
+    def test_older_turns_are_summarized(self):
+        """Test turns beyond the kept window are folded into a summary"""
+        # Setup
+        compactor = ContextCompactor(keep_turns=2, token_budget=10000)
+        history = make_history(10)
+
+        # Execute
+        result = compactor.compact("system", history, "next")
+
+        # Assert
+        assert result.messages[1]["role"] == "system"
+        assert "question 0" in result.messages[1]["content"]
+        assert result.messages[2:-1] == history[-4:]
+        assert result.tokens_saved > 0
+        assert result.tokens_after == count_message_tokens(result.messages)
+
+    def test_budget_folds_recent_turns(self):
+        """Test the token budget is respected by folding more turns"""
+        # Setup
+        compactor = ContextCompactor(keep_turns=8, token_budget=300)
+        history = make_history(8, words=100)
+
+        # Execute
+        result = compactor.compact("system", history, "next")
+
+        # Assert
+        assert result.tokens_after <= 300
+        assert result.messages[0]["content"] == "system"
+        assert result.messages[-1] == {"role": "user", "content": "next"}
+
+    def test_last_diagram_included_in_summary(self):
+        """Test the last generated diagram is carried in the summary"""
+        # Setup
+        compactor = ContextCompactor(keep_turns=1, token_budget=10000)
+        diagram = {"name": "Web", "nodes": [{"id": "web", "type": "EC2"}]}
+
+        # Execute
+        result = compactor.compact(
+            "system", make_history(6, words=100), "add a database", last_diagram=diagram
+        )
+
+        # Assert
+        assert '"type":"EC2"' in result.messages[1]["content"]
+
+    def test_disabled_compactor_passes_history_through(self):
+        """Test compaction can be switched off"""
+        # Setup
+        compactor = ContextCompactor(keep_turns=1, token_budget=10, enabled=False)
+        history = make_history(5)
+
+        # Execute
+        result = compactor.compact("system", history, "next")
+
+        # Assert
+        assert len(result.messages) == len(history) + 2
+
+    def test_stats_accumulate_savings(self):
+        """Test savings are reported across requests"""
+        # Setup
+        compactor = ContextCompactor(keep_turns=1, token_budget=10000)
+
+        # Execute
+        first = compactor.compact("system", make_history(6), "next")
+        second = compactor.compact("system", make_history(1), "next")
+
+        # Assert
+        stats = compactor.stats()
+        assert stats["requests"] == 2
+        assert stats["compacted"] == 1
+        assert stats["tokens_saved"] == first.tokens_saved + second.tokens_saved
+
+    def test_split_turns_groups_by_user_message(self):
+        """Test history is grouped into turns starting at user messages"""
+        # Setup
+        history = [
+            {"role": "assistant", "content": "hello"},
+            {"role": "user", "content": "a"},
+            {"role": "assistant", "content": "b"},
+            {"role": "user", "content": "c"},
+        ]
+
+        # Execute
+        turns = split_turns(history)
+
+        # Assert
+        assert [len(t) for t in turns] == [1, 2, 1]
+
+
+class TestTokenCounting:
+    """Tests for local token counting"""
+
+    def test_counting_never_loads_the_encoding(self):
+        """Test counting before startup estimates from length without tiktoken"""
+        # Execute
+        with (
+            patch.object(tokens, "_encoding", None),
+            patch("tiktoken.encoding_for_model") as mock_load,
+        ):
+            count = tokens.count_tokens("a" * 10)
+
+        # Assert
+        assert count == 3
+        mock_load.assert_not_called()
+
+    def test_failed_load_falls_back_to_length(self):
+        """Test a failed encoding load leaves the length estimate in place"""
+        # Execute
+        with (
+            patch.object(tokens, "_encoding", None),
+            patch("tiktoken.encoding_for_model", side_effect=OSError("offline")),
+        ):
+            encoding = tokens.load_encoding()
+            count = tokens.count_tokens("a" * 10)
+
+        # Assert
+        assert encoding is None
+        assert count == 3
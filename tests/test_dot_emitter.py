@@ -0,0 +1,162 @@
+import pytest
+import re
+from unittest.mock import patch, MagicMock
+from app.tools.dot_emitter import DotRenderError, render_dot, schema_to_dot
+from app.tools.generate_graph import (
+    _PipedDiagram,
+    draw_schema,
+    get_node_class,
+    get_render_attrs,
+)
+
+SCHEMA = {
+    "name": "Web Application",
+    "nodes": [
+        {"id": "alb", "type": "ALB", "label": "Load Balancer"},
+        {"id": "web", "type": "EC2", "label": "Web"},
+        {"id": "db", "type": "RDS", "label": "Database"},
+    ],
+    "edges": [
+        {"source": "alb", "target": "web"},
+        {"source": "web", "target": "db"},
+    ],
+    "clusters": [{"id": "tier", "label": "Web Tier", "nodes": ["web", "db"]}],
+}
+
+_ATTR = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|[^\s\]]+)')
+
+
+def parse_attrs(line):
+    """Parse a DOT attribute list into a dict, ignoring quoting style."""
+    body = line[line.index("[") + 1 : line.rindex("]")]
+    return {key: value.strip('"') for key, value in _ATTR.findall(body)}
+
+
+def statements(source, keyword):
+    return [
+        parse_attrs(line)
+        for line in source.splitlines()
+        if line.strip().startswith(keyword)
+    ]
+
+
+def diagrams_source(schema):
+    attrs = {**get_render_attrs(schema), "filename": "unused"}
+    with _PipedDiagram(schema["name"], **attrs) as diagram:
+        draw_schema(schema)
+    return diagram.dot.source
+
+
+class TestSchemaToDot:
+    """Tests for the native DOT emitter"""
+
+    def test_matches_diagrams_graph_attributes(self):
+        """Test that graph, node, edge and cluster defaults match diagrams"""
+        # Setup
+        expected = diagrams_source(SCHEMA)
+
+        # Execute
+        emitted = schema_to_dot(SCHEMA, get_render_attrs(SCHEMA), get_node_class)
+
+        # Assert
+        for keyword in ("graph [", "node [", "edge ["):
+            assert statements(emitted, keyword)[0] == statements(expected, keyword)[0]
+        # Cluster graph attributes
+        assert statements(emitted, "graph [")[1] == statements(expected, "graph [")[1]
+
+    def test_matches_diagrams_node_and_edge_statements(self):
+        """Test that node icons/labels and edge attributes match diagrams"""
+        # Setup
+        expected = diagrams_source(SCHEMA)
+
+        # Execute
+        emitted = schema_to_dot(SCHEMA, get_render_attrs(SCHEMA), get_node_class)
+
+        # Assert
+        def nodes(source):
+            return {
+                attrs["label"]: attrs
+                for attrs in (
+                    parse_attrs(line)
+                    for line in source.splitlines()
+                    if "image=" in line
+                )
+            }
+
+        def edges(source):
+            return [parse_attrs(line) for line in source.splitlines() if "->" in line]
+
+        assert nodes(emitted) == nodes(expected)
+        assert edges(emitted) == edges(expected)
+
+    def test_escapes_labels(self):
+        """Test that quotes in labels cannot break the DOT syntax"""
+        # Setup
+        schema = {
+            "name": 'My "Quoted" Diagram',
+            "nodes": [{"id": "a", "type": "EC2", "label": 'Say "hi"'}],
+        }
+
+        # Execute
+        emitted = schema_to_dot(schema, get_render_attrs(schema), get_node_class)
+
+        # Assert
+        assert 'label="Say \\"hi\\""' in emitted
+
+    def test_unsupported_node_type(self):
+        """Test that unknown node types raise the usual error"""
+        # Setup
+        schema = {"name": "Bad", "nodes": [{"id": "a", "type": "Mainframe"}]}
+
+        # Execute & Assert
+        with pytest.raises(ValueError) as excinfo:
+            schema_to_dot(schema, get_render_attrs(schema), get_node_class)
+
+        assert "Unsupported node type" in str(excinfo.value)
+
+
+class TestRenderDot:
+    """Tests for the single-shot Graphviz invocation"""
+
+    @patch("app.tools.dot_emitter.shutil.which", return_value="/usr/bin/dot")
+    @patch("app.tools.dot_emitter.subprocess.run")
+    def test_render_dot_pipes_source(self, mock_run, mock_which):
+        """Test that DOT source is piped to dot and stdout returned"""
+        # Setup
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"\x89PNG")
+
+        # Execute
+        image = render_dot("digraph {}", "png")
+
+        # Assert
+        assert image == b"\x89PNG"
+        mock_run.assert_called_once()
+        assert mock_run.call_args.args[0] == ["/usr/bin/dot", "-Tpng"]
+        assert mock_run.call_args.kwargs["input"] == b"digraph {}"
+
+    @patch("app.tools.dot_emitter.shutil.which", return_value=None)
+    def test_render_dot_without_graphviz(self, mock_which):
+        """Test a clear error when Graphviz is not installed"""
+        # Execute & Assert
+        with pytest.raises(DotRenderError):
+            render_dot("digraph {}")
+
+
+@pytest.mark.asyncio
+async def test_dot_backend_selected_by_config(tmp_path):
+    """Test that RENDER_BACKEND=dot renders through the emitter"""
+    # Setup
+    from app.tools.generate_graph import render_diagram_bytes
+
+    # Execute
+    with (
+        patch("app.tools.generate_graph.RENDER_BACKEND", "dot"),
+        patch(
+            "app.tools.generate_graph.render_dot", return_value=b"\x89PNG"
+        ) as mock_render_dot,
+    ):
+        image = await render_diagram_bytes(SCHEMA)
+
+    # Assert
+    assert image == b"\x89PNG"
+    assert "cluster_Web Tier" in mock_render_dot.call_args.args[0]
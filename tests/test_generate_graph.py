@@ -0,0 +1,139 @@
+import pytest
+import os
+import asyncio
+import tempfile
+from unittest.mock import patch
+from app.tools.render_cache import RenderCache
+from app.tools.generate_graph import (
+    parse_diagram_schema,
+    render_diagram_bytes,
+    sweep_rendered_files,
+)
+
+
+def make_schema(node_type):
+    return {
+        "name": "Architecture Diagram",
+        "nodes": [{"id": "node1", "type": node_type, "label": "Node 1"}],
+        "edges": [],
+        "clusters": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_same_name_renders_do_not_collide(tmp_path, fake_graphviz):
+    """Test that concurrent renders sharing a diagram name get distinct files"""
+    # Setup
+    schemas = [make_schema(t) for t in ("EC2", "RDS", "S3", "SQS")]
+
+    # Execute
+    with patch(
+        "app.tools.generate_graph.get_render_cache",
+        return_value=RenderCache(str(tmp_path / "cache"), max_entries=0),
+    ):
+        paths = await asyncio.gather(
+            *(parse_diagram_schema(s, str(tmp_path)) for s in schemas)
+        )
+
+    # Assert
+    assert len(set(paths)) == len(schemas)
+    assert all(os.path.exists(p) for p in paths)
+    assert all(os.path.basename(p).startswith("architecture_diagram_") for p in paths)
+
+
+@pytest.mark.asyncio
+async def test_workspace_removed_after_render(tmp_path, fake_graphviz):
+    """Test that no per-render workspace is left behind"""
+    # Execute
+    await parse_diagram_schema(make_schema("EC2"), str(tmp_path))
+
+    # Assert
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".render-")]
+
+
+@pytest.mark.asyncio
+async def test_failed_render_cleans_up_workspace(tmp_path, fake_graphviz):
+    """Test that a failed render leaves no partial output"""
+    # Execute & Assert
+    with pytest.raises(ValueError):
+        await parse_diagram_schema(make_schema("NotAType"), str(tmp_path))
+
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".render-")]
+
+
+@pytest.mark.asyncio
+async def test_diagram_name_cannot_escape_output_dir(tmp_path, fake_graphviz):
+    """Test that path separators in the diagram name are neutralized"""
+    # Setup
+    schema = {**make_schema("EC2"), "name": "../../etc/Web API"}
+
+    # Execute
+    path = await parse_diagram_schema(schema, str(tmp_path))
+
+    # Assert
+    assert os.path.realpath(path).startswith(str(tmp_path))
+    assert ".." not in path
+
+
+@pytest.mark.asyncio
+async def test_render_diagram_bytes_pipes_dot_source(tmp_path, monkeypatch):
+    """Test in-memory rendering hands DOT source to Graphviz and writes no files"""
+    # Setup
+    schema = make_schema("EC2")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    # Execute
+    with patch(
+        "graphviz.Digraph.pipe", autospec=True, return_value=b"\x89PNG"
+    ) as mock_pipe:
+        image = await render_diagram_bytes(schema, cache_dir=None)
+
+    # Assert
+    assert image == b"\x89PNG"
+    graph = mock_pipe.call_args.args[0]
+    assert "ec2.png" in graph.source
+    assert mock_pipe.call_args.kwargs["format"] == "png"
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_render_diagram_bytes_uses_render_cache(tmp_path):
+    """Test that in-memory renders are served from the render cache on repeat"""
+    # Setup
+    schema = make_schema("RDS")
+
+    # Execute
+    with patch(
+        "graphviz.Digraph.pipe", autospec=True, return_value=b"\x89PNG"
+    ) as mock_pipe:
+        first = await render_diagram_bytes(schema, str(tmp_path))
+        second = await render_diagram_bytes(schema, str(tmp_path))
+
+    # Assert
+    assert first == second == b"\x89PNG"
+    mock_pipe.assert_called_once()
+
+
+def test_sweep_removes_only_stale_renders(tmp_path):
+    """Test uncollected renders past their TTL are removed, and nothing else"""
+    # Setup
+    stale = tmp_path / "web_0123456789ab.png"
+    fresh = tmp_path / "web_ba9876543210.png"
+    cached = tmp_path / "render_cache" / "abc.png"
+    hidden = tmp_path / ".partial-1"
+    cached.parent.mkdir()
+    for path in (stale, fresh, cached, hidden):
+        path.write_bytes(b"PNG")
+    old = os.path.getmtime(fresh) - 7200
+    for path in (stale, cached, hidden):
+        os.utime(path, (old, old))
+
+    # Execute
+    removed = sweep_rendered_files(str(tmp_path), max_age=3600)
+
+    # Assert
+    assert removed == 1
+    assert not stale.exists()
+    assert fresh.exists() and cached.exists() and hidden.exists()
+    assert sweep_rendered_files(str(tmp_path / "missing")) == 0
@@ -0,0 +1,131 @@
+import os
+import logging
+from unittest.mock import patch
+from diagrams.aws.compute import EC2
+from app.tools.dot_emitter import icon_path, schema_to_dot
+from app.tools.generate_graph import get_node_class, get_render_attrs
+from app.tools.icon_cache import IconCache, icon_size_px, png_size
+
+SCHEMA = {"name": "Web", "nodes": [{"id": "web", "type": "EC2", "label": "Web"}]}
+
+
+class TestIconSize:
+    """Tests for the icon size and PNG header helpers"""
+
+    def test_png_size(self):
+        """Test dimensions are read from the PNG header"""
+        # Execute
+        width, height = png_size(icon_path(EC2))
+
+        # Assert
+        assert width > 0 and height > 0
+
+    def test_icon_size_follows_dpi_and_format(self):
+        """Test the drawn size tracks dpi and node width, and vector output opts out"""
+        # Execute & Assert
+        assert icon_size_px({"outformat": "png"}) == 135
+        assert icon_size_px({"outformat": "png", "graph_attr": {"dpi": "192"}}) == 269
+        assert icon_size_px({"outformat": "svg"}) is None
+
+
+class TestIconCache:
+    """Tests for pre-scaled node icons"""
+
+    def test_large_icon_is_scaled_once(self, tmp_path):
+        """Test an icon larger than its drawn size is scaled and reused"""
+        # Setup
+        cache = IconCache(cache_dir=str(tmp_path))
+
+        # Execute
+        first = cache.icon_file(EC2, 64)
+        second = cache.icon_file(EC2, 64)
+
+        # Assert
+        assert first == second
+        assert os.path.dirname(first) == str(tmp_path)
+        assert max(png_size(first)) == 64
+        assert cache.stats()["scaled"] == 1
+
+    def test_scaled_icons_survive_restart(self, tmp_path):
+        """Test a new cache reuses icons already scaled on disk"""
+        # Setup
+        IconCache(cache_dir=str(tmp_path)).icon_file(EC2, 64)
+        cache = IconCache(cache_dir=str(tmp_path))
+
+        # Execute
+        path = cache.icon_file(EC2, 64)
+
+        # Assert
+        assert os.path.dirname(path) == str(tmp_path)
+        assert cache.stats()["scaled"] == 0
+
+    def test_small_icon_kept(self, tmp_path):
+        """Test icons no larger than their drawn size are used as they are"""
+        # Setup
+        cache = IconCache(cache_dir=str(tmp_path))
+
+        # Execute & Assert
+        assert cache.icon_file(EC2, 4096) == icon_path(EC2)
+        assert cache.icon_file(EC2, None) == icon_path(EC2)
+        assert os.listdir(tmp_path) == []
+
+    def test_disabled(self, tmp_path):
+        """Test the original icons are used when the cache is off"""
+        # Setup
+        cache = IconCache(cache_dir=str(tmp_path), enabled=False)
+
+        # Execute & Assert
+        assert cache.icon_file(EC2, 64) == icon_path(EC2)
+
+    def test_scaled_size(self, tmp_path):
+        """Test the scaled size follows the render and is None when off"""
+        # Setup
+        enabled = IconCache(cache_dir=str(tmp_path))
+        disabled = IconCache(cache_dir=str(tmp_path), enabled=False)
+
+        # Execute & Assert
+        assert enabled.scaled_size({"outformat": "png"}) == 135
+        assert enabled.scaled_size({"outformat": "svg"}) is None
+        assert disabled.scaled_size({"outformat": "png"}) is None
+
+    def test_warns_without_pillow(self, tmp_path, caplog):
+        """Test a missing Pillow is logged and the original icons are used"""
+        # Setup
+        cache = IconCache(cache_dir=str(tmp_path))
+
+        # Execute
+        with (
+            patch("importlib.util.find_spec", return_value=None),
+            caplog.at_level(logging.WARNING, logger="app.tools.icon_cache"),
+        ):
+            cache.warm()
+
+        # Assert
+        assert "Pillow is not installed" in caplog.text
+        assert not cache.enabled
+        assert cache.icon_file(EC2, 64) == icon_path(EC2)
+
+    def test_build_index(self, tmp_path):
+        """Test the index covers the registry's provider icons"""
+        # Setup
+        cache = IconCache(cache_dir=str(tmp_path))
+
+        # Execute
+        count = cache.build_index()
+
+        # Assert
+        assert count > 100
+        assert cache.stats()["indexed_icons"] == count
+
+    def test_dot_source_uses_scaled_icons(self, tmp_path):
+        """Test the DOT emitter draws nodes with the resolved icon"""
+        # Setup
+        cache = IconCache(cache_dir=str(tmp_path))
+        attrs = get_render_attrs(SCHEMA)
+
+        # Execute
+        source = schema_to_dot(SCHEMA, attrs, get_node_class, cache.resolver(attrs))
+
+        # Assert
+        assert str(tmp_path) in source
+        assert icon_path(EC2) not in source
@@ -0,0 +1,194 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.jobs import (
+    Job,
+    JobManager,
+    JobQueueFullError,
+    JobBroker,
+    InMemoryJobBroker,
+    QUEUED,
+    SUCCEEDED,
+    FAILED,
+)
+
+SCHEMA = {"name": "Web", "nodes": [{"id": "web", "type": "EC2"}], "edges": []}
+
+
+async def fake_runner(description):
+    await asyncio.sleep(0.01)
+    if "fail" in description:
+        raise ValueError("Unsupported node type: Mainframe")
+    return SCHEMA, b"PNG"
+
+
+class TestInMemoryJobBroker:
+    """Tests for the in-process job broker"""
+
+    @pytest.mark.asyncio
+    async def test_round_robin_across_clients(self):
+        """Test one busy client cannot starve another"""
+        # Setup
+        broker = InMemoryJobBroker()
+        for i in range(3):
+            await broker.submit(Job(f"a{i}", "client-a"))
+        await broker.submit(Job("b0", "client-b"))
+
+        # Execute
+        order = [(await broker.next_job()).description for _ in range(4)]
+
+        # Assert
+        assert order == ["a0", "b0", "a1", "a2"]
+
+    @pytest.mark.asyncio
+    async def test_queue_depth_caps(self):
+        """Test the total and per-client queue limits"""
+        # Setup
+        broker = InMemoryJobBroker(max_depth=3, max_client_depth=2)
+        await broker.submit(Job("a0", "client-a"))
+        await broker.submit(Job("a1", "client-a"))
+
+        # Execute / Assert
+        with pytest.raises(JobQueueFullError):
+            await broker.submit(Job("a2", "client-a"))
+        await broker.submit(Job("b0", "client-b"))
+        with pytest.raises(JobQueueFullError):
+            await broker.submit(Job("c0", "client-c"))
+        assert broker.stats()["rejected"] == 2
+        assert broker.stats()["queued"] == 3
+
+    @pytest.mark.asyncio
+    async def test_wait_times_out_on_queued_job(self):
+        """Test long-polling returns the unfinished job after the timeout"""
+        # Setup
+        broker = InMemoryJobBroker()
+        job = Job("a0", "client-a")
+        await broker.submit(job)
+
+        # Execute
+        result = await broker.wait(job.id, 0.01)
+
+        # Assert
+        assert result.status == QUEUED
+
+    @pytest.mark.asyncio
+    async def test_expired_jobs_pruned_without_new_submissions(self):
+        """Test finished jobs are dropped once their TTL passes"""
+        # Setup
+        broker = InMemoryJobBroker(ttl_seconds=60)
+        job = Job("a0", "client-a")
+        await broker.submit(job)
+        job.status = SUCCEEDED
+        job.image = b"PNG"
+        job.finished_at = job.created_at - 61
+        await broker.update(job)
+
+        # Execute
+        result = await broker.get(job.id)
+
+        # Assert
+        assert result is None
+        assert broker.stats()["succeeded"] == 0
+
+    def test_incomplete_broker_cannot_be_instantiated(self):
+        """Test a broker missing queue methods fails when it is created"""
+
+        # Setup
+        class PartialBroker(JobBroker):
+            async def get(self, job_id):
+                return None
+
+        # Execute & Assert
+        with pytest.raises(TypeError):
+            PartialBroker()
+
+
+class TestJobManager:
+    """Tests for the background job workers"""
+
+    @pytest.mark.asyncio
+    async def test_jobs_complete_in_background(self):
+        """Test submitted jobs run and long-polling sees the result"""
+        # Setup
+        manager = JobManager(fake_runner, InMemoryJobBroker(), workers=2)
+        manager.start()
+
+        try:
+            # Execute
+            ok = await manager.submit("Web app", "client-a")
+            bad = await manager.submit("please fail", "client-a")
+            ok = await manager.get(ok.id, wait=1)
+            bad = await manager.get(bad.id, wait=1)
+        finally:
+            await manager.shutdown()
+
+        # Assert
+        assert ok.status == SUCCEEDED
+        assert ok.diagram == SCHEMA
+        assert ok.image == b"PNG"
+        assert bad.status == FAILED
+        assert bad.error_status == 400
+        assert "Unsupported node type" in bad.error
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self):
+        """Test unknown job ids read as missing"""
+        # Setup
+        manager = JobManager(fake_runner, InMemoryJobBroker())
+
+        # Execute
+        job = await manager.get("missing", wait=1)
+
+        # Assert
+        assert job is None
+
+
+class TestJobEndpoints:
+    """Tests for the job API"""
+
+    @patch("app.api.v1.router.job_manager.runner", side_effect=fake_runner)
+    def test_submit_and_poll(self, mock_runner):
+        """Test a job is accepted immediately and its image fetched later"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/jobs",
+                json={"description": "Web app"},
+                headers={"X-Client-Id": "tests"},
+            )
+            job_id = response.json()["job_id"]
+            status = client.get(f"/api/v1/jobs/{job_id}", params={"wait": 5})
+            image = client.get(status.json()["image_url"])
+
+        # Assert
+        assert response.status_code == 202
+        assert response.headers["location"].endswith(f"/api/v1/jobs/{job_id}")
+        assert status.json()["status"] == "succeeded"
+        assert status.json()["diagram"]["name"] == "Web"
+        assert image.content == b"PNG"
+
+    def test_queue_full_rejected(self):
+        """Test a full queue is rejected with Retry-After"""
+        # Setup
+        with patch(
+            "app.api.v1.router.job_manager.submit",
+            side_effect=JobQueueFullError("100 jobs already queued"),
+        ):
+            # Execute
+            with TestClient(app) as client:
+                response = client.post("/api/v1/jobs", json={"description": "Web app"})
+
+        # Assert
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "5"
+
+    def test_unknown_job_not_found(self):
+        """Test polling an unknown job returns 404"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.get("/api/v1/jobs/missing")
+
+        # Assert
+        assert response.status_code == 404
@@ -0,0 +1,179 @@
+import pytest
+import asyncio
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from openai import InternalServerError
+from app.main import app
+from app.tools.rate_limit import LLMLimiter
+from app.tools.llm_calls import LLMCaller, LLMTimeoutError
+
+
+def make_caller(**kwargs):
+    limiter = LLMLimiter("test", rate=0, max_in_flight=0, client_rate=0)
+    return LLMCaller("test", limiter, backoff=0, **kwargs)
+
+
+def upstream_server_error():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(500, request=request)
+    return InternalServerError("Server error", response=response, body=None)
+
+
+class FlakyModel:
+    def __init__(self, failures, delays=None):
+        self.failures = list(failures)
+        self.delays = list(delays or [])
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        if self.failures:
+            raise self.failures.pop(0)
+        return f"response {self.calls}"
+
+
+class TestLLMCaller:
+    """Tests for LLM call deadlines, retries and hedging"""
+
+    @pytest.mark.asyncio
+    async def test_retries_retryable_errors(self):
+        """Test upstream server errors are retried"""
+        # Setup
+        caller = make_caller(max_retries=2)
+        model = FlakyModel([upstream_server_error(), upstream_server_error()])
+
+        # Execute
+        result = await caller.call(model)
+
+        # Assert
+        assert result == "response 3"
+        assert caller.stats()["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_other_errors(self):
+        """Test invalid output is not retried"""
+        # Setup
+        caller = make_caller(max_retries=2)
+        model = FlakyModel([ValueError("invalid schema")])
+
+        # Execute & Assert
+        with pytest.raises(ValueError):
+            await caller.call(model)
+        assert model.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_deadline(self):
+        """Test a call that misses its deadline times out after retries"""
+        # Setup
+        caller = make_caller(timeout=0.01, max_retries=1)
+        model = FlakyModel([], delays=[1, 1])
+
+        # Execute & Assert
+        with pytest.raises(LLMTimeoutError):
+            await caller.call(model)
+        assert model.calls == 2
+        assert caller.stats()["timeouts"] == 2
+
+    @pytest.mark.asyncio
+    async def test_total_deadline_spans_attempts(self):
+        """Test retries stop once the call's total deadline is spent"""
+        # Setup
+        caller = make_caller(timeout=0.05, deadline=0.08, max_retries=5)
+        model = FlakyModel([], delays=[1] * 6)
+
+        # Execute & Assert
+        with pytest.raises(LLMTimeoutError):
+            await caller.call(model)
+        assert model.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_over_slow_request(self):
+        """Test a slow request is hedged and the faster response used"""
+        # Setup
+        caller = make_caller(hedging=True, hedge_min_delay=0.01)
+        caller._latencies.extend([0.01] * 20)
+        model = FlakyModel([], delays=[1, 0])
+
+        # Execute
+        result = await caller.call(model)
+
+        # Assert
+        assert result == "response 2"
+        assert caller.stats()["hedges"] == 1
+        assert caller.stats()["hedges_won"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancel_before_hedge_cancels_request(self):
+        """Test cancelling the caller while waiting to hedge stops the request"""
+        # Setup
+        caller = make_caller(hedging=True, hedge_min_delay=1)
+        caller._latencies.extend([0.01] * 20)
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def slow_model():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        call = asyncio.ensure_future(caller.call(slow_model))
+        await started.wait()
+
+        # Execute
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        # Assert
+        assert cancelled.is_set()
+        assert caller.stats()["hedges"] == 0
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_history(self):
+        """Test hedging waits for enough latency samples"""
+        # Setup
+        caller = make_caller(hedging=True)
+
+        # Execute
+        await caller.call(FlakyModel([]))
+
+        # Assert
+        assert caller.hedge_delay() is None
+        assert caller.stats()["hedges"] == 0
+
+    def test_hedge_delay_percentile(self):
+        """Test the hedge delay follows the configured latency percentile"""
+        # Setup
+        caller = make_caller(hedging=True, hedge_percentile=95, hedge_min_delay=0)
+        caller._latencies.extend(i / 100 for i in range(1, 101))
+
+        # Execute
+        delay = caller.hedge_delay()
+
+        # Assert
+        assert delay == pytest.approx(0.96)
+
+
+class TestLLMTimeoutEndpoint:
+    """Tests for model timeout responses"""
+
+    @patch(
+        "app.api.v1.router.diagram_agent.generate_diagram_structure",
+        side_effect=LLMTimeoutError("diagram LLM call timed out after 60s"),
+    )
+    def test_generate_diagram_returns_504(self, mock_generate):
+        """Test a model timeout becomes 504 rather than 500"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/generate-diagram", json={"description": "Web app"}
+            )
+
+        # Assert
+        assert response.status_code == 504
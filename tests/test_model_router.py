@@ -0,0 +1,111 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+from app.schemas.diagram import DiagramSchema
+from app.agents.schema_cache import SchemaCache
+from app.agents.model_router import ModelRouter, estimate_complexity, FAST, FULL
+from app.agents.rule_parser import RuleBasedParser
+from app.agents.digram_generating_agent import DiagramGeneratingAgent
+
+SIMPLE = {"name": "Web", "nodes": [{"id": "web", "type": "EC2"}], "edges": []}
+UNSUPPORTED = {"name": "Web", "nodes": [{"id": "mf", "type": "Mainframe"}]}
+
+
+def fake_model(schema, calls):
+    def respond(prompt):
+        calls.append(schema)
+        return DiagramSchema.model_validate(schema)
+
+    return RunnableLambda(respond)
+
+
+class TestModelRouter:
+    """Tests for complexity-based model routing"""
+
+    def test_estimate_complexity(self):
+        """Test components and groupings are counted locally"""
+        # Execute
+        complexity = estimate_complexity(
+            "An API Gateway calling Lambda functions inside a VPC"
+        )
+
+        # Assert
+        assert complexity.words == 9
+        assert complexity.components == 4
+        assert complexity.groupings == 1
+
+    def test_simple_description_routes_fast(self):
+        """Test a tiny description goes to the fast model"""
+        # Setup
+        router = ModelRouter(max_score=6)
+
+        # Execute & Assert
+        assert router.route("an EC2 behind an ELB") == FAST
+        assert router.stats()["fast"] == 1
+
+    def test_complex_description_routes_full(self):
+        """Test a description with many components and groupings goes full"""
+        # Setup
+        router = ModelRouter(max_score=6)
+        description = (
+            "Three-tier app: ALB in a public subnet, EC2 web servers and API "
+            "servers in private subnets, RDS primary and replica, ElastiCache, "
+            "S3 for assets, SQS queue feeding Lambda workers, CloudWatch alarms"
+        )
+
+        # Execute & Assert
+        assert router.route(description) == FULL
+
+    def test_disabled(self):
+        """Test every description goes full when tiering is off"""
+        # Setup
+        router = ModelRouter(enabled=False)
+
+        # Execute & Assert
+        assert router.route("an EC2") == FULL
+
+
+class TestAgentTiering:
+    """Tests for fast-model generation with escalation"""
+
+    @pytest.mark.asyncio
+    async def test_fast_model_used_for_simple_description(self):
+        """Test valid fast-model output is used as is"""
+        # Setup
+        fast_calls, full_calls = [], []
+        agent = DiagramGeneratingAgent(
+            cache=SchemaCache(max_entries=0),
+            model_router=ModelRouter(max_score=6),
+            rule_parser=RuleBasedParser(enabled=False),
+        )
+        agent.fast_client = fake_model(SIMPLE, fast_calls)
+        agent.client = fake_model(SIMPLE, full_calls)
+
+        # Execute
+        result = await agent.generate_diagram_structure("an EC2 instance")
+
+        # Assert
+        assert result["nodes"][0]["type"] == "EC2"
+        assert len(fast_calls) == 1
+        assert full_calls == []
+
+    @pytest.mark.asyncio
+    async def test_escalates_when_fast_output_invalid(self):
+        """Test unsupported fast-model output is regenerated by the full model"""
+        # Setup
+        fast_calls, full_calls = [], []
+        agent = DiagramGeneratingAgent(
+            cache=SchemaCache(max_entries=0),
+            model_router=ModelRouter(max_score=6),
+            rule_parser=RuleBasedParser(enabled=False),
+        )
+        agent.fast_client = fake_model(UNSUPPORTED, fast_calls)
+        agent.client = fake_model(SIMPLE, full_calls)
+
+        # Execute
+        result = await agent.generate_diagram_structure("an EC2 instance")
+
+        # Assert
+        assert result["nodes"][0]["type"] == "EC2"
+        assert len(fast_calls) == 1
+        assert len(full_calls) == 1
+        assert agent.model_router.stats()["escalations"] == 1
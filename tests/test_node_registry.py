@@ -0,0 +1,80 @@
+import pytest
+from diagrams.aws.compute import EC2
+from diagrams.aws.network import ELB, APIGateway
+from diagrams.programming.framework import Fastapi
+from app.tools.node_registry import NodeRegistry, CORE_NODE_TYPES, normalize_node_type
+
+
+class TestNodeRegistry:
+    """Tests for the lazily imported diagrams node catalog"""
+
+    def test_core_types_resolve_to_original_classes(self):
+        """Test the original node types keep their classes"""
+        # Setup
+        registry = NodeRegistry()
+
+        # Execute & Assert
+        assert registry["EC2"] is EC2
+        assert registry["elb"] is ELB
+        assert registry["Fastapi"] is Fastapi
+        for node_type in CORE_NODE_TYPES:
+            assert node_type in registry
+
+    def test_names_are_normalized(self):
+        """Test case, spaces and punctuation don't matter"""
+        # Setup
+        registry = NodeRegistry()
+
+        # Execute & Assert
+        assert normalize_node_type("API Gateway") == "apigateway"
+        assert registry["API Gateway"] is APIGateway
+        assert registry["api-gateway"] is APIGateway
+
+    def test_other_providers_and_qualified_names(self):
+        """Test classes from other providers resolve by name, alias or path"""
+        # Setup
+        registry = NodeRegistry(providers=["aws", "gcp", "k8s"])
+
+        # Execute
+        gke = registry["gcp.compute.GKE"]
+
+        # Assert
+        assert gke.__name__ == "KubernetesEngine"
+        assert registry["GKE"] is gke
+        assert registry["k8s.Pod"].__module__ == "diagrams.k8s.compute"
+
+    def test_providers_limit_catalog(self):
+        """Test providers left out of the list are not indexed"""
+        # Setup
+        registry = NodeRegistry(providers=["aws"])
+
+        # Execute & Assert
+        assert "ec2" in registry
+        assert "gcp.compute.gke" not in registry
+
+    def test_classes_imported_on_first_use(self):
+        """Test lookups only index, and classes are imported once when requested"""
+        # Setup
+        registry = NodeRegistry(providers=["aws"])
+
+        # Execute
+        supported = "rds" in registry
+        before = registry.stats()
+        first = registry["rds"]
+        second = registry["RDS"]
+
+        # Assert
+        assert supported
+        assert before["indexed"] and before["resolved"] == 0
+        assert first is second
+        assert registry.stats()["resolved"] == 1
+
+    def test_unknown_type(self):
+        """Test an unknown node type raises KeyError"""
+        # Setup
+        registry = NodeRegistry()
+
+        # Execute & Assert
+        assert "Mainframe" not in registry
+        with pytest.raises(KeyError):
+            registry["Mainframe"]
@@ -0,0 +1,242 @@
+import pytest
+import asyncio
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from openai import RateLimitError
+from app.main import app
+from app.tools.rate_limit import (
+    LLMLimiter,
+    RateLimitedError,
+    TokenBucket,
+    client_key,
+    is_upstream_rate_limit,
+)
+
+
+def upstream_rate_limit_error():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request)
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class TestTokenBucket:
+    """Tests for the token bucket"""
+
+    def test_burst_then_wait(self):
+        """Test the burst is available at once and later tokens are reserved"""
+        # Setup
+        bucket = TokenBucket(rate=10, burst=2)
+
+        # Execute
+        waits = [bucket.reserve(max_wait=1) for _ in range(3)]
+
+        # Assert
+        assert waits[:2] == [0.0, 0.0]
+        assert 0 < waits[2] <= 0.1
+
+    def test_reservation_beyond_max_wait_is_refused(self):
+        """Test a token too far in the future is not taken"""
+        # Setup
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve(max_wait=0)
+
+        # Execute
+        wait = bucket.reserve(max_wait=0.5)
+
+        # Assert
+        assert wait is None
+        assert bucket.tokens < 1
+
+
+class TestLLMLimiter:
+    """Tests for LLM admission control"""
+
+    @pytest.mark.asyncio
+    async def test_rejects_client_over_rate(self):
+        """Test a client over its rate is rejected with Retry-After"""
+        # Setup
+        limiter = LLMLimiter(
+            "test",
+            rate=100,
+            burst=100,
+            client_rate=0.1,
+            client_burst=1,
+            queue_timeout=1,
+        )
+        client_key.set("client-a")
+        async with limiter.slot():
+            pass
+
+        # Execute
+        with pytest.raises(RateLimitedError) as exc_info:
+            async with limiter.slot():
+                pass
+
+        # Assert
+        assert exc_info.value.retry_after >= 9
+        assert limiter.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_clients_are_limited_separately(self):
+        """Test one client's usage does not count against another"""
+        # Setup
+        limiter = LLMLimiter(
+            "test", rate=100, burst=100, client_rate=0.1, client_burst=1
+        )
+
+        # Execute
+        for key in ("client-a", "client-b"):
+            client_key.set(key)
+            async with limiter.slot():
+                pass
+
+        # Assert
+        assert limiter.stats()["admitted"] == 2
+        assert limiter.stats()["clients"] == 2
+
+    @pytest.mark.asyncio
+    async def test_max_in_flight(self):
+        """Test calls over the in-flight limit wait, then time out"""
+        # Setup
+        limiter = LLMLimiter(
+            "test", rate=0, max_in_flight=1, client_rate=0, queue_timeout=0.05
+        )
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        # Execute
+        with pytest.raises(RateLimitedError):
+            async with limiter.slot():
+                pass
+        release.set()
+        await holder
+        async with limiter.slot():
+            pass
+
+        # Assert
+        assert limiter.stats()["admitted"] == 2
+        assert limiter.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("outcome", ["rejected", "cancelled"])
+    async def test_unadmitted_call_returns_rate_tokens(self, outcome):
+        """Test a call rejected or cancelled while queued gives its tokens back"""
+        # Setup
+        limiter = LLMLimiter(
+            "test",
+            rate=0.001,
+            burst=2,
+            max_in_flight=1,
+            client_rate=0.001,
+            client_burst=2,
+            queue_timeout=0.05,
+        )
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        async def queued():
+            async with limiter.slot():
+                pass
+
+        # Execute
+        if outcome == "rejected":
+            with pytest.raises(RateLimitedError):
+                await queued()
+        else:
+            waiter = asyncio.create_task(queued())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await holder
+
+        # Assert
+        assert limiter._bucket.tokens == pytest.approx(1, abs=0.01)
+        assert limiter._clients["anonymous"].tokens == pytest.approx(1, abs=0.01)
+
+    @pytest.mark.asyncio
+    async def test_adaptive_backoff_and_recovery(self):
+        """Test an upstream 429 lowers the rate and successes restore it"""
+        # Setup
+        limiter = LLMLimiter("test", rate=10, burst=100, client_rate=0)
+
+        # Execute
+        with pytest.raises(RateLimitError):
+            async with limiter.slot():
+                raise upstream_rate_limit_error()
+        backed_off = limiter.stats()["effective_rate"]
+        for _ in range(20):
+            async with limiter.slot():
+                pass
+
+        # Assert
+        assert backed_off == 5
+        assert limiter.stats()["effective_rate"] == 10
+        assert limiter.stats()["upstream_limited"] == 1
+
+    def test_detects_wrapped_upstream_errors(self):
+        """Test provider 429s are recognized through exception chaining"""
+        # Setup
+        wrapped = RuntimeError("failed")
+        wrapped.__cause__ = upstream_rate_limit_error()
+
+        # Execute & Assert
+        assert is_upstream_rate_limit(wrapped)
+        assert not is_upstream_rate_limit(RuntimeError("failed"))
+
+
+class TestRateLimitedEndpoints:
+    """Tests for rate limit responses"""
+
+    @patch(
+        "app.api.v1.router.diagram_agent.generate_diagram_structure",
+        side_effect=RateLimitedError("Too many diagram requests", retry_after=3),
+    )
+    def test_generate_diagram_returns_429(self, mock_generate):
+        """Test a rejected LLM call becomes 429 with Retry-After"""
+        # Execute
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/generate-diagram", json={"description": "Web app"}
+            )
+
+        # Assert
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "3"
+
+    def test_client_key_bound_per_request(self):
+        """Test the caller's X-Client-Id reaches the agents"""
+        # Setup
+        seen = []
+
+        async def record(description):
+            seen.append(client_key.get())
+            raise ValueError("stop here")
+
+        # Execute
+        with patch(
+            "app.api.v1.router.diagram_agent.generate_diagram_structure",
+            side_effect=record,
+        ):
+            with TestClient(app) as client:
+                client.post(
+                    "/api/v1/generate-diagram",
+                    json={"description": "Web app"},
+                    headers={"X-Client-Id": "team-a"},
+                )
+
+        # Assert
+        assert seen == ["team-a"]
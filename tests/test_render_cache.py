@@ -0,0 +1,135 @@
+import pytest
+import os
+from app.tools.render_cache import RenderCache, render_cache_key
+from app.tools.generate_graph import parse_diagram_schema
+
+SCHEMA = {
+    "name": "Test Diagram",
+    "nodes": [
+        {"id": "web", "type": "EC2", "label": "Web"},
+        {"id": "db", "type": "RDS", "label": "DB"},
+    ],
+    "edges": [{"source": "web", "target": "db"}],
+    "clusters": [],
+}
+
+
+class TestRenderCacheKey:
+    """Tests for the canonical render cache key"""
+
+    def test_key_ignores_output_location(self):
+        """Test that the output filename does not change the key"""
+        # Execute
+        key1 = render_cache_key(SCHEMA, {"outformat": "png", "filename": "a/x"})
+        key2 = render_cache_key(SCHEMA, {"outformat": "png", "filename": "b/y"})
+
+        # Assert
+        assert key1 == key2
+
+    def test_key_normalizes_node_type_case(self):
+        """Test that node type casing does not change the key"""
+        # Setup
+        lower = {
+            **SCHEMA,
+            "nodes": [{**n, "type": n["type"].lower()} for n in SCHEMA["nodes"]],
+        }
+
+        # Execute & Assert
+        assert render_cache_key(SCHEMA, {}) == render_cache_key(lower, {})
+
+    def test_key_depends_on_render_attributes(self):
+        """Test that render attributes are part of the key"""
+        # Execute & Assert
+        assert render_cache_key(SCHEMA, {"direction": "LR"}) != render_cache_key(
+            SCHEMA, {"direction": "TB"}
+        )
+
+    def test_key_depends_on_icon_scaling(self):
+        """Test that the icon cache mode and scaled size are part of the key"""
+        # Execute
+        original = render_cache_key(SCHEMA, {}, icon_size=None)
+        scaled = render_cache_key(SCHEMA, {}, icon_size=135)
+        larger = render_cache_key(SCHEMA, {}, icon_size=269)
+
+        # Assert
+        assert len({original, scaled, larger}) == 3
+
+
+class TestRenderCache:
+    """Tests for the RenderCache store"""
+
+    def test_put_and_get(self, tmp_path):
+        """Test storing a render and reading it back"""
+        # Setup
+        cache = RenderCache(str(tmp_path / "cache"), max_entries=2)
+        source = tmp_path / "render.png"
+        source.write_bytes(b"png")
+
+        # Execute
+        stored = cache.put("abc", str(source))
+
+        # Assert
+        assert cache.get("abc") == stored
+        assert cache.get("missing") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert not source.exists()
+
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used render is evicted from disk"""
+        # Setup
+        cache = RenderCache(str(tmp_path / "cache"), max_entries=2)
+        paths = {}
+        for key in ("a", "b"):
+            source = tmp_path / f"{key}.png"
+            source.write_bytes(key.encode())
+            paths[key] = cache.put(key, str(source))
+        cache.get("a")
+        source = tmp_path / "c.png"
+        source.write_bytes(b"c")
+
+        # Execute
+        cache.put("c", str(source))
+
+        # Assert
+        assert cache.get("b") is None
+        assert not os.path.exists(paths["b"])
+        assert cache.get("a") == paths["a"]
+        assert cache.stats()["evictions"] == 1
+
+    def test_missing_file_is_a_miss(self, tmp_path):
+        """Test that a render deleted from disk is not served"""
+        # Setup
+        cache = RenderCache(str(tmp_path / "cache"), max_entries=2)
+        source = tmp_path / "render.png"
+        source.write_bytes(b"png")
+        os.remove(cache.put("abc", str(source)))
+
+        # Execute & Assert
+        assert cache.get("abc") is None
+
+    def test_reindexes_existing_files(self, tmp_path):
+        """Test that renders left on disk are picked up on startup"""
+        # Setup
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        (cache_dir / "abc.png").write_bytes(b"png")
+
+        # Execute
+        cache = RenderCache(str(cache_dir), max_entries=2)
+
+        # Assert
+        assert cache.get("abc") == str(cache_dir / "abc.png")
+
+
+@pytest.mark.asyncio
+async def test_parse_diagram_schema_uses_render_cache(tmp_path, fake_graphviz):
+    """Test that a repeated schema is rendered only once"""
+    # Execute
+    first = await parse_diagram_schema(SCHEMA, str(tmp_path))
+    second = await parse_diagram_schema(SCHEMA, str(tmp_path))
+
+    # Assert
+    assert first == second
+    assert os.path.exists(first)
+    fake_graphviz.assert_called_once()
@@ -0,0 +1,100 @@
+import pytest
+import os
+import time
+import asyncio
+import threading
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.tools.render_pool import (
+    RenderPool,
+    RenderPoolSaturatedError,
+    RenderTimeoutError,
+)
+
+
+class TestRenderPool:
+    """Tests for the bounded render worker pool"""
+
+    @pytest.mark.asyncio
+    async def test_run_returns_result(self):
+        """Test running a function on a thread pool"""
+        # Setup
+        pool = RenderPool(executor="thread", max_workers=1, queue_depth=0)
+
+        # Execute
+        result = await pool.run(sum, [1, 2, 3])
+
+        # Assert
+        assert result == 6
+        assert pool.stats()["completed"] == 1
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_process_pool_runs_in_worker_process(self):
+        """Test that process workers run renders outside the API process"""
+        # Setup
+        pool = RenderPool(executor="process", max_workers=1, queue_depth=0)
+
+        # Execute
+        worker_pid = await pool.run(os.getpid)
+
+        # Assert
+        assert worker_pid != os.getpid()
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_saturated(self):
+        """Test back-pressure once workers and queue slots are taken"""
+        # Setup
+        pool = RenderPool(executor="thread", max_workers=1, queue_depth=1)
+        release = threading.Event()
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+
+        # Execute & Assert
+        with pytest.raises(RenderPoolSaturatedError):
+            await pool.run(release.wait)
+
+        release.set()
+        await asyncio.gather(*running)
+        assert pool.stats()["rejected"] == 1
+        assert pool.stats()["in_flight"] == 0
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_timeout_keeps_slot_until_worker_finishes(self):
+        """Test that a timed out render still occupies its worker slot"""
+        # Setup
+        pool = RenderPool(executor="thread", max_workers=1, queue_depth=0, timeout=0.05)
+
+        # Execute & Assert
+        with pytest.raises(RenderTimeoutError):
+            await pool.run(time.sleep, 0.3)
+
+        assert pool.stats()["in_flight"] == 1
+        await asyncio.sleep(0.4)
+        assert pool.stats()["in_flight"] == 0
+        assert pool.stats()["timed_out"] == 1
+        pool.shutdown()
+
+
+@patch("app.api.v1.router.diagram_agent.generate_diagram_structure")
+@patch("app.api.v1.router.parse_diagram_schema")
+def test_generate_diagram_returns_503_when_saturated(
+    mock_parse_schema, mock_generate_structure
+):
+    """Test that a saturated render pool surfaces as 503 with Retry-After"""
+    # Setup
+    mock_generate_structure.return_value = {"name": "Test", "nodes": []}
+    mock_parse_schema.side_effect = RenderPoolSaturatedError("busy", retry_after=2)
+
+    # Execute
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/generate-diagram", json={"description": "Create an EC2"}
+        )
+
+    # Assert
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
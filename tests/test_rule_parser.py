@@ -0,0 +1,187 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+from app.schemas.diagram import DiagramSchema
+from app.agents.schema_cache import SchemaCache
+from app.agents.rule_parser import RuleBasedParser, parse_description, _COMPONENTS
+from app.agents.digram_generating_agent import DiagramGeneratingAgent
+from app.tools.generate_graph import NODE_CLASSES
+
+
+def edges(schema):
+    return [(edge["source"], edge["target"]) for edge in schema["edges"]]
+
+
+class TestParseDescription:
+    """Tests for the local rule-based description parser"""
+
+    def test_arrow_chain(self):
+        """Test an arrow chain becomes one edge per arrow"""
+        # Execute
+        result = parse_description("ALB -> EC2 -> RDS")
+
+        # Assert
+        assert result.confidence == 1.0
+        assert [node["type"] for node in result.schema["nodes"]] == [
+            "ALB",
+            "EC2",
+            "RDS",
+        ]
+        assert edges(result.schema) == [("alb", "ec2"), ("ec2", "rds")]
+        DiagramSchema.model_validate(result.schema)
+
+    def test_connects_to(self):
+        """Test a verb connector draws an edge"""
+        # Execute
+        result = parse_description("Lambda connects to DynamoDB")
+
+        # Assert
+        assert edges(result.schema) == [("lambda", "dynamodb")]
+
+    def test_behind_reverses_edge(self):
+        """Test "X behind Y" draws Y -> X"""
+        # Execute
+        result = parse_description("an EC2 instance behind an ELB")
+
+        # Assert
+        assert result.confidence == 1.0
+        assert edges(result.schema) == [("elb", "ec2")]
+
+    def test_vpc_grouping(self):
+        """Test "inside a VPC" puts the clause's nodes in a VPC cluster"""
+        # Execute
+        result = parse_description("ALB -> EC2 -> RDS, all inside a VPC")
+
+        # Assert
+        assert result.schema["clusters"] == [
+            {"id": "vpc", "label": "VPC", "nodes": ["alb", "ec2", "rds"]}
+        ]
+
+    def test_grouping_applies_to_its_own_part(self):
+        """Test "in a VPC" only groups the components before it in its part"""
+        # Execute
+        result = parse_description("EC2 and RDS in a VPC, S3 for backups")
+
+        # Assert
+        assert result.schema["clusters"] == [
+            {"id": "vpc", "label": "VPC", "nodes": ["ec2", "rds"]}
+        ]
+        assert [node["id"] for node in result.schema["nodes"]] == ["ec2", "rds", "s3"]
+
+    def test_grouping_does_not_create_vpc_node(self):
+        """Test a grouping phrase adds a cluster but no VPC node"""
+        # Execute
+        result = parse_description("EC2 in a single VPC")
+
+        # Assert
+        assert [node["id"] for node in result.schema["nodes"]] == ["ec2"]
+        assert result.schema["clusters"][0]["nodes"] == ["ec2"]
+
+    @pytest.mark.parametrize(
+        "description",
+        [
+            "Three EC2 instances behind an ELB",
+            "2 EC2 instances behind an ALB",
+            "Multiple Lambda functions -> SQS",
+            "Each EC2 instance connects to RDS",
+            "EC2 -> RDS with no S3",
+            "Lambda without DynamoDB",
+            "EC2 and RDS in a VPC, S3 outside the VPC",
+            "ALB to EC2 instead of Lambda",
+            "ALB to EC2 replacing Lambda",
+            "Lambda to S3 via API Gateway",
+            "Lambda to S3 through API Gateway",
+            "EC2 to RDS or DynamoDB",
+            "EC2 except RDS",
+            "RDS from EC2",
+        ],
+    )
+    def test_counts_negations_and_outside_fall_back(self, description):
+        """Test descriptions the parser cannot express are left to the LLM"""
+        # Execute
+        result = parse_description(description)
+
+        # Assert
+        assert result.schema is None
+        assert result.confidence == 0.0
+
+    @pytest.mark.parametrize("description", ["s3 to s3", "EC2 and EC2 -> RDS"])
+    def test_self_edges_and_duplicate_endpoints_fall_back(self, description):
+        """Test a component connected to itself or listed twice is rejected"""
+        # Execute
+        result = parse_description(description)
+
+        # Assert
+        assert result.schema is None
+        assert result.confidence == 0.0
+
+    def test_unknown_words_lower_confidence(self):
+        """Test words the parser does not understand lower its confidence"""
+        # Execute
+        result = parse_description("A web app with two EC2 instances")
+
+        # Assert
+        assert result.confidence < 0.8
+
+    def test_dangling_connection(self):
+        """Test a connection with nothing on one side is rejected"""
+        # Execute
+        result = parse_description("-> RDS")
+
+        # Assert
+        assert result.schema is None
+        assert result.confidence == 0.0
+
+    def test_component_types_are_supported(self):
+        """Test every type the parser emits can be rendered"""
+        # Execute & Assert
+        for node_type, _, _ in _COMPONENTS:
+            assert node_type.lower() in NODE_CLASSES
+
+
+class TestRuleBasedParser:
+    """Tests for the parser's confidence threshold"""
+
+    def test_falls_back_below_threshold(self):
+        """Test low-confidence parses are left to the LLM"""
+        # Setup
+        parser = RuleBasedParser(min_confidence=0.8)
+
+        # Execute
+        parsed = parser.parse("A web app with two EC2 instances")
+
+        # Assert
+        assert parsed is None
+        assert parser.stats()["fallbacks"] == 1
+
+    def test_disabled(self):
+        """Test nothing is parsed locally when the parser is off"""
+        # Setup
+        parser = RuleBasedParser(enabled=False)
+
+        # Execute & Assert
+        assert parser.parse("ALB -> EC2") is None
+
+
+class TestAgentRuleParser:
+    """Tests for the agent's local fast path"""
+
+    @pytest.mark.asyncio
+    async def test_simple_description_skips_llm(self):
+        """Test a simple description is answered without calling the model"""
+        # Setup
+        calls = []
+        agent = DiagramGeneratingAgent(
+            cache=SchemaCache(max_entries=0),
+            rule_parser=RuleBasedParser(min_confidence=0.8),
+        )
+        agent.client = agent.fast_client = RunnableLambda(
+            lambda prompt: calls.append(prompt)
+        )
+
+        # Execute
+        result = await agent.generate_diagram_structure("API Gateway -> Lambda -> S3")
+
+        # Assert
+        assert calls == []
+        assert edges(result) == [("apigateway", "lambda"), ("lambda", "s3")]
+        assert agent.rule_parser.stats()["parsed"] == 1
@@ -0,0 +1,129 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from app.agents.schema_cache import (
+    SchemaCache,
+    HashingEmbedder,
+    normalize_description,
+)
+from app.agents.rule_parser import RuleBasedParser
+from app.agents.digram_generating_agent import DiagramGeneratingAgent
+
+SCHEMA = {"name": "Test", "nodes": [{"id": "web", "type": "EC2", "label": "Web"}]}
+
+
+class TestSchemaCache:
+    """Tests for the description-to-schema cache"""
+
+    def test_normalize_description(self):
+        """Test that case and whitespace edits normalize identically"""
+        # Execute & Assert
+        assert normalize_description("  An EC2\n behind an  ELB ") == (
+            "an ec2 behind an elb"
+        )
+
+    @pytest.mark.asyncio
+    async def test_exact_hit_after_trivial_edit(self):
+        """Test exact-tier hit for a whitespace/case variant"""
+        # Setup
+        cache = SchemaCache(max_entries=4, ttl_seconds=60)
+        await cache.store("An EC2 instance", SCHEMA)
+
+        # Execute
+        result = await cache.lookup("an   ec2 INSTANCE")
+
+        # Assert
+        assert result == SCHEMA
+        assert cache.stats()["exact_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_returns_copies(self):
+        """Test that callers cannot mutate cached entries"""
+        # Setup
+        cache = SchemaCache(max_entries=4, ttl_seconds=60)
+        await cache.store("An EC2 instance", SCHEMA)
+
+        # Execute
+        (await cache.lookup("An EC2 instance"))["nodes"].clear()
+
+        # Assert
+        assert (await cache.lookup("An EC2 instance")) == SCHEMA
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self):
+        """Test that expired entries are not served"""
+        # Setup
+        cache = SchemaCache(max_entries=4, ttl_seconds=0)
+        await cache.store("An EC2 instance", SCHEMA)
+
+        # Execute & Assert
+        assert await cache.lookup("An EC2 instance") is None
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_size_eviction(self):
+        """Test that the least recently used entry is evicted"""
+        # Setup
+        cache = SchemaCache(max_entries=1, ttl_seconds=60)
+        await cache.store("first", SCHEMA)
+
+        # Execute
+        await cache.store("second", SCHEMA)
+
+        # Assert
+        assert await cache.lookup("first") is None
+        assert await cache.lookup("second") == SCHEMA
+
+    @pytest.mark.asyncio
+    async def test_semantic_hit(self):
+        """Test similarity-tier hit with the local embedder"""
+        # Setup
+        cache = SchemaCache(
+            max_entries=4,
+            ttl_seconds=60,
+            embedder=HashingEmbedder(),
+            similarity_threshold=0.8,
+        )
+        await cache.store("A web server on EC2 connected to an RDS database", SCHEMA)
+
+        # Execute
+        similar = await cache.lookup(
+            "A web server on EC2 connected to an RDS database, please."
+        )
+        unrelated = await cache.lookup("Serverless Lambda functions behind SQS")
+
+        # Assert
+        assert similar == SCHEMA
+        assert unrelated is None
+        assert cache.stats()["semantic_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_embedder_failure_falls_back_to_exact(self):
+        """Test that embedding errors degrade to exact matching"""
+        # Setup
+        embedder = MagicMock()
+        embedder.embed = AsyncMock(side_effect=RuntimeError("offline"))
+        cache = SchemaCache(max_entries=4, ttl_seconds=60, embedder=embedder)
+        await cache.store("An EC2 instance", SCHEMA)
+
+        # Execute & Assert
+        assert await cache.lookup("an ec2 instance") == SCHEMA
+        assert await cache.lookup("something else") is None
+
+
+@pytest.mark.asyncio
+@patch("app.agents.digram_generating_agent.ChatOpenAI")
+async def test_agent_skips_llm_on_cache_hit(mock_chat_openai):
+    """Test that a cached description does not reach the LLM"""
+    # Setup
+    cache = SchemaCache(max_entries=4, ttl_seconds=60)
+    await cache.store("An EC2 instance", SCHEMA)
+    agent = DiagramGeneratingAgent(
+        cache=cache, rule_parser=RuleBasedParser(enabled=False)
+    )
+
+    # Execute
+    result = await agent.generate_diagram_structure("an ec2 instance")
+
+    # Assert
+    assert result == SCHEMA
+    agent.client.ainvoke.assert_not_called()
@@ -0,0 +1,108 @@
+import pytest
+from app.tools.schema_patch import apply_patch, patch_size, SchemaPatchError
+
+
+def make_schema():
+    return {
+        "name": "Web App",
+        "nodes": [
+            {"id": "alb", "type": "ALB", "label": "Load Balancer"},
+            {"id": "web", "type": "EC2", "label": "Web"},
+            {"id": "db", "type": "RDS", "label": "Database"},
+        ],
+        "edges": [
+            {"source": "alb", "target": "web"},
+            {"source": "web", "target": "db"},
+        ],
+        "clusters": [{"id": "tier", "label": "Tier", "nodes": ["web", "db"]}],
+    }
+
+
+class TestApplyPatch:
+    """Tests for applying diagram patches"""
+
+    def test_add_node_and_edge(self):
+        """Test adding a WAF in front of the ALB"""
+        # Setup
+        schema = make_schema()
+        patch = {
+            "add_nodes": [{"id": "waf", "type": "WAF", "label": "WAF"}],
+            "add_edges": [{"source": "waf", "target": "alb"}],
+        }
+
+        # Execute
+        result = apply_patch(schema, patch)
+
+        # Assert
+        assert result["nodes"][-1] == {"id": "waf", "type": "WAF", "label": "WAF"}
+        assert {"source": "waf", "target": "alb"} in result["edges"]
+        assert schema == make_schema()
+
+    def test_remove_node_cascades(self):
+        """Test removing a node drops its edges and cluster membership"""
+        # Execute
+        result = apply_patch(make_schema(), {"remove_nodes": ["db"]})
+
+        # Assert
+        assert [n["id"] for n in result["nodes"]] == ["alb", "web"]
+        assert result["edges"] == [{"source": "alb", "target": "web"}]
+        assert result["clusters"][0]["nodes"] == ["web"]
+
+    def test_update_node_keeps_position(self):
+        """Test updating a node changes it in place"""
+        # Execute
+        result = apply_patch(
+            make_schema(),
+            {"update_nodes": [{"id": "db", "type": "Dynamodb", "label": "Table"}]},
+        )
+
+        # Assert
+        assert result["nodes"][2] == {"id": "db", "type": "Dynamodb", "label": "Table"}
+
+    def test_replace_and_remove_clusters(self):
+        """Test clusters are replaced by id and removed without their nodes"""
+        # Execute
+        replaced = apply_patch(
+            make_schema(),
+            {"add_clusters": [{"id": "tier", "label": "Tier", "nodes": ["alb"]}]},
+        )
+        removed = apply_patch(make_schema(), {"remove_clusters": ["tier"]})
+
+        # Assert
+        assert replaced["clusters"] == [
+            {"id": "tier", "label": "Tier", "nodes": ["alb"]}
+        ]
+        assert removed["clusters"] == []
+        assert len(removed["nodes"]) == 3
+
+    def test_remove_edge(self):
+        """Test removing an edge"""
+        # Execute
+        result = apply_patch(
+            make_schema(), {"remove_edges": [{"source": "web", "target": "db"}]}
+        )
+
+        # Assert
+        assert result["edges"] == [{"source": "alb", "target": "web"}]
+
+    @pytest.mark.parametrize(
+        "patch",
+        [
+            {"add_nodes": [{"id": "web", "type": "EC2"}]},
+            {"remove_nodes": ["missing"]},
+            {"update_nodes": [{"id": "missing", "type": "EC2"}]},
+            {"add_edges": [{"source": "web", "target": "missing"}]},
+            {"add_clusters": [{"id": "c", "label": "C", "nodes": ["missing"]}]},
+            {"add_nodes": [{"id": "x"}]},
+        ],
+    )
+    def test_invalid_patches_rejected(self, patch):
+        """Test patches that do not fit the diagram are rejected"""
+        # Execute & Assert
+        with pytest.raises(SchemaPatchError):
+            apply_patch(make_schema(), patch)
+
+    def test_patch_size(self):
+        """Test counting the elements a patch touches"""
+        # Execute & Assert
+        assert patch_size({"remove_nodes": ["a", "b"], "add_edges": []}) == 2
@@ -0,0 +1,130 @@
+import pytest
+from unittest.mock import patch
+from app.agents.session_store import (
+    InMemorySessionStore,
+    RedisSessionStore,
+    LocalRedis,
+    SessionStore,
+)
+
+USER = {"role": "user", "content": "Draw a web app"}
+ASSISTANT = {"role": "assistant", "content": "Here it is"}
+
+
+@pytest.fixture(params=["memory", "local-redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemorySessionStore(max_sessions=10, max_messages=4, ttl_seconds=60)
+    return RedisSessionStore(LocalRedis(), max_messages=4, ttl_seconds=60)
+
+
+class TestSessionStore:
+    """Tests shared by all session store backends"""
+
+    @pytest.mark.asyncio
+    async def test_append_and_read_history(self, store):
+        """Test turns appended to a session are read back in order"""
+        # Execute
+        await store.append("s1", USER, ASSISTANT)
+
+        # Assert
+        assert await store.history("s1") == [USER, ASSISTANT]
+        assert await store.history("other") == []
+
+    @pytest.mark.asyncio
+    async def test_history_is_capped(self, store):
+        """Test only the most recent messages are kept"""
+        # Execute
+        for i in range(5):
+            await store.append("s1", {"role": "user", "content": str(i)})
+
+        # Assert
+        history = await store.history("s1")
+        assert [m["content"] for m in history] == ["1", "2", "3", "4"]
+
+    @pytest.mark.asyncio
+    async def test_last_diagram(self, store):
+        """Test the last generated diagram is stored per session"""
+        # Setup
+        diagram = {"name": "Web", "nodes": []}
+
+        # Execute
+        await store.append("s1", USER)
+        await store.set_last_diagram("s1", diagram)
+
+        # Assert
+        assert await store.last_diagram("s1") == diagram
+        assert await store.last_diagram("other") is None
+
+    @pytest.mark.asyncio
+    async def test_delete(self, store):
+        """Test deleting a session removes its history"""
+        # Setup
+        await store.append("s1", USER)
+
+        # Execute
+        deleted = await store.delete("s1")
+
+        # Assert
+        assert deleted
+        assert await store.history("s1") == []
+        assert not await store.delete("s1")
+
+    @pytest.mark.asyncio
+    async def test_created_session_exists_before_first_turn(self, store):
+        """Test a new session is stored empty and can be deleted"""
+        # Execute
+        await store.create("s1")
+
+        # Assert
+        assert await store.history("s1") == []
+        assert await store.last_diagram("s1") is None
+        assert await store.delete("s1")
+
+    def test_incomplete_backend_cannot_be_instantiated(self):
+        """Test a backend missing store methods fails when it is created"""
+
+        # Setup
+        class PartialStore(SessionStore):
+            async def history(self, session_id):
+                return []
+
+        # Execute & Assert
+        with pytest.raises(TypeError):
+            PartialStore()
+
+
+class TestInMemorySessionStore:
+    """Tests specific to the in-process session store"""
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_session_evicted(self):
+        """Test the store is bounded by evicting idle sessions"""
+        # Setup
+        store = InMemorySessionStore(max_sessions=2)
+
+        # Execute
+        await store.append("a", USER)
+        await store.append("b", USER)
+        await store.history("a")
+        await store.append("c", USER)
+
+        # Assert
+        assert await store.history("a") == [USER]
+        assert await store.history("b") == []
+        assert store.stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_session_reads_empty(self):
+        """Test sessions expire after the TTL"""
+        # Setup
+        store = InMemorySessionStore(ttl_seconds=10)
+        with patch("app.agents.session_store.time.monotonic", return_value=0):
+            await store.append("s1", USER)
+
+        # Execute
+        with patch("app.agents.session_store.time.monotonic", return_value=11):
+            history = await store.history("s1")
+
+        # Assert
+        assert history == []
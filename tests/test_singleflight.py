@@ -0,0 +1,183 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from app.tools.singleflight import SingleFlight
+from app.agents.schema_cache import SchemaCache
+from app.agents.rule_parser import RuleBasedParser
+from app.agents.digram_generating_agent import DiagramGeneratingAgent
+from app.agents.speculation import SpeculativeDiagramPrefetch
+from app.schemas.diagram import AssistantRequest, AssistantResponse
+
+SCHEMA = {"name": "Test", "nodes": [{"id": "web", "type": "EC2", "label": "Web"}]}
+
+
+class SlowWork:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self, *args):
+        self.calls += 1
+        try:
+            await asyncio.sleep(0.02)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TestSingleFlight:
+    """Tests for in-flight request coalescing"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_execution(self):
+        """Test identical concurrent calls run the work once"""
+        # Setup
+        flight = SingleFlight("test")
+        work = SlowWork(result="done")
+
+        # Execute
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+        # Assert
+        assert results == ["done"] * 5
+        assert work.calls == 1
+        assert flight.stats()["coalesced"] == 4
+        assert flight.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        """Test calls with different keys are not coalesced"""
+        # Setup
+        flight = SingleFlight("test")
+        work = SlowWork(result="done")
+
+        # Execute
+        await asyncio.gather(flight.do("a", work), flight.do("b", work))
+
+        # Assert
+        assert work.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_are_shared(self):
+        """Test every waiter receives the shared failure"""
+        # Setup
+        flight = SingleFlight("test")
+        work = SlowWork(error=ValueError("boom"))
+
+        # Execute
+        results = await asyncio.gather(
+            flight.do("key", work), flight.do("key", work), return_exceptions=True
+        )
+
+        # Assert
+        assert all(isinstance(result, ValueError) for result in results)
+        assert work.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """Test the shared work survives one caller going away"""
+        # Setup
+        flight = SingleFlight("test")
+        work = SlowWork(result="done")
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+
+        # Execute
+        first.cancel()
+        result = await second
+
+        # Assert
+        assert result == "done"
+        assert first.cancelled()
+        assert not work.cancelled
+
+    @pytest.mark.asyncio
+    async def test_last_caller_leaving_cancels_work(self):
+        """Test the shared work is cancelled once every caller has gone away"""
+        # Setup
+        flight = SingleFlight("test")
+        work = SlowWork(result="done")
+        callers = [asyncio.ensure_future(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        # Execute
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        # Assert
+        assert work.cancelled
+        assert flight.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        """Test every call runs when coalescing is disabled"""
+        # Setup
+        flight = SingleFlight("test", enabled=False)
+        work = SlowWork(result="done")
+
+        # Execute
+        await asyncio.gather(flight.do("key", work), flight.do("key", work))
+
+        # Assert
+        assert work.calls == 2
+        assert flight.stats()["coalesced"] == 0
+
+
+class TestAgentCoalescing:
+    """Tests for coalesced diagram structure generation"""
+
+    @pytest.mark.asyncio
+    async def test_identical_descriptions_share_llm_call(self):
+        """Test normalized-identical descriptions make one LLM call"""
+        # Setup
+        agent = DiagramGeneratingAgent(
+            cache=SchemaCache(max_entries=0),
+            rule_parser=RuleBasedParser(enabled=False),
+        )
+        work = SlowWork(result=SCHEMA)
+
+        # Execute
+        with patch.object(agent, "_generate_diagram_structure", work):
+            results = await asyncio.gather(
+                agent.generate_diagram_structure("An EC2 instance"),
+                agent.generate_diagram_structure("an  ec2 INSTANCE"),
+            )
+
+        # Assert
+        assert work.calls == 1
+        assert results == [SCHEMA, SCHEMA]
+        assert results[0] is not results[1]
+        assert agent.inflight.stats()["coalesced"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_speculation_stops_llm_call(self):
+        """Test a discarded speculative prefetch cancels the coalesced LLM call"""
+        # Setup
+        agent = DiagramGeneratingAgent(
+            cache=SchemaCache(max_entries=0),
+            rule_parser=RuleBasedParser(enabled=False),
+        )
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True)
+        work = SlowWork(result=SCHEMA)
+
+        async def respond(request):
+            await asyncio.sleep(0.005)
+            return AssistantResponse(message="Sure")
+
+        # Execute
+        with patch.object(agent, "_generate_diagram_structure", work):
+            await speculation.run(AssistantRequest(message="Draw a web app"), respond)
+            await asyncio.sleep(0.01)
+
+        # Assert
+        assert work.calls == 1
+        assert work.cancelled
+        assert agent.inflight.stats()["in_flight"] == 0
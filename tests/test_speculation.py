@@ -0,0 +1,166 @@
+import pytest
+import asyncio
+from app.agents.speculation import SpeculativeDiagramPrefetch
+from app.schemas.diagram import AssistantRequest, AssistantResponse
+
+SCHEMA = {"name": "Web App", "nodes": [{"id": "web", "type": "EC2"}]}
+
+
+class FakeDiagramAgent:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.cancelled = False
+
+    async def generate_diagram_structure(self, description):
+        self.calls.append(description)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return SCHEMA
+
+
+def responder(handoff, delay=0.01):
+    async def respond(request):
+        await asyncio.sleep(delay)
+        return AssistantResponse(message="Sure", invoke_diagram_generation=handoff)
+
+    return respond
+
+
+class TestSpeculativeDiagramPrefetch:
+    """Tests for speculative diagram structure prefetching"""
+
+    @pytest.mark.asyncio
+    async def test_matching_handoff_reuses_prefetch(self):
+        """Test a similar handoff description keeps the speculative structure"""
+        # Setup
+        agent = FakeDiagramAgent(delay=0.005)
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True, threshold=0.5)
+        request = AssistantRequest(
+            message="Draw a web app on EC2 behind a load balancer"
+        )
+
+        # Execute
+        reply, prefetched = await speculation.run(
+            request, responder("A web app on EC2 behind a load balancer")
+        )
+
+        # Assert
+        assert reply.message == "Sure"
+        assert prefetched == SCHEMA
+        assert agent.calls == ["Draw a web app on EC2 behind a load balancer"]
+        stats = speculation.stats()
+        assert stats["hits"] == 1
+        assert stats["seconds_saved"] > 0
+
+    @pytest.mark.asyncio
+    async def test_mismatched_handoff_cancels_prefetch(self):
+        """Test an unrelated handoff description cancels the speculative call"""
+        # Setup
+        agent = FakeDiagramAgent(delay=1)
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True, threshold=0.5)
+        request = AssistantRequest(message="Draw a web app on EC2")
+
+        # Execute
+        reply, prefetched = await speculation.run(
+            request, responder("Kinesis stream feeding Redshift via Glue")
+        )
+        await asyncio.sleep(0)
+
+        # Assert
+        assert prefetched is None
+        assert agent.cancelled
+        stats = speculation.stats()
+        assert stats["mismatches"] == 1
+        assert stats["estimated_tokens_cancelled"] > 0
+
+    @pytest.mark.asyncio
+    async def test_partially_overlapping_handoff_is_not_reused(self):
+        """Test the default threshold rejects a handoff naming other components"""
+        # Setup
+        agent = FakeDiagramAgent(delay=1)
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True)
+        request = AssistantRequest(message="Draw a web app on EC2 with RDS")
+
+        # Execute
+        reply, prefetched = await speculation.run(
+            request, responder("A web app on EC2 with DynamoDB and SQS")
+        )
+        await asyncio.sleep(0)
+
+        # Assert
+        assert prefetched is None
+        assert agent.cancelled
+        assert speculation.stats()["mismatches"] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_handoff_cancels_prefetch(self):
+        """Test a text-only reply cancels the speculative call"""
+        # Setup
+        agent = FakeDiagramAgent(delay=1)
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True)
+
+        # Execute
+        _, prefetched = await speculation.run(
+            AssistantRequest(message="Draw something"), responder(None)
+        )
+        await asyncio.sleep(0)
+
+        # Assert
+        assert prefetched is None
+        assert agent.cancelled
+        assert speculation.stats()["no_handoff"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_prefetch_falls_back(self):
+        """Test a failed speculative call returns no structure"""
+        # Setup
+        agent = FakeDiagramAgent(error=ValueError("boom"))
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True, threshold=0.0)
+
+        # Execute
+        _, prefetched = await speculation.run(
+            AssistantRequest(message="Draw a diagram"), responder("A diagram")
+        )
+
+        # Assert
+        assert prefetched is None
+        assert speculation.stats()["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_non_diagram_message_is_not_speculated(self):
+        """Test speculation only starts for messages that look like diagram requests"""
+        # Setup
+        agent = FakeDiagramAgent()
+        speculation = SpeculativeDiagramPrefetch(agent, enabled=True)
+
+        # Execute
+        await speculation.run(AssistantRequest(message="Hello there"), responder(None))
+
+        # Assert
+        assert agent.calls == []
+        assert speculation.stats()["started"] == 0
+
+    def test_speculative_description_uses_recent_user_messages(self):
+        """Test the description is built from the latest user messages"""
+        # Setup
+        request = AssistantRequest(
+            message="Now draw it",
+            context=[
+                {"role": "user", "content": "I have a web app"},
+                {"role": "assistant", "content": "Tell me more"},
+                {"role": "user", "content": "It runs on EC2 with RDS"},
+            ],
+        )
+
+        # Execute
+        description = SpeculativeDiagramPrefetch.speculative_description(request)
+
+        # Assert
+        assert description == "I have a web app\nIt runs on EC2 with RDS\nNow draw it"
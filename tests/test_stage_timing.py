@@ -0,0 +1,61 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.tools.stage_timing import ServerTimingMiddleware, server_timing_header, stage
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/work")
+    async def work():
+        with stage("llm"):
+            await asyncio.sleep(0.01)
+        # Stages recorded in tasks started by the request count too
+        await asyncio.ensure_future(render())
+        return {"ok": True}
+
+    async def render():
+        with stage("render"):
+            await asyncio.sleep(0.01)
+
+    return app
+
+
+class TestStageTiming:
+    """Tests for per-request stage timing"""
+
+    def test_stage_outside_request(self):
+        """Test stages outside a timed request are ignored"""
+        # Execute & Assert
+        with stage("llm"):
+            pass
+
+    def test_header_format(self):
+        """Test timings are formatted in milliseconds with a total"""
+        # Execute
+        header = server_timing_header({"llm": 0.0125}, 0.02)
+
+        # Assert
+        assert header == "llm;dur=12.5, total;dur=20.0"
+
+    def test_middleware_reports_stages(self):
+        """Test the response carries each stage's time and the total"""
+        # Setup
+        client = TestClient(make_app())
+
+        # Execute
+        response = client.get("/work")
+
+        # Assert
+        entries = dict(
+            entry.split(";dur=")
+            for entry in response.headers["server-timing"].split(", ")
+        )
+        assert set(entries) == {"llm", "render", "total"}
+        assert float(entries["llm"]) >= 10
+        assert float(entries["render"]) >= 10
+        assert float(entries["total"]) >= float(entries["llm"]) + float(
+            entries["render"]
+        )
@@ -4,13 +4,13 @@ import json
 import base64
 import io
 import requests
-from streamlit.client import generate_response, generate_diagram, process_messages
+import httpx
 
 
 class TestStreamlitClient:
     """Tests for the Streamlit client functions"""
 
-    def test_process_messages(self):
+    def test_process_messages(self, streamlit_client):
         """Test processing messages for API serialization"""
         # Setup test messages
         messages = [
@@ -23,7 +23,7 @@ class TestStreamlitClient:
         ]
 
         # Execute
-        processed = process_messages(messages)
+        processed = streamlit_client.process_messages(messages)
 
         # Assert
         assert len(processed) == 3
@@ -33,8 +33,8 @@ class TestStreamlitClient:
             processed[2]["content"] == "[Generated Image]"
         )  # Image content is converted to placeholder
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_diagram_success(self, mock_post):
+    @patch("client.requests.Session.post")
+    def test_generate_diagram_success(self, mock_post, streamlit_client):
         """Test successful diagram generation"""
         # Setup mock response
         mock_response = MagicMock()
@@ -43,14 +43,32 @@ class TestStreamlitClient:
         mock_post.return_value = mock_response
 
         # Execute
-        result = generate_diagram({"description": "test diagram"})
+        result = streamlit_client.generate_diagram({"description": "test diagram"})
 
         # Assert
-        assert result == base64.b64encode(b"image_data").decode("utf-8")
+        assert result.getvalue() == b"image_data"
         mock_post.assert_called_once()
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_diagram_error(self, mock_post):
+    @patch("client.requests.Session.post")
+    def test_generate_diagram_sends_session(self, mock_post, streamlit_client):
+        """Test the session is sent so the backend records the diagram"""
+        # Setup mock response
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = b"image_data"
+        mock_post.return_value = mock_response
+
+        # Execute
+        streamlit_client.generate_diagram("web app", session_id="s1")
+
+        # Assert
+        assert mock_post.call_args.kwargs["json"] == {
+            "description": "web app",
+            "session_id": "s1",
+        }
+
+    @patch("client.requests.Session.post")
+    def test_generate_diagram_error(self, mock_post, streamlit_client):
         """Test diagram generation with error response"""
         # Setup mock error response
         mock_response = MagicMock()
@@ -59,27 +77,27 @@ class TestStreamlitClient:
         mock_post.return_value = mock_response
 
         # Execute
-        result = generate_diagram({"description": "invalid diagram"})
+        result = streamlit_client.generate_diagram({"description": "invalid diagram"})
 
         # Assert
         assert result is None
         mock_post.assert_called_once()
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_diagram_exception(self, mock_post):
+    @patch("client.requests.Session.post")
+    def test_generate_diagram_exception(self, mock_post, streamlit_client):
         """Test diagram generation with exception"""
         # Setup mock to raise exception
         mock_post.side_effect = requests.RequestException("Connection error")
 
         # Execute
-        result = generate_diagram({"description": "test diagram"})
+        result = streamlit_client.generate_diagram({"description": "test diagram"})
 
         # Assert
         assert result is None
         mock_post.assert_called_once()
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_response_success(self, mock_post):
+    @patch("client.requests.Session.post")
+    def test_generate_response_success(self, mock_post, streamlit_client):
         """Test successful response generation"""
         # Setup mock response
         mock_response = MagicMock()
@@ -94,16 +112,18 @@ class TestStreamlitClient:
         messages = [{"role": "user", "content": "Hello"}]
 
         # Execute
-        result = generate_response(messages)
+        result = streamlit_client.generate_response(messages)
 
         # Assert
         assert result["type"] == "text"
         assert result["message"] == "Here's a response"
         mock_post.assert_called_once()
 
-    @patch("streamlit.client.requests.post")
-    @patch("streamlit.client.generate_diagram")
-    def test_generate_response_with_diagram(self, mock_generate_diagram, mock_post):
+    @patch("client.requests.Session.post")
+    @patch("client.generate_diagram")
+    def test_generate_response_with_diagram(
+        self, mock_generate_diagram, mock_post, streamlit_client
+    ):
         """Test response generation with diagram"""
         # Setup mock response
         mock_response = MagicMock()
@@ -121,17 +141,19 @@ class TestStreamlitClient:
         messages = [{"role": "user", "content": "Create a diagram"}]
 
         # Execute
-        result = generate_response(messages)
+        result = streamlit_client.generate_response(messages)
 
         # Assert
         assert result["type"] == "diagram"
         assert result["message"] == "Here's a diagram"
         assert result["image"] == "base64_encoded_image"
         mock_post.assert_called_once()
-        mock_generate_diagram.assert_called_once_with({"description": "test diagram"})
+        mock_generate_diagram.assert_called_once_with(
+            {"description": "test diagram"}, None
+        )
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_response_error(self, mock_post):
+    @patch("client.requests.Session.post")
+    def test_generate_response_error(self, mock_post, streamlit_client):
         """Test response generation with error"""
         # Setup mock error response
         mock_response = MagicMock()
@@ -143,15 +165,15 @@ class TestStreamlitClient:
         messages = [{"role": "user", "content": "Hello"}]
 
         # Execute
-        result = generate_response(messages)
+        result = streamlit_client.generate_response(messages)
 
         # Assert
         assert result["type"] == "text"
         assert "error" in result["message"].lower()
         mock_post.assert_called_once()
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_response_timeout(self, mock_post):
+    @patch("client.requests.Session.post")
+    def test_generate_response_timeout(self, mock_post, streamlit_client):
         """Test response generation with timeout"""
         # Setup mock to raise timeout
         mock_post.side_effect = requests.exceptions.Timeout("Request timed out")
@@ -160,15 +182,18 @@ class TestStreamlitClient:
         messages = [{"role": "user", "content": "Hello"}]
 
         # Execute
-        result = generate_response(messages)
+        result = streamlit_client.generate_response(messages)
 
         # Assert
         assert result["type"] == "text"
         assert "too long to respond" in result["message"].lower()
         mock_post.assert_called_once()
 
-    @patch("streamlit.client.requests.post")
-    def test_generate_response_connection_error(self, mock_post):
+    @patch("client.time.sleep")
+    @patch("client.requests.Session.post")
+    def test_generate_response_connection_error(
+        self, mock_post, mock_sleep, streamlit_client
+    ):
         """Test response generation with connection error"""
         # Setup mock to raise connection error
         mock_post.side_effect = requests.exceptions.ConnectionError(
@@ -179,9 +204,242 @@ class TestStreamlitClient:
         messages = [{"role": "user", "content": "Hello"}]
 
         # Execute
-        result = generate_response(messages)
+        result = streamlit_client.generate_response(messages)
 
         # Assert
         assert result["type"] == "text"
         assert "unable to connect" in result["message"].lower()
+        # Connection errors are retried before giving up
+        assert mock_post.call_count == streamlit_client.API_MAX_RETRIES + 1
+
+    def test_iter_sse_events(self, streamlit_client):
+        """Test parsing Server-Sent Events from response lines"""
+        # Setup
+        lines = [
+            "event: token",
+            'data: {"delta": "Hi"}',
+            "",
+            "event: done",
+            'data: {"message": "Hi", "invoke_diagram_generation": null}',
+            "",
+        ]
+
+        # Execute
+        events = list(streamlit_client._iter_sse_events(lines))
+
+        # Assert
+        assert events == [
+            ("token", {"delta": "Hi"}),
+            ("done", {"message": "Hi", "invoke_diagram_generation": None}),
+        ]
+
+    @patch("client.requests.Session.post")
+    def test_stream_assistant_success(self, mock_post, streamlit_client):
+        """Test streaming an assistant reply"""
+        # Setup mock response
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_lines.return_value = [
+            "event: token",
+            'data: {"delta": "Hello"}',
+            "",
+            "event: done",
+            'data: {"message": "Hello", "invoke_diagram_generation": null}',
+            "",
+        ]
+        mock_post.return_value.__enter__.return_value = mock_response
+
+        # Execute
+        events = list(
+            streamlit_client.stream_assistant([{"role": "user", "content": "Hi"}])
+        )
+
+        # Assert
+        assert events == [
+            ("token", "Hello"),
+            ("done", {"message": "Hello", "invoke_diagram_generation": None}),
+        ]
+        assert mock_post.call_args.kwargs["stream"] is True
+
+    @patch("client.requests.Session.post")
+    def test_stream_assistant_error_event(self, mock_post, streamlit_client):
+        """Test that a server-side error event ends the stream with an error"""
+        # Setup mock response
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_lines.return_value = [
+            "event: error",
+            'data: {"detail": "boom"}',
+            "",
+        ]
+        mock_post.return_value.__enter__.return_value = mock_response
+
+        # Execute
+        events = list(
+            streamlit_client.stream_assistant([{"role": "user", "content": "Hi"}])
+        )
+
+        # Assert
+        assert events[-1][0] == "error"
+
+    @patch("client.requests.Session.post")
+    def test_generate_combined_response_with_diagram(self, mock_post, streamlit_client):
+        """Test a diagram turn is served by a single API call"""
+        # Setup mock response
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "message": "Here's a diagram",
+            "diagram_description": "test diagram",
+            "image": base64.b64encode(b"\x89PNG").decode("ascii"),
+            "image_url": None,
+            "diagram_error": None,
+        }
+        mock_post.return_value = mock_response
+
+        # Execute
+        result = streamlit_client.generate_combined_response(
+            [{"role": "user", "content": "Draw"}]
+        )
+
+        # Assert
+        assert result["type"] == "diagram"
+        assert result["message"] == "Here's a diagram"
+        assert result["image"].getvalue() == b"\x89PNG"
+        mock_post.assert_called_once()
+
+    @patch("client.requests.Session.post")
+    def test_generate_combined_response_diagram_failed(
+        self, mock_post, streamlit_client
+    ):
+        """Test a failed server-side diagram is noted in the message"""
+        # Setup mock response
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "message": "Here's a diagram",
+            "diagram_description": "test diagram",
+            "image": None,
+            "image_url": None,
+            "diagram_error": "Unsupported node type: X",
+        }
+        mock_post.return_value = mock_response
+
+        # Execute
+        result = streamlit_client.generate_combined_response(
+            [{"role": "user", "content": "Draw"}]
+        )
+
+        # Assert
+        assert result["type"] == "text"
+        assert "diagram generation failed" in result["message"].lower()
+
+    @patch("client.time.sleep")
+    @patch("client.requests.Session.post")
+    def test_post_retries_gateway_errors(self, mock_post, mock_sleep, streamlit_client):
+        """Test 503 responses are retried, honouring Retry-After"""
+        # Setup mock responses
+        busy = MagicMock(status_code=503, headers={"Retry-After": "2"})
+        ok = MagicMock(status_code=200, headers={})
+        mock_post.side_effect = [busy, ok]
+
+        # Execute
+        response = streamlit_client.post_with_retries("http://backend/api", json={})
+
+        # Assert
+        assert response is ok
+        assert mock_post.call_count == 2
+        assert mock_sleep.call_args.args[0] >= 2
+        assert mock_post.call_args.kwargs["timeout"] is not None
+
+    @patch("client.time.sleep")
+    @patch("client.requests.Session.post")
+    def test_post_does_not_retry_gateway_timeout(
+        self, mock_post, mock_sleep, streamlit_client
+    ):
+        """Test a gateway timeout is not retried, as the server may still be busy"""
+        # Setup mock response
+        mock_post.return_value = MagicMock(status_code=504, headers={})
+
+        # Execute
+        response = streamlit_client.post_with_retries("http://backend/api", json={})
+
+        # Assert
+        assert response.status_code == 504
         mock_post.assert_called_once()
+
+    @patch("client.time.sleep")
+    @patch("client.requests.Session.post")
+    def test_post_does_not_retry_server_errors(
+        self, mock_post, mock_sleep, streamlit_client
+    ):
+        """Test a 500 from the backend is returned without retrying"""
+        # Setup mock response
+        mock_post.return_value = MagicMock(status_code=500, headers={})
+
+        # Execute
+        response = streamlit_client.post_with_retries("http://backend/api", json={})
+
+        # Assert
+        assert response.status_code == 500
+        mock_post.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    def test_retry_delay_is_jittered(self, streamlit_client):
+        """Test backoff delays are randomized within the exponential bound"""
+        # Execute
+        delays = {streamlit_client.retry_delay(2) for _ in range(20)}
+
+        # Assert
+        assert len(delays) > 1
+        assert all(0 <= d <= 0.5 * 2**2 for d in delays)
+
+    @pytest.mark.asyncio
+    async def test_agenerate_combined_response_retries(self, streamlit_client):
+        """Test the async client retries a 502 and decodes the diagram"""
+        # Setup mock transport
+        responses = [
+            httpx.Response(502),
+            httpx.Response(
+                200,
+                json={
+                    "message": "Here's a diagram",
+                    "image": base64.b64encode(b"\x89PNG").decode("ascii"),
+                },
+            ),
+        ]
+        transport = httpx.MockTransport(lambda request: responses.pop(0))
+
+        # Execute
+        with (
+            patch(
+                "client.get_async_client",
+                return_value=httpx.AsyncClient(transport=transport),
+            ),
+            patch("client.retry_delay", return_value=0),
+        ):
+            result = await streamlit_client.agenerate_combined_response(
+                [{"role": "user", "content": "Draw"}]
+            )
+
+        # Assert
+        assert result["type"] == "diagram"
+        assert result["image"].getvalue() == b"\x89PNG"
+        assert responses == []
+
+    def test_assistant_payload_with_session(self, streamlit_client):
+        """Test only the new message is sent when a session exists"""
+        # Setup
+        messages = [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there"},
+            {"role": "user", "content": "Draw a diagram"},
+        ]
+
+        # Execute
+        with_session = streamlit_client.assistant_payload(messages, "abc")
+        without_session = streamlit_client.assistant_payload(messages)
+
+        # Assert
+        assert with_session == {"message": "Draw a diagram", "session_id": "abc"}
+        assert len(without_session["context"]) == 2